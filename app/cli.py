@@ -0,0 +1,76 @@
+"""
+Командная строка бэкенда.
+
+  python -m app.cli batch groups.json -o results.ndjson
+
+groups.json — тело POST /batch/areas ({"groups": [...], ...}) или просто список групп
+[{"id": "g1", "people": [{"lat": .., "lon": ..}, ...]}, {"id": "g2", "addresses": [...]}, ...].
+Результаты пишутся NDJSON-строками {"event", "data"} по мере готовности, как в потоковом API.
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from fastapi import HTTPException
+
+from .clients.dgis import warm_up_caches
+from .core.concurrency import shutdown_process_executor
+from .core.http import aclose_client
+from .core.responses import dumps
+from .models.schemas import BatchRequest
+from .services.batch import check_batch, iter_batch_results
+
+def _load_request(path: str) -> BatchRequest:
+    if path == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    if isinstance(data, list):
+        data = {"groups": data}
+    return BatchRequest.model_validate(data)
+
+async def _run_batch(req: BatchRequest, out) -> None:
+    warm_up_caches()
+    try:
+        async for name, data in iter_batch_results(req):
+            out.write(dumps({"event": name, "data": data}) + b"\n")
+            out.flush()
+            if name == "done":
+                print(
+                    f"{data['groups']} groups, {data['unique_origins']} unique origins of {data['members']} members, "
+                    f"{data['upstream_requests']} upstream requests in {data['elapsed_sec']}s",
+                    file=sys.stderr,
+                )
+    finally:
+        await aclose_client()
+        shutdown_process_executor()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch = commands.add_parser("batch", help="области (и кафе) для многих групп одним заходом")
+    batch.add_argument("input", help="JSON с группами; - читать из stdin")
+    batch.add_argument("-o", "--output", default="-", help="куда писать NDJSON; по умолчанию stdout")
+    batch.add_argument("--include-cafes", action="store_true", help="искать кафе в области каждой группы")
+    args = parser.parse_args()
+
+    try:
+        req = _load_request(args.input)
+        if args.include_cafes:
+            req.include_cafes = True
+        check_batch(req)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    except HTTPException as e:
+        parser.error(str(e.detail))
+
+    if args.output == "-":
+        asyncio.run(_run_batch(req, sys.stdout.buffer))
+    else:
+        with open(args.output, "wb") as out:
+            asyncio.run(_run_batch(req, out))
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,36 @@
-from typing import Any, Dict, List, Optional, Tuple
-import requests
-from shapely import wkt
+import hashlib
+import json
+import math
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+import httpx
+import shapely
 from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
 
 from fastapi import HTTPException
+from ..core.cache import TTLCache
+from ..core.concurrency import iter_concurrent, map_concurrent, run_cpu
 from ..core.config import get_settings
-from ..core.http import get_session
+from ..core.disk_cache import get_disk_cache
+from ..core.http import request
+from ..core.metrics import PLACES_PAGES, span
+from ..core.singleflight import SingleFlight
+from ..core.time_buckets import TimeBucket, bucket_for, neighbor_buckets, parse_start_time
 from ..core.errors import ExternalServiceError, IsochroneBuildError
 from ..geometry.ops import chunked
 
 _settings = get_settings()
-_session = get_session()
+_isochrone_cache = TTLCache(_settings.ISOCHRONE_CACHE_SIZE, _settings.ISOCHRONE_CACHE_TTL_SEC)
+_disk_cache = get_disk_cache()
+_isochrone_flight = SingleFlight("isochrone")
+_places_flight = SingleFlight("places")
+_buckets_used: ContextVar[Optional[Set[str]]] = ContextVar("isochrone_buckets_used", default=None)
+
+_ISOCHRONE_NS = "isochrone"
+_PLACES_NS = "places"
 
 def _items_fields() -> str:
     return ",".join([
@@ -24,7 +43,111 @@ def _items_fields() -> str:
         "items.contact_groups",
     ])
 
-def call_isochrone(
+def isochrone_cache_stats() -> Dict[str, Any]:
+    return _isochrone_cache.stats()
+
+def singleflight_stats() -> Dict[str, Any]:
+    return {"isochrone": _isochrone_flight.stats(), "places": _places_flight.stats()}
+
+def disk_cache_stats() -> Optional[Dict[str, Any]]:
+    return _disk_cache.stats() if _disk_cache is not None else None
+
+def warm_up_caches() -> int:
+    """Поднимает свежие изохроны из персистентного кэша в кэш процесса. Возвращает число записей."""
+    if _disk_cache is None or not _isochrone_cache.enabled:
+        return 0
+    loaded = 0
+    limit = min(_settings.PERSISTENT_CACHE_WARMUP_LIMIT, _isochrone_cache.maxsize)
+    for key, blob, ttl_left in _disk_cache.recent(_ISOCHRONE_NS, limit):
+        _isochrone_cache.set(key, shapely.from_wkb(blob), ttl_sec=min(ttl_left, _isochrone_cache.ttl_sec))
+        loaded += 1
+    return loaded
+
+async def _cached_isochrones(keys: List[Tuple]) -> List[Optional[MultiPolygon | Polygon]]:
+    """Кэш процесса, затем персистентный — одним походом в поток чтения SQLite на все промахи."""
+    found = [_isochrone_cache.get(key) for key in keys]
+    misses = [i for i, geom in enumerate(found) if geom is None]
+    if misses and _disk_cache is not None:
+        blobs = await _disk_cache.aget_many(_ISOCHRONE_NS, [keys[i] for i in misses])
+        for i, blob in zip(misses, blobs):
+            if blob is not None:
+                found[i] = shapely.from_wkb(blob)
+                _isochrone_cache.set(keys[i], found[i])
+    return found
+
+def _store_isochrone(key: Tuple, geom: MultiPolygon | Polygon) -> None:
+    _isochrone_cache.set(key, geom)
+    if _disk_cache is not None:
+        _disk_cache.set_later(_ISOCHRONE_NS, key, shapely.to_wkb(geom), _settings.PERSISTENT_CACHE_ISOCHRONE_TTL_SEC)
+
+def _snap(value: float, grid_deg: float) -> float:
+    if grid_deg <= 0:
+        return value
+    return round(round(value / grid_deg) * grid_deg, 7)
+
+def snap_point(lat: float, lon: float) -> Tuple[float, float]:
+    return _snap(lat, _settings.ISOCHRONE_CACHE_GRID_DEG), _snap(lon, _settings.ISOCHRONE_CACHE_GRID_DEG)
+
+def isochrone_time_bucket(start_time_iso: Optional[str]) -> Optional[TimeBucket]:
+    """Корзина времени запроса (для "сейчас" — текущая); None, если start_time не распознан — тогда он идёт в 2ГИС как есть."""
+    if not start_time_iso:
+        return bucket_for(datetime.now(timezone.utc))
+    dt = parse_start_time(start_time_iso)
+    return bucket_for(dt) if dt is not None else None
+
+def _time_key(bucket: TimeBucket, now: bool):
+    return ("now", bucket.iso) if now else bucket.iso
+
+def isochrone_time_key(start_time_iso: Optional[str]):
+    """Корзина времени, по которой изохроны считаются одинаковыми: начало корзины или ("now", начало корзины)."""
+    bucket = isochrone_time_bucket(start_time_iso)
+    return _time_key(bucket, not start_time_iso) if bucket is not None else start_time_iso
+
+@contextmanager
+def track_time_buckets() -> Iterator[Set[str]]:
+    """Собирает начала корзин, из которых на самом деле взяты изохроны (с учётом соседних при ISOCHRONE_BUCKET_REUSE_MIN)."""
+    used: Set[str] = set()
+    token = _buckets_used.set(used)
+    try:
+        yield used
+    finally:
+        _buckets_used.reset(token)
+
+def _note_bucket(label: Optional[str]) -> None:
+    used = _buckets_used.get()
+    if used is not None and label:
+        used.add(label)
+
+def describe_time_bucket(start_time_iso: Optional[str], used: Set[str]) -> Dict[str, Any]:
+    """Корзина запроса для properties ответа: начало, длина, "сейчас" ли, и соседние корзины, если изохроны брались из них."""
+    bucket = isochrone_time_bucket(start_time_iso)
+    if bucket is None:
+        return {"start": start_time_iso, "minutes": None, "now": False, "reused": []}
+    return {"start": bucket.iso, "minutes": bucket.minutes, "now": not start_time_iso, "reused": sorted(used - {bucket.iso})}
+
+async def _reuse_neighbors(
+    base_key: Tuple, bucket: TimeBucket, time_key: Any, missing: List[int], results_map: Dict[int, Any]
+) -> List[int]:
+    """
+    Добирает недостающие длительности из кэша той же корзины с другим видом времени ("сейчас" / явное)
+    и соседних корзин не дальше ISOCHRONE_BUCKET_REUSE_MIN, ближние первыми. Возвращает оставшиеся.
+    """
+    for alt in [bucket, *neighbor_buckets(bucket, _settings.ISOCHRONE_BUCKET_REUSE_MIN)]:
+        for alt_key in (alt.iso, ("now", alt.iso)):
+            if alt_key == time_key:
+                continue
+            alt_base = base_key[:4] + (alt_key,) + base_key[5:]
+            durations = list(missing)
+            for duration, geom in zip(durations, await _cached_isochrones([alt_base + (d,) for d in durations])):
+                if geom is not None:
+                    results_map[duration] = geom
+                    missing.remove(duration)
+                    _note_bucket(alt.iso)
+            if not missing:
+                return missing
+    return missing
+
+async def call_isochrone(
     lat: float,
     lon: float,
     durations_sec: List[int],
@@ -34,10 +157,113 @@ def call_isochrone(
     detailing: Optional[float] = None,
     max_durations_per_call: int = 5,
 ) -> List[Tuple[int, MultiPolygon | Polygon]]:
-    params = {"key": _settings.DGIS_API_KEY}
+    """
+    Изохроны для точки с кэшем перед 2ГИС.
+    Координаты прилипают к сетке ISOCHRONE_CACHE_GRID_DEG, start_time — к началу своей корзины
+    (ISOCHRONE_TIME_BUCKETS, иначе ISOCHRONE_CACHE_TIME_BUCKET_MIN), и в 2ГИС уходят уже нормализованные
+    значения, чтобы содержимое кэша не зависело от того, кто первым попал в ячейку.
+    Кэшируется каждая длительность отдельно, поэтому у лестниц разной длины общие ступени.
+    При ISOCHRONE_BUCKET_REUSE_MIN > 0 промахи сначала ищутся в кэше соседних корзин.
+    """
+    bucket = isochrone_time_bucket(start_time_iso)
+    now = not start_time_iso
+    if bucket is not None:
+        time_key = _time_key(bucket, now)
+        if not now:
+            start_time_iso = bucket.iso
+    else:
+        time_key = start_time_iso
+    label = bucket.iso if bucket is not None else start_time_iso
+
+    if not _isochrone_cache.enabled and _disk_cache is None:
+        _note_bucket(label)
+        return await _fetch_isochrone(
+            lat, lon, durations_sec, transport, reverse, start_time_iso, detailing, max_durations_per_call, time_key
+        )
+
+    lat, lon = snap_point(lat, lon)
+    base_key = (lat, lon, transport, reverse, time_key, detailing)
+
     results_map: dict[int, MultiPolygon | Polygon] = {}
+    missing: List[int] = []
+    durations = sorted(set(durations_sec))
+    for duration, geom in zip(durations, await _cached_isochrones([base_key + (d,) for d in durations])):
+        if geom is None:
+            missing.append(duration)
+        else:
+            results_map[duration] = geom
+    if results_map:
+        _note_bucket(label)
+
+    if missing and bucket is not None and _settings.ISOCHRONE_BUCKET_REUSE_MIN > 0:
+        missing = await _reuse_neighbors(base_key, bucket, time_key, missing, results_map)
+
+    if missing:
+        fetched = await _fetch_isochrone(
+            lat, lon, missing, transport, reverse, start_time_iso, detailing, max_durations_per_call, time_key
+        )
+        for duration, geom in fetched:
+            _store_isochrone(base_key + (duration,), geom)
+            results_map[duration] = geom
+        _note_bucket(label)
+
+    return sorted(results_map.items(), key=lambda x: x[0])
+
+def _parse_isochrones(responses: List[Dict[str, Any]]) -> Dict[int, MultiPolygon | Polygon]:
+    durations: List[int] = []
+    wkts: List[str] = []
+    for data in responses:
+        for item in data["isochrones"]:
+            geom_wkt = item.get("geometry")
+            duration = int(item.get("duration"))
+            if not geom_wkt:
+                continue
+            durations.append(duration)
+            wkts.append(geom_wkt)
+
+    # Все WKT разбираются одним векторным вызовом GEOS, а не wkt.loads на каждую строку
+    results_map: dict[int, MultiPolygon | Polygon] = {}
+    for duration, geom in zip(durations, shapely.from_wkt(wkts) if wkts else []):
+        if duration in results_map:
+            results_map[duration] = unary_union([results_map[duration], geom])
+        else:
+            results_map[duration] = geom
+    return results_map
+
+async def _fetch_isochrone(
+    lat: float,
+    lon: float,
+    durations_sec: List[int],
+    transport: str = "public_transport",
+    reverse: bool = False,
+    start_time_iso: Optional[str] = None,
+    detailing: Optional[float] = None,
+    max_durations_per_call: int = 5,
+    time_key: Any = None,
+) -> List[Tuple[int, MultiPolygon | Polygon]]:
+    # Одинаковые запросы, пришедшие одновременно (одна группа из нескольких вкладок), делят один вызов;
+    # "сейчас" склеивается в пределах своей корзины времени
+    key = (lat, lon, tuple(sorted(set(durations_sec))), transport, reverse, time_key or start_time_iso, detailing)
+    return await _isochrone_flight.do(
+        key,
+        lambda: _request_isochrone(
+            lat, lon, durations_sec, transport, reverse, start_time_iso, detailing, max_durations_per_call
+        ),
+    )
 
-    def _call(batch, use_start_time=True, use_detailing=True) -> requests.Response:
+async def _request_isochrone(
+    lat: float,
+    lon: float,
+    durations_sec: List[int],
+    transport: str = "public_transport",
+    reverse: bool = False,
+    start_time_iso: Optional[str] = None,
+    detailing: Optional[float] = None,
+    max_durations_per_call: int = 5,
+) -> List[Tuple[int, MultiPolygon | Polygon]]:
+    params = {"key": _settings.DGIS_API_KEY}
+
+    async def _call(batch, use_start_time=True, use_detailing=True) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "durations": batch,
             "start": {"lat": lat, "lon": lon},
@@ -50,33 +276,31 @@ def call_isochrone(
         if use_detailing and (detailing is not None):
             payload["detailing"] = float(detailing)
 
-        return _session.post(
-            str(_settings.ISOCHRONE_URL),
-            params=params,
-            json=payload,
-            timeout=_settings.HTTP_TIMEOUT_SEC,
-        )
+        try:
+            resp = await request(
+                "POST",
+                str(_settings.ISOCHRONE_URL),
+                upstream="isochrone",
+                params=params,
+                json=payload,
+            )
+        except httpx.HTTPError as e:
+            raise ExternalServiceError(f"Isochrone API error: {e}") from e
 
-    # батчим запросы по <=5 durations
-    for batch in chunked(sorted(set(durations_sec)), max_durations_per_call):
-        resp = _call(batch, use_start_time=True, use_detailing=True)
         if resp.status_code != 200:
             raise ExternalServiceError(f"Isochrone API HTTP {resp.status_code}: {resp.text}")
 
         data = resp.json()
         if data.get("status") != "OK" or "isochrones" not in data:
             raise IsochroneBuildError(str(data))
+        return data
 
-        for item in data["isochrones"]:
-            geom_wkt = item.get("geometry")
-            duration = int(item.get("duration"))
-            if not geom_wkt:
-                continue
-            geom = wkt.loads(geom_wkt)
-            if duration in results_map:
-                results_map[duration] = unary_union([results_map[duration], geom])
-            else:
-                results_map[duration] = geom
+    # батчим запросы по <=5 durations, батчи одной точки уходят параллельно
+    batches = list(chunked(sorted(set(durations_sec)), max_durations_per_call))
+    responses = await map_concurrent(_call, batches)
+    # Разбор WKT больших полигонов — заметная работа CPU, уносим её с event loop
+    with span("isochrone_parse"):
+        results_map = await run_cpu(_parse_isochrones, responses)
 
     if not results_map:
         raise IsochroneBuildError(
@@ -85,48 +309,108 @@ def call_isochrone(
 
     return sorted(results_map.items(), key=lambda x: x[0])
 
-def call_places_polygon(
+async def fetch_places_page(
     polygon_wkt: str,
     q: str = "cafe",
     page_size: int = 50,
+    page: int = 1,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Одна страница Places внутри полигона: (items, total). total — сколько всего нашёл 2ГИС, если он это сообщил."""
+    # WKT может быть длинным — в ключ кладём его хэш.
+    key = (hashlib.sha1(polygon_wkt.encode()).hexdigest(), q, page_size, page)
+    if _disk_cache is not None:
+        blob = (await _disk_cache.aget_many(_PLACES_NS, [key]))[0]
+        if blob is not None:
+            PLACES_PAGES.inc(source="cache")
+            cached = json.loads(blob)
+            return cached["items"], cached["total"]
+
+    return await _places_flight.do(key, lambda: _request_places_page(key, polygon_wkt, q, page_size, page))
+
+async def _request_places_page(
+    key: Tuple,
+    polygon_wkt: str,
+    q: str,
+    page_size: int,
+    page: int,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    params = {
+        "key": _settings.DGIS_API_KEY,
+        "q": q,
+        "type": "branch",
+        "polygon": polygon_wkt,
+        "fields": _items_fields(),
+        "page_size": page_size,
+        "page": page,
+    }
+    try:
+        resp = await request("GET", str(_settings.PLACES_ITEMS_URL), upstream="places", params=params)
+    except httpx.HTTPError as e:
+        raise ExternalServiceError(f"2ГИС Places error: {e}") from e
+
+    if resp.status_code != 200:
+        raise ExternalServiceError(f"2ГИС Places HTTP {resp.status_code}: {resp.text}")
+
+    PLACES_PAGES.inc(source="upstream")
+    data = resp.json()
+    result = data.get("result") or {}
+    page_items = result.get("items") or []
+    total = result.get("total")
+    total = int(total) if total is not None else None
+
+    if _disk_cache is not None:
+        payload = json.dumps({"items": page_items, "total": total}, ensure_ascii=False, separators=(",", ":"))
+        _disk_cache.set_later(_PLACES_NS, key, payload.encode(), _settings.PERSISTENT_CACHE_PLACES_TTL_SEC)
+    return page_items, total
+
+async def iter_places_polygons(
+    polygon_wkts: List[str],
+    q: str = "cafe",
+    page_size: int = 50,
     max_pages: int = 40,
-) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    page = 1
-    while page <= max_pages:
-        params = {
-            "key": _settings.DGIS_API_KEY,
-            "q": q,
-            "type": "branch",
-            "polygon": polygon_wkt,
-            "fields": _items_fields(),
-            "page_size": page_size,
-            "page": page,
-        }
-        try:
-            resp = _session.get(
-                str(_settings.PLACES_ITEMS_URL),
-                params=params,
-                timeout=_settings.HTTP_TIMEOUT_SEC,
-            )
-        except requests.RequestException as e:
-            raise ExternalServiceError(f"2ГИС Places error: {e}") from e
+) -> AsyncIterator[Tuple[int, int, List[Dict[str, Any]]]]:
+    """
+    Обходит Places сразу по нескольким полигонам и отдаёт (индекс полигона, страница, items) по мере прихода.
+    Сначала параллельно берутся первые страницы всех полигонов; по total из них становится известно,
+    сколько страниц осталось, и все остальные страницы всех полигонов качаются одной параллельной волной.
+    Если 2ГИС не вернул total, по такому полигону идём по страницам последовательно, как раньше.
+    """
+    limit = _settings.PLACES_CONCURRENCY
 
-        if resp.status_code != 200:
-            raise ExternalServiceError(f"2ГИС Places HTTP {resp.status_code}: {resp.text}")
+    async def _first_page(polygon_wkt: str) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        return await fetch_places_page(polygon_wkt, q, page_size, 1)
 
-        data = resp.json()
-        result = data.get("result") or {}
-        page_items = result.get("items") or []
-        if not page_items:
-            break
+    rest: List[Tuple[int, int]] = []
+    without_total: List[int] = []
+    async with aclosing(iter_concurrent(_first_page, polygon_wkts, limit)) as first_pages:
+        async for idx, (page_items, total) in first_pages:
+            if page_items:
+                yield idx, 1, page_items
+            if len(page_items) < page_size:
+                continue
+            if total is None:
+                without_total.append(idx)
+                continue
+            pages = min(max_pages, math.ceil(total / page_size))
+            rest.extend((idx, page) for page in range(2, pages + 1))
+
+    async def _next_page(task: Tuple[int, int]) -> List[Dict[str, Any]]:
+        idx, page = task
+        return (await fetch_places_page(polygon_wkts[idx], q, page_size, page))[0]
 
-        items.extend(page_items)
-        if len(page_items) < page_size:
-            break
-        page += 1
+    async with aclosing(iter_concurrent(_next_page, rest, limit)) as next_pages:
+        async for n, page_items in next_pages:
+            if page_items:
+                idx, page = rest[n]
+                yield idx, page, page_items
 
-    return items
+    for idx in without_total:
+        for page in range(2, max_pages + 1):
+            page_items, _ = await fetch_places_page(polygon_wkts[idx], q, page_size, page)
+            if page_items:
+                yield idx, page, page_items
+            if len(page_items) < page_size:
+                break
 
 def item_to_feature(it: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     pt = (it.get("point") or {})
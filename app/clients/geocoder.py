@@ -1,15 +1,42 @@
 # app/clients/geocoder.py
+import re
 from typing import Any, Dict, Optional, Tuple
-import requests
+import httpx
 from fastapi import HTTPException
 
+from ..core.cache import TTLCache
 from ..core.config import get_settings
-from ..core.http import get_session
+from ..core.http import request
+from ..core.singleflight import SingleFlight
 
 _settings = get_settings()
-_session = get_session()
+_geocode_cache = TTLCache(_settings.GEOCODE_CACHE_SIZE, _settings.GEOCODE_CACHE_TTL_SEC)
+_geocode_flight = SingleFlight("geocode")
 
-def geocode_one(
+_SPACES_RE = re.compile(r"\s+")
+
+def geocode_cache_stats() -> Dict[str, Any]:
+    return _geocode_cache.stats()
+
+def geocode_singleflight_stats() -> Dict[str, Any]:
+    return _geocode_flight.stats()
+
+def normalize_address(query: str) -> str:
+    """Регистр и пробелы не влияют на результат геокодера — по нормализованной строке и кэшируем."""
+    return _SPACES_RE.sub(" ", query).strip().casefold()
+
+def _round_location(location: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    # Хинт location влияет только на сортировку — хватает ~100 м точности
+    return (round(location[0], 3), round(location[1], 3)) if location else None
+
+def geocode_cache_key(
+    query: str,
+    location: Optional[Tuple[float, float]] = None,
+    city_id: Optional[str] = None,
+) -> Tuple:
+    return (normalize_address(query), city_id, _round_location(location))
+
+async def geocode_one(
     query: str,
     *,
     location: Optional[Tuple[float, float]] = None,  # (lon, lat) — для сортировки по расстоянию
@@ -20,7 +47,32 @@ def geocode_one(
     Прямое геокодирование строки адреса в (lat, lon).
     Использует /3.0/items/geocode с полями items.point.
     Если ничего не найдено — HTTP 404.
+    Найденные координаты кэшируются по нормализованному адресу и хинтам; промахи не кэшируются.
+    Одинаковые запросы, пришедшие одновременно, делят один поход в 2ГИС.
+    В 2ГИС уходит тот же округлённый location, что и в ключе кэша.
     """
+    location = _round_location(location)
+    cache_key = geocode_cache_key(query, location, city_id) if page_size == 1 else None
+    if cache_key is not None:
+        cached = _geocode_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    flight_key = cache_key or (query, location, city_id, page_size)
+    point = await _geocode_flight.do(
+        flight_key, lambda: _geocode_request(query, location=location, city_id=city_id, page_size=page_size)
+    )
+    if cache_key is not None:
+        _geocode_cache.set(cache_key, point)
+    return point
+
+async def _geocode_request(
+    query: str,
+    *,
+    location: Optional[Tuple[float, float]] = None,
+    city_id: Optional[str] = None,
+    page_size: int = 1
+) -> Tuple[float, float]:
     params: Dict[str, Any] = {
         "key": _settings.DGIS_API_KEY,
         "fields": "items.point,items.full_name",
@@ -39,8 +91,8 @@ def geocode_one(
         params["sort"] = "distance"
 
     try:
-        resp = _session.get("https://catalog.api.2gis.com/3.0/items/geocode", params=params, timeout=_settings.HTTP_TIMEOUT_SEC)
-    except requests.RequestException as e:
+        resp = await request("GET", str(_settings.GEOCODE_URL), upstream="geocode", params=params)
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"2ГИС Geocoder error: {e}") from e
 
     if resp.status_code != 200:
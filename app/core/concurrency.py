@@ -0,0 +1,94 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+@lru_cache(maxsize=1)
+def get_cpu_executor() -> ThreadPoolExecutor:
+    # Shapely 2 отпускает GIL в GEOS-операциях, поэтому потоки дают реальный параллелизм
+    # и не блокируют event loop, пока считаются пересечения.
+    st = get_settings()
+    return ThreadPoolExecutor(max_workers=st.GEOMETRY_THREADS, thread_name_prefix="geometry")
+
+async def run_cpu(fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """Выполняет тяжёлую синхронную функцию (геометрию) в пуле потоков, не занимая event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), partial(fn, *args, **kwargs))
+
+@lru_cache(maxsize=1)
+def get_process_executor() -> ProcessPoolExecutor:
+    # spawn, а не fork: в родителе уже крутятся потоки event loop, пула и клиента
+    st = get_settings()
+    return ProcessPoolExecutor(max_workers=st.GEOMETRY_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+
+async def run_in_process(fn: Callable[..., R], *args: Any) -> R:
+    """
+    Выполняет функцию в пуле процессов (GEOMETRY_PROCESSES) — для геометрии, которая иначе
+    делила бы GIL с кодированием JSON и валидацией других запросов. fn и аргументы должны
+    пиклиться, поэтому геометрии передаются как WKB.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_executor(), fn, *args)
+
+def shutdown_process_executor() -> None:
+    if get_process_executor.cache_info().currsize:
+        get_process_executor().shutdown(cancel_futures=True)
+        get_process_executor.cache_clear()
+
+async def iter_concurrent(
+    fn: Callable[[T], Awaitable[R]], items: Iterable[T], limit: Optional[int] = None
+) -> AsyncIterator[Tuple[int, R]]:
+    """
+    Запускает корутину fn для каждого элемента и отдаёт пары (индекс, результат) по мере готовности.
+    Одновременно в работе не более limit задач (лимит на один запрос, чтобы одна большая группа
+    не заняла весь пул соединений). При первой ошибке или если потребитель закрыл генератор,
+    остальные задачи отменяются, а ошибка пробрасывается как есть.
+    """
+    args = list(items)
+    if not args:
+        return
+    limit = max(1, limit or len(args))
+
+    pending: Dict["asyncio.Task[R]", int] = {}
+    next_idx = 0
+
+    def _submit_next() -> None:
+        nonlocal next_idx
+        task = asyncio.ensure_future(fn(args[next_idx]))
+        pending[task] = next_idx
+        next_idx += 1
+
+    try:
+        while next_idx < len(args) and len(pending) < limit:
+            _submit_next()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = pending.pop(task)
+                result = task.result()  # пробрасывает исключение задачи
+                while next_idx < len(args) and len(pending) < limit:
+                    _submit_next()
+                yield idx, result
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def map_concurrent(
+    fn: Callable[[T], Awaitable[R]], items: Iterable[T], limit: Optional[int] = None
+) -> List[R]:
+    """То же, что iter_concurrent, но возвращает список результатов в исходном порядке."""
+    args = list(items)
+    results: Dict[int, R] = {}
+    gen = iter_concurrent(fn, args, limit)
+    try:
+        async for idx, result in gen:
+            results[idx] = result
+    finally:
+        await gen.aclose()
+    return [results[i] for i in range(len(args))]
@@ -7,13 +7,94 @@ class Settings(BaseSettings):
     DGIS_API_KEY: str = Field(..., description="Ключ 2ГИС")
     ISOCHRONE_URL: AnyHttpUrl = Field("https://routing.api.2gis.com/isochrone/2.0.0")
     PLACES_ITEMS_URL: AnyHttpUrl = Field("https://catalog.api.2gis.com/3.0/items")
+    GEOCODE_URL: AnyHttpUrl = Field("https://catalog.api.2gis.com/3.0/items/geocode")
 
     HTTP_TIMEOUT_SEC: int = 30
     HTTP_RETRY_TOTAL: int = 3
     HTTP_RETRY_BACKOFF: float = 1  # секунды
-    HTTP_POOL_SIZE: int = 10
+    HTTP_POOL_SIZE: int = 100
+    HTTP2_ENABLED: bool = True
+    # Ограничители перед эндпоинтами 2ГИС (на процесс): qps тарифа и адаптивный лимит одновременных запросов
+    RATE_LIMIT_ISOCHRONE_QPS: float = 10  # 0 — без ограничения
+    RATE_LIMIT_PLACES_QPS: float = 20
+    RATE_LIMIT_GEOCODE_QPS: float = 20
+    RATE_LIMIT_BURST: int = 10
+    UPSTREAM_CONCURRENCY_MIN: int = 2  # ниже не опускаемся даже под шквалом 429
+    UPSTREAM_CONCURRENCY_MAX: int = 32  # стартовый и максимальный лимит
+    GEOJSON_PRECISION: int = 6  # знаков после запятой в координатах ответа (~0.1 м)
+    SERVER_TIMING_ENABLED: bool = False  # заголовок Server-Timing с этапами запроса
+    GEOMETRY_THREADS: int = 4  # потоки для Shapely, чтобы не блокировать event loop
+    GEOMETRY_PROCESSES: int = 0  # процессы для тяжёлых пересечений изохрон; 0 — всё в потоках
+    GEOMETRY_PROCESS_MIN_VERTICES: int = 20000  # меньше вершин на входе — считаем в потоке, не платя за WKB и IPC
+    ISOCHRONE_CONCURRENCY: int = 6  # одновременных запросов изохрон на один входящий запрос
+    PLACES_CONCURRENCY: int = 8  # одновременных страниц Places на один входящий запрос
+    GEOCODE_CONCURRENCY: int = 8  # одновременных запросов геокодера на один входящий запрос
 
     MAX_MINUTES_CAP: int = 40  # защитный потолок для итеративного поиска
+    ISOCHRONE_LADDER_MODE: bool = True  # запрашивать все пороги поиска одним пакетом на участника
+    SEARCH_PRECISION_MIN: int = 5  # до какой ширины (мин) сужать бисекцией найденный интервал; 0 — без бисекции
+    RASTER_MIN_PARTICIPANTS: int = 10  # с такой группы engine=auto пересекает изохроны на сетке; 0 — только полигоны
+    RASTER_CELL_M: float = 50  # сторона клетки сетки по умолчанию
+    RASTER_MAX_CELLS: int = 2_000_000  # больше клеток на запрос — клетка укрупняется
+
+    # Сессии инкрементального пересчёта (состояние в памяти воркера)
+    SESSION_MAX_COUNT: int = 1000
+    SESSION_IDLE_SEC: int = 900  # простаивающие дольше — выбрасываются
+    SESSION_MAX_PARTICIPANTS: int = 30
+
+    # Пакетный расчёт многих групп (POST /batch/areas и python -m app.cli batch)
+    BATCH_MAX_GROUPS: int = 1000
+    BATCH_GROUP_CONCURRENCY: int = 8  # групп в расчёте одновременно
+    BATCH_UPSTREAM_CONCURRENCY: int = 16  # общий на весь батч лимит одновременных запросов изохрон
+
+    # Подготовка полигонов для запроса Places
+    PLACES_MAX_VERTICES: int = 250  # бюджет вершин на один полигон в запросе
+    PLACES_MIN_POLYGON_AREA_M2: float = 2500  # полигоны-щепки меньше этого не запрашиваем
+    PLACES_COORD_PRECISION: int = 6  # знаков после запятой в WKT (~0.1 м)
+    PLACES_QUERY_COVER: str = "none"  # none|hull|bbox — чем покрывать область в запросе
+    CAFES_ARRIVAL_STEP_MIN: int = 5  # шаг полос времени в пути до кафе ниже первого порога поиска; 0 — только пороги поиска
+
+    # Локальный снимок кафе города вместо запросов Places на каждый поиск
+    PLACES_INDEX_ENABLED: bool = False
+    PLACES_INDEX_BBOX: Optional[str] = None  # "min_lon,min_lat,max_lon,max_lat"
+    PLACES_INDEX_TILE_DEG: float = 0.02  # стартовый размер плитки обхода, ~2 км
+    PLACES_INDEX_REFRESH_SEC: int = 24 * 3600
+    PLACES_INDEX_MAX_AGE_SEC: int = 48 * 3600  # старше — снимок не используем, идём в Places
+    PLACES_INDEX_PATH: Optional[str] = None  # файл снимка (.npz), общий для воркеров
+
+    # Фоновый прогрев изохрон для популярных точек (офисы, метро, кампусы)
+    HOT_ORIGINS_ENABLED: bool = False
+    HOT_ORIGINS_PATH: Optional[str] = None  # файл "lat,lon[,название]" по строке на точку
+    HOT_ORIGINS_MINUTES: str = "25,35"  # сверх лестницы и полос кафе по умолчанию (мин) — пороги бисекции
+    HOT_ORIGINS_START_TIMES: Optional[str] = None  # времена суток UTC "08:30,18:00" в дополнение к "сейчас"
+    HOT_ORIGINS_SNAP_RADIUS_M: float = 150  # участника ближе этого подменяем прогретой точкой; 0 — не подменяем
+    HOT_ORIGINS_REFRESH_SEC: int = 900  # не реже; "сейчас" всё равно прогревается на каждой смене корзины
+    HOT_ORIGINS_CONCURRENCY: int = 4
+
+    # Кэш изохрон в памяти процесса (0 в размере или TTL — выключен)
+    ISOCHRONE_CACHE_SIZE: int = 4096  # записей (точка × длительность); с прогревом — не меньше точек × ступеней × времён
+    ISOCHRONE_CACHE_TTL_SEC: int = 1800
+    ISOCHRONE_CACHE_GRID_DEG: float = 0.0005  # шаг сетки для координат, ~50 м
+    ISOCHRONE_CACHE_TIME_BUCKET_MIN: int = 15  # корзина start_time вне правил ISOCHRONE_TIME_BUCKETS
+    ISOCHRONE_TIME_BUCKETS: Optional[str] = None  # "mon-fri 07:00-22:00=15; 22:00-07:00=60" — корзины по времени суток
+    ISOCHRONE_TIME_BUCKETS_UTC_OFFSET_MIN: int = 180  # в каком поясе записаны правила (Москва)
+    ISOCHRONE_BUCKET_REUSE_MIN: int = 0  # при промахе брать изохрону из корзины не дальше стольких минут; 0 — только своя
+
+    # Кэш готовых ответов по каноническому запросу (ETag/304)
+    RESPONSE_CACHE_SIZE: int = 1000  # ответов; 0 — выключен
+    RESPONSE_CACHE_TTL_SEC: int = 600
+    RESPONSE_CACHE_MAX_ITEM_KB: int = 1024  # ответы крупнее не кэшируем
+
+    # Кэш геокодера по нормализованному адресу
+    GEOCODE_CACHE_SIZE: int = 10000
+    GEOCODE_CACHE_TTL_SEC: int = 7 * 24 * 3600
+
+    # Персистентный кэш в SQLite, общий для воркеров (пустой путь — выключен)
+    PERSISTENT_CACHE_PATH: Optional[str] = None
+    PERSISTENT_CACHE_MAX_MB: int = 256
+    PERSISTENT_CACHE_ISOCHRONE_TTL_SEC: int = 6 * 3600
+    PERSISTENT_CACHE_PLACES_TTL_SEC: int = 24 * 3600
+    PERSISTENT_CACHE_WARMUP_LIMIT: int = 2000  # сколько свежих изохрон поднять в память при старте
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace  TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      BLOB NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+CREATE INDEX IF NOT EXISTS entries_created ON entries (namespace, created_at);
+"""
+
+def encode_key(key: Hashable) -> str:
+    return json.dumps(key, separators=(",", ":"), ensure_ascii=False)
+
+def decode_key(raw: str) -> Hashable:
+    # Кортежи после JSON становятся списками — возвращаем их обратно (с вложенными).
+    def _tuplify(v: Any) -> Any:
+        return tuple(_tuplify(x) for x in v) if isinstance(v, list) else v
+    return _tuplify(json.loads(raw))
+
+class SqliteCache:
+    """
+    Персистентный кэш в SQLite-файле: переживает рестарт контейнера и общий для всех воркеров uvicorn
+    (WAL позволяет читать параллельно с записью). Значения — байты, ключи — JSON, записи разделены
+    по namespace. Любая ошибка SQLite трактуется как промах, чтобы кэш не ронял запросы.
+    Из асинхронного кода — только aget_many/set_later: чтения идут в своём потоке, записи (и prune)
+    — в фоне в другом, так что ожидание блокировки между воркерами не останавливает event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int, prune_every: int = 200):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk-cache-write")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, counter: str) -> None:
+        # Счётчики меняют потоки чтения, записи и прогрева — под той же блокировкой, что и _writes
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, namespace: str, key: Hashable) -> Optional[bytes]:
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, encode_key(key), time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning("disk cache read failed: %s", e)
+            return None
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return row[0]
+
+    def get_many(self, namespace: str, keys: List[Hashable]) -> List[Optional[bytes]]:
+        return [self.get(namespace, key) for key in keys]
+
+    async def aget_many(self, namespace: str, keys: List[Hashable]) -> List[Optional[bytes]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, self.get_many, namespace, list(keys))
+
+    def set_later(self, namespace: str, key: Hashable, value: bytes, ttl_sec: float) -> None:
+        """set в фоновом потоке записи; запрос его не ждёт."""
+        self._writer.submit(self.set, namespace, key, value, ttl_sec)
+
+    def flush(self) -> None:
+        """Дожидается уже поставленных фоновых записей."""
+        self._writer.submit(lambda: None).result()
+
+    def set(self, namespace: str, key: Hashable, value: bytes, ttl_sec: float) -> None:
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, encode_key(key), sqlite3.Binary(value), len(value), now, now + ttl_sec),
+            )
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning("disk cache write failed: %s", e)
+            return
+        with self._lock:
+            self._writes += 1
+            need_prune = self._writes % self.prune_every == 0
+        if need_prune:
+            self.prune()
+
+    def recent(self, namespace: str, limit: int) -> Iterator[Tuple[Hashable, bytes, float]]:
+        """Свежие живые записи namespace (ключ, значение, оставшийся TTL) — для прогрева кэша в памяти."""
+        now = time.time()
+        try:
+            rows: List[Tuple[str, bytes, float]] = self._conn().execute(
+                "SELECT key, value, expires_at FROM entries WHERE namespace = ? AND expires_at > ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (namespace, now, limit),
+            ).fetchall()
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning("disk cache warm-up failed: %s", e)
+            return
+        for raw_key, value, expires_at in rows:
+            yield decode_key(raw_key), value, expires_at - now
+
+    def prune(self) -> None:
+        """Удаляет просроченные записи, затем самые старые, пока объём не станет меньше лимита."""
+        conn = self._conn()
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            doomed: List[Tuple[str, str]] = []
+            for namespace, key, size in conn.execute(
+                "SELECT namespace, key, size FROM entries ORDER BY created_at"
+            ):
+                if total <= target:
+                    break
+                doomed.append((namespace, key))
+                total -= size
+            conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning("disk cache prune failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            count, size = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        except sqlite3.Error:
+            count, size = None, None
+        with self._lock:
+            counters = {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+        return {"path": self.path, "entries": count, "bytes": size, "max_bytes": self.max_bytes, **counters}
+
+@lru_cache(maxsize=1)
+def get_disk_cache() -> Optional[SqliteCache]:
+    st = get_settings()
+    if not st.PERSISTENT_CACHE_PATH:
+        return None
+    try:
+        return SqliteCache(st.PERSISTENT_CACHE_PATH, max_bytes=st.PERSISTENT_CACHE_MAX_MB * 1024 * 1024)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("persistent cache disabled, cannot open %s: %s", st.PERSISTENT_CACHE_PATH, e)
+        return None
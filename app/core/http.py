@@ -1,20 +1,109 @@
-import requests
-from urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+import asyncio
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
 from .config import get_settings
+from .metrics import UPSTREAM_SECONDS
+from .ratelimit import get_limiter
 
-def get_session() -> requests.Session:
-    s = requests.Session()
-    st = get_settings()
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Клиент привязан к event loop, в котором создан: держим по одному на loop
+# (uvicorn — один loop на воркер, CLI/тесты могут поднимать свои).
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+# Счётчик походов в апстрим для текущего входящего запроса (задачи наследуют контекст)
+_request_counter: ContextVar[Optional[Dict[str, int]]] = ContextVar("upstream_request_counter", default=None)
+
+@contextmanager
+def track_upstream_requests() -> Iterator[Dict[str, int]]:
+    counter = {"requests": 0}
+    token = _request_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _request_counter.reset(token)
 
-    retries = Retry(
-        total=st.HTTP_RETRY_TOTAL,
-        backoff_factor=st.HTTP_RETRY_BACKOFF,
-        status_forcelist=(502, 503, 504),
-        allowed_methods=frozenset(["GET", "POST"]),
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=st.HTTP_POOL_SIZE, pool_maxsize=st.HTTP_POOL_SIZE)
-    s.mount("http://", adapter)
-    s.mount("https://", adapter)
-    return s
\ No newline at end of file
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        st = get_settings()
+        client = httpx.AsyncClient(
+            http2=st.HTTP2_ENABLED,
+            timeout=st.HTTP_TIMEOUT_SEC,
+            limits=httpx.Limits(max_connections=st.HTTP_POOL_SIZE, max_keepalive_connections=st.HTTP_POOL_SIZE),
+        )
+        _clients[loop] = client
+    return client
+
+async def aclose_client() -> None:
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+def _backoff_sec(failures: int, factor: float) -> float:
+    # Как в urllib3 Retry: первый повтор сразу, дальше factor * 2^(n-1)
+    if failures <= 1:
+        return 0.0
+    return factor * (2 ** (failures - 1))
+
+def _retry_after_sec(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+async def request(method: str, url: str, upstream: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+    """
+    Запрос через общий AsyncClient с повторами, эквивалентными прежнему urllib3 Retry:
+    до HTTP_RETRY_TOTAL повторов на сетевые ошибки, 429 и 502/503/504 с экспоненциальной паузой
+    (Retry-After, если сервер его прислал). Последний ответ с ошибкой возвращается как есть.
+    upstream — имя эндпоинта 2ГИС: каждая попытка проходит через его ограничитель
+    (qps, адаптивный лимит одновременных запросов, приоритет), а ответ подстраивает лимит.
+    """
+    st = get_settings()
+    client = get_async_client()
+    limiter = get_limiter(upstream) if upstream else None
+    failures = 0
+    counter = _request_counter.get()
+    while True:
+        if counter is not None:
+            counter["requests"] += 1
+        started = time.perf_counter()
+        try:
+            if limiter is None:
+                resp = await client.request(method, url, **kwargs)
+            else:
+                async with limiter.slot():
+                    started = time.perf_counter()  # ожидание в очереди ограничителя не считаем
+                    resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint=upstream or "other", status="error")
+            if limiter is not None:
+                limiter.on_overload()
+            if failures >= st.HTTP_RETRY_TOTAL:
+                raise
+            delay = None
+        else:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint=upstream or "other", status=resp.status_code)
+            retryable = resp.status_code in _RETRY_STATUSES
+            if limiter is not None:
+                if retryable or resp.status_code >= 500:
+                    limiter.on_overload(resp.status_code, _retry_after_sec(resp))
+                else:
+                    limiter.on_success()
+            if not retryable or failures >= st.HTTP_RETRY_TOTAL:
+                return resp
+            delay = _retry_after_sec(resp)
+            await resp.aclose()
+        failures += 1
+        await asyncio.sleep(delay if delay is not None else _backoff_sec(failures, st.HTTP_RETRY_BACKOFF))
@@ -0,0 +1,165 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Минимальный реестр метрик в текстовом формате Prometheus (exposition format 0.0.4),
+# без внешних зависимостей. Значения — на процесс; при нескольких воркерах uvicorn
+# Prometheus собирает каждый воркер отдельно и суммирует на своей стороне.
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, Any], float]
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_SIZE_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+def _labels_key(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    parts = [f'{k}="{_escape(str(v))}"' for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.type = "counter"
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels: Any) -> None:
+        with self._lock:
+            self._values[_labels_key(labels)] += value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(k), v) for k, v in self._values.items()]
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = _LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.type = "histogram"
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels_key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[key] += value
+
+    def samples(self) -> List[Sample]:
+        out: List[Sample] = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                labels = dict(key)
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    out.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count))
+                out.append((f"{self.name}_sum", labels, self._sums[key]))
+                out.append((f"{self.name}_count", labels, counts[-1]))
+        return out
+
+class Gauges:
+    """Метрики, которые читаются в момент сбора из уже существующих stats() (кэши, ограничители)."""
+
+    def __init__(self, name: str, help_text: str, metric_type: str, collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self._collect = collect
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, value) for labels, value in self._collect() if value is not None]
+
+_registry: List[Any] = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def counter(name: str, help_text: str) -> Counter:
+    return register(Counter(name, help_text))
+
+def histogram(name: str, help_text: str, buckets: Tuple[float, ...] = _LATENCY_BUCKETS) -> Histogram:
+    return register(Histogram(name, help_text, buckets))
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# Метрики конвейера
+HTTP_REQUEST_SECONDS = histogram("app_http_request_duration_seconds", "Входящие запросы по маршруту и статусу")
+STAGE_SECONDS = histogram("app_stage_duration_seconds", "Длительность этапов обработки запроса")
+UPSTREAM_SECONDS = histogram("app_upstream_request_duration_seconds", "Запросы к 2ГИС по эндпоинту и статусу")
+GEOMETRY_VERTICES = histogram("app_geometry_vertices", "Число вершин геометрий по виду", _SIZE_BUCKETS)
+PLACES_PAGES = counter("app_places_pages_total", "Страницы Places по источнику")
+GEOMETRY_TASK_SECONDS = histogram(
+    "app_geometry_task_duration_seconds", "Пересечения изохрон по исполнителю (thread|process), движку (polygon|raster) и размеру входа в вершинах"
+)
+
+def size_bucket(value: float) -> str:
+    """Верхняя граница корзины _SIZE_BUCKETS для значения — метка размера с ограниченной кардинальностью."""
+    for bound in _SIZE_BUCKETS:
+        if value <= bound:
+            return str(bound)
+    return "+Inf"
+
+# Тайминги этапов текущего входящего запроса — для заголовка Server-Timing
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Замер этапа: гистограмма app_stage_duration_seconds{stage} и, если идёт входящий запрос,
+    строка в его Server-Timing. Параллельные одноимённые этапы суммируются.
+    Контекст не переходит в пул потоков run_cpu — оборачивать нужно await run_cpu(...), а не саму функцию.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from .config import get_settings
+
+# Меньше — раньше. Интерактивные запросы пользователей обгоняют фоновый прогрев кэшей.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    # Задачи, созданные внутри, наследуют приоритет вместе с контекстом
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class UpstreamLimiter:
+    """
+    Ворота перед одним эндпоинтом 2ГИС:
+    - token bucket на qps (лимит тарифа по ключу), burst — запас токенов;
+    - AIMD-лимит одновременных запросов: +1 за каждые limit успешных ответов,
+      ×decrease на 429/5xx/сетевую ошибку (не чаще раза в cooldown), Retry-After ставит паузу;
+    - очередь с приоритетами: свободный слот получает ждущий с меньшим приоритетом, затем — кто раньше.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        qps: float,
+        burst: int,
+        min_limit: int,
+        max_limit: int,
+        decrease: float = 0.5,
+        cooldown_sec: float = 1.0,
+    ):
+        self.name = name
+        self.qps = qps
+        self.burst = max(1, burst)
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease = decrease
+        self.cooldown_sec = cooldown_sec
+
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.requests = 0
+        self.throttled = 0
+        self.overloaded = 0
+        self.wait_sec_total = 0.0
+
+    def _refill(self, now: float) -> None:
+        if self.qps > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.qps)
+        self._refilled_at = now
+
+    def _pump(self) -> None:
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, fut = self._waiters[0]
+            if fut.done():  # ждущий отменён
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._paused_until - now
+            if delay <= 0 and self.qps > 0 and self._tokens < 1:
+                delay = (1 - self._tokens) / self.qps
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            if self.qps > 0:
+                self._tokens -= 1
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _wake(self) -> None:
+        if self._timer is None:
+            self._pump()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None) -> AsyncIterator[None]:
+        fut: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (_priority.get() if priority is None else priority, next(self._seq), fut))
+        started = time.monotonic()
+        self._wake()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Слот уже выдан, но ждущий ушёл — вернуть его следующему
+                self.in_flight -= 1
+                self._wake()
+            raise
+        self.wait_sec_total += time.monotonic() - started
+        self.requests += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self) -> None:
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self, status: Optional[int] = None, retry_after: Optional[float] = None) -> None:
+        now = time.monotonic()
+        if status == 429:
+            self.throttled += 1
+        else:
+            self.overloaded += 1
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        # Ответы одной волны приходят пачкой — режем лимит один раз на волну, а не на каждый ответ
+        if now - self._decreased_at >= self.cooldown_sec:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            self._decreased_at = now
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "qps": self.qps,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for _, _, fut in self._waiters if not fut.done()),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "overloaded": self.overloaded,
+            "avg_wait_ms": round(self.wait_sec_total / self.requests * 1000, 2) if self.requests else None,
+            "paused_sec": round(max(0.0, self._paused_until - time.monotonic()), 2),
+        }
+
+_limiters: Dict[str, UpstreamLimiter] = {}
+
+def get_limiter(name: str) -> UpstreamLimiter:
+    limiter = _limiters.get(name)
+    if limiter is None:
+        st = get_settings()
+        qps = {
+            "isochrone": st.RATE_LIMIT_ISOCHRONE_QPS,
+            "places": st.RATE_LIMIT_PLACES_QPS,
+            "geocode": st.RATE_LIMIT_GEOCODE_QPS,
+        }.get(name, 0)
+        limiter = UpstreamLimiter(
+            name,
+            qps=qps,
+            burst=st.RATE_LIMIT_BURST,
+            min_limit=st.UPSTREAM_CONCURRENCY_MIN,
+            max_limit=st.UPSTREAM_CONCURRENCY_MAX,
+        )
+        _limiters[name] = limiter
+    return limiter
+
+def limiter_stats() -> Dict[str, Any]:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
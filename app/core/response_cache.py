@@ -0,0 +1,121 @@
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+from .cache import TTLCache
+from .config import get_settings
+from .singleflight import SingleFlight
+from .streaming import Event, encode_ndjson, event_stream, wants_sse
+
+_settings = get_settings()
+
+class CachedResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    media_type: Optional[str]
+    headers: Dict[str, str]
+    etag: str
+
+class CachedStream(NamedTuple):
+    events: List[Event]
+    digest: str  # хэш событий; ETag к нему добавляет формат ответа
+
+_cache = TTLCache(_settings.RESPONSE_CACHE_SIZE, _settings.RESPONSE_CACHE_TTL_SEC)
+_flight = SingleFlight("response")
+
+def response_cache_stats() -> Dict[str, Any]:
+    return {**_cache.stats(), "singleflight": _flight.stats()}
+
+def canonical_key(kind: str, payload: Dict[str, Any]) -> str:
+    """Хэш канонического представления запроса: ключи сортируются, списки участников вызывающий сортирует сам."""
+    return hashlib.sha1(kind.encode() + b"\0" + orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def _stream_etag(digest: str, sse: bool) -> str:
+    # Одни и те же события в NDJSON и SSE — разные байты, поэтому и ETag у представлений разный
+    return '"' + digest + ("-sse" if sse else "-ndjson") + '"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def _to_response(request: Request, cached: CachedResponse, hit: bool) -> Response:
+    headers = {
+        **cached.headers,
+        "ETag": cached.etag,
+        "Cache-Control": f"private, max-age={_settings.RESPONSE_CACHE_TTL_SEC}",
+        "X-Cache": "HIT" if hit else "MISS",
+    }
+    if cached.status_code == 200 and _matches(request, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, status_code=cached.status_code, media_type=cached.media_type, headers=headers)
+
+async def cached_response(request: Request, key: str, build: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Готовый ответ (байты, тип, свои заголовки) по каноническому ключу запроса с ETag/If-None-Match.
+    Одинаковые запросы, пришедшие одновременно, считаются один раз. Кэшируются только 200
+    не больше RESPONSE_CACHE_MAX_ITEM_KB; ошибки (HTTPException) пробрасываются как есть.
+    """
+    cached = _cache.get(key)
+    if cached is not None:
+        return _to_response(request, cached, hit=True)
+
+    async def _build() -> CachedResponse:
+        response = await build()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")}
+        entry = CachedResponse(
+            response.status_code, bytes(response.body), response.media_type, headers, _etag(response.body)
+        )
+        if response.status_code == 200 and len(entry.body) <= _settings.RESPONSE_CACHE_MAX_ITEM_KB * 1024:
+            _cache.set(key, entry)
+        return entry
+
+    return _to_response(request, await _flight.do(key, _build), hit=False)
+
+async def _replay(events: List[Event]) -> AsyncIterator[Event]:
+    for event in events:
+        yield event
+
+def cached_event_stream(request: Request, key: str, events: Callable[[], AsyncIterator[Event]]) -> Response:
+    """
+    Потоковый ответ поверх того же кэша: поток, дошедший до конца без ошибки, запоминается списком
+    событий и повторно отдаётся из кэша целиком — с ETag и 304 на If-None-Match (NDJSON или SSE, как
+    попросил клиент, ETag у каждого формата свой, Vary: Accept). Первый запрос идёт вживую, без ETag;
+    одновременные одинаковые потоки не склеиваются.
+    """
+    cached = _cache.get(key)
+    if isinstance(cached, CachedStream):
+        etag = _stream_etag(cached.digest, wants_sse(request))
+        headers = {"ETag": etag, "X-Cache": "HIT"}
+        if _matches(request, etag):
+            return Response(status_code=304, headers={**headers, "Vary": "Accept"})
+        return event_stream(request, _replay(cached.events), headers)
+
+    async def _tee() -> AsyncIterator[Event]:
+        seen: List[Event] = []
+        async for event in events():
+            seen.append(event)
+            yield event
+        body = b"".join(encode_ndjson(name, data) for name, data in seen)
+        if len(body) <= _settings.RESPONSE_CACHE_MAX_ITEM_KB * 1024:
+            _cache.set(key, CachedStream(seen, hashlib.sha1(body).hexdigest()))
+
+    return event_stream(request, _tee(), {"X-Cache": "MISS"})
+
+def group_cache_key(kind: str, req, participants: List[Any], time_key: Any, keep_order: bool = False) -> str:
+    """
+    Ключ запроса группы: участники (уже квантованные или нормализованные) сортируются,
+    чтобы порядок не влиял, start_time заменяется его корзиной, остальные поля берутся как есть.
+    keep_order — для ответов, где данные идут по участникам в порядке запроса.
+    """
+    payload = req.model_dump(exclude={"people", "addresses", "start_time_iso"})
+    payload["participants"] = list(participants) if keep_order else sorted(participants)
+    payload["time"] = time_key
+    return canonical_key(kind, payload)
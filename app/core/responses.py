@@ -0,0 +1,52 @@
+import json
+from typing import Any, Dict, Optional
+
+import orjson
+import shapely
+from fastapi.responses import JSONResponse, Response
+
+from ..geometry.ops import encode_polyline, explode_polygons, polygons_to_coordinates, to_feature_collection
+from .config import get_settings
+
+_settings = get_settings()
+
+def dumps(data: Any) -> bytes:
+    # numpy-скаляры и массивы в свойствах сериализуются без ручного .tolist()
+    return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class GeoJSONResponse(JSONResponse):
+    """JSON через orjson; обработчик возвращает её сам, поэтому FastAPI не гоняет ответ через jsonable_encoder."""
+
+    media_type = "application/geo+json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def area_response(geom, props: Dict[str, Any], output_format: str = "geojson", precision: Optional[int] = None) -> Response:
+    """
+    Область в выбранном формате:
+    - geojson — FeatureCollection (по фиче на полигон) с координатами, округлёнными до precision знаков;
+    - wkb — бинарный WKB всей геометрии, свойства — JSON в заголовке X-Properties;
+    - polyline — {"properties", "precision", "polygons": [[кольцо в Encoded Polyline, ...], ...]}.
+    """
+    if precision is None:
+        precision = _settings.GEOJSON_PRECISION
+    if output_format == "wkb":
+        # Округление до сетки даёт такой же выигрыш по точности, как у GeoJSON
+        blob = shapely.to_wkb(shapely.set_precision(geom, 10.0 ** -precision))
+        return Response(
+            blob,
+            media_type="application/vnd.geo+wkb",
+            headers={"X-Properties": json.dumps(props, ensure_ascii=True, separators=(",", ":"))},
+        )
+    if output_format == "polyline":
+        polyline_precision = min(precision, 6)
+        polygons = [
+            [encode_polyline(ring, polyline_precision) for ring in rings]
+            for rings in polygons_to_coordinates(explode_polygons(geom))
+        ]
+        return GeoJSONResponse(
+            {"properties": props, "precision": polyline_precision, "polygons": polygons},
+            media_type="application/json",
+        )
+    return GeoJSONResponse(to_feature_collection(geom, props, precision))
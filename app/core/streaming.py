@@ -0,0 +1,48 @@
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[str, Any]
+
+def wants_sse(request: Request) -> bool:
+    return "text/event-stream" in request.headers.get("accept", "")
+
+def encode_ndjson(name: str, data: Any) -> bytes:
+    return dumps({"event": name, "data": data}) + b"\n"
+
+def _encode_sse(name: str, data: Any) -> bytes:
+    return b"event: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+def event_stream(
+    request: Request, events: AsyncIterator[Event], headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """
+    Отдаёт события (name, data) по мере готовности: NDJSON по умолчанию
+    или Server-Sent Events, если клиент прислал Accept: text/event-stream.
+    Статус ответа к этому моменту уже 200, поэтому ошибки посреди потока
+    приходят отдельным событием "error", а поток завершается.
+    """
+    sse = wants_sse(request)
+    encode = _encode_sse if sse else encode_ndjson
+
+    async def _body() -> AsyncIterator[bytes]:
+        try:
+            async for name, data in events:
+                yield encode(name, data)
+        except HTTPException as e:
+            yield encode("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception("stream failed")
+            yield encode("error", {"status": 502, "detail": str(e)})
+
+    return StreamingResponse(
+        _body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept", **(headers or {})},
+    )
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import FrozenSet, Iterator, List, Optional, Tuple
+
+from .config import get_settings
+
+_settings = get_settings()
+
+_DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+@dataclass(frozen=True)
+class BucketRule:
+    days: Optional[FrozenSet[int]]  # дни недели начала окна (0 — понедельник); None — любые
+    start_min: int  # начало окна, минут от полуночи местного времени
+    length_min: int  # длина окна; окно может переходить через полночь
+    bucket_min: int
+
+@dataclass(frozen=True)
+class TimeBucket:
+    start: datetime  # UTC
+    minutes: int
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(minutes=self.minutes)
+
+    @property
+    def iso(self) -> str:
+        return self.start.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _parse_clock(value: str) -> int:
+    hour, minute = (int(v) for v in value.split(":"))
+    return hour * 60 + minute
+
+def _parse_days(value: str) -> FrozenSet[int]:
+    days = set()
+    for part in value.split(","):
+        first, _, last = part.strip().lower().partition("-")
+        lo = _DAYS.index(first)
+        hi = _DAYS.index(last) if last else lo
+        days.update(range(lo, hi + 1) if lo <= hi else [*range(lo, 7), *range(0, hi + 1)])
+    return frozenset(days)
+
+def parse_bucket_rules(spec: Optional[str]) -> List[BucketRule]:
+    """
+    Правила корзин через ";": "[дни ]ЧЧ:ММ-ЧЧ:ММ=минуты", например
+    "mon-fri 07:00-22:00=15; sat-sun 07:00-22:00=30; 22:00-07:00=60".
+    Время местное (ISOCHRONE_TIME_BUCKETS_UTC_OFFSET_MIN), побеждает первое подходящее правило.
+    """
+    rules: List[BucketRule] = []
+    for raw in (spec or "").split(";"):
+        raw = raw.strip()
+        if not raw:
+            continue
+        window, bucket = raw.rsplit("=", 1)
+        days_part, _, clock_part = window.strip().rpartition(" ")
+        start, end = (_parse_clock(v) for v in clock_part.split("-"))
+        length = (end - start) % 1440 or 1440
+        rules.append(BucketRule(_parse_days(days_part) if days_part else None, start, length, max(1, int(bucket))))
+    return rules
+
+@lru_cache(maxsize=1)
+def _rules() -> Tuple[BucketRule, ...]:
+    return tuple(parse_bucket_rules(_settings.ISOCHRONE_TIME_BUCKETS))
+
+def parse_start_time(start_time_iso: str) -> Optional[datetime]:
+    """RFC3339 в aware datetime (без зоны — UTC); None, если строка не распознана."""
+    try:
+        dt = datetime.fromisoformat(start_time_iso.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc)
+
+def bucket_for(dt: datetime) -> TimeBucket:
+    """Корзина, в которую попадает момент dt: по первому подходящему правилу или ISOCHRONE_CACHE_TIME_BUCKET_MIN."""
+    offset = timedelta(minutes=_settings.ISOCHRONE_TIME_BUCKETS_UTC_OFFSET_MIN)
+    local = (dt.astimezone(timezone.utc) + offset).replace(tzinfo=None, second=0, microsecond=0)
+    midnight = local.replace(hour=0, minute=0)
+    for rule in _rules():
+        # Окно, начавшееся сегодня или (если переходит через полночь) вчера
+        for window_start in (midnight + timedelta(minutes=rule.start_min), midnight + timedelta(minutes=rule.start_min - 1440)):
+            elapsed = (local - window_start).total_seconds() // 60
+            if not 0 <= elapsed < rule.length_min:
+                continue
+            if rule.days is not None and window_start.weekday() not in rule.days:
+                continue
+            floored = int(elapsed - elapsed % rule.bucket_min)
+            start = window_start + timedelta(minutes=floored)
+            # Последняя корзина окна обрезается его концом
+            minutes = min(rule.bucket_min, rule.length_min - floored)
+            return TimeBucket((start - offset).replace(tzinfo=timezone.utc), minutes)
+    bucket_min = max(_settings.ISOCHRONE_CACHE_TIME_BUCKET_MIN, 1)
+    minute_of_day = local.hour * 60 + local.minute
+    start = midnight + timedelta(minutes=minute_of_day - minute_of_day % bucket_min)
+    return TimeBucket((start - offset).replace(tzinfo=timezone.utc), bucket_min)
+
+def neighbor_buckets(bucket: TimeBucket, within_min: int) -> Iterator[TimeBucket]:
+    """Соседние корзины по возрастанию удалённости начала от bucket.start, не дальше within_min минут."""
+    limit = timedelta(minutes=within_min)
+    before, after = bucket, bucket
+    while True:
+        prev = bucket_for(before.start - timedelta(minutes=1))
+        nxt = bucket_for(after.end)
+        candidates = [b for b in (prev, nxt) if abs(b.start - bucket.start) <= limit]
+        if not candidates:
+            return
+        for b in sorted(candidates, key=lambda b: abs(b.start - bucket.start)):
+            yield b
+        before, after = prev, nxt
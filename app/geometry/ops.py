@@ -1,7 +1,12 @@
+import math
 from typing import List, Dict, Any, Optional, Tuple
-from shapely.geometry import mapping, Polygon, MultiPolygon
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
 
+_M_PER_DEG = 111_320.0
+
 def explode_polygons(geom) -> List[Polygon]:
     if geom is None:
         return []
@@ -9,24 +14,165 @@ def explode_polygons(geom) -> List[Polygon]:
         return [geom]
     if isinstance(geom, MultiPolygon):
         return list(geom.geoms)
-    try:
-        return [g for g in geom if isinstance(g, Polygon)]
-    except TypeError:
+    if hasattr(geom, "geoms"):  # GeometryCollection из пересечений
+        return [p for g in geom.geoms for p in explode_polygons(g)]
+    return []
+
+def polygons_to_coordinates(polygons: List[Polygon], precision: Optional[int] = None) -> List[List[List[List[float]]]]:
+    """
+    Координаты GeoJSON-полигонов (кольца -> точки [lon, lat]) прямо из массивов Shapely,
+    без shapely.mapping и кортежей на каждую точку. precision — знаков после запятой.
+    """
+    if not polygons:
         return []
+    _, coords, (ring_offsets, geom_offsets) = shapely.to_ragged_array(polygons)
+    if precision is not None:
+        coords = coords.round(precision)
+    points = coords.tolist()
+    return [
+        [points[ring_offsets[r] : ring_offsets[r + 1]] for r in range(geom_offsets[i], geom_offsets[i + 1])]
+        for i in range(len(polygons))
+    ]
 
-def to_feature_collection(geom, props: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def to_feature_collection(geom, props: Optional[Dict[str, Any]] = None, precision: Optional[int] = None) -> Dict[str, Any]:
     if geom is None or geom.is_empty:
         return {"type": "FeatureCollection", "features": []}
-    if geom.geom_type == "Polygon":
-        geoms = [geom]
-    elif geom.geom_type == "MultiPolygon":
-        geoms = list(geom.geoms)
-    else:
-        geoms = [g for g in geom if g.geom_type in ("Polygon", "MultiPolygon")]
-    features = [{"type": "Feature", "properties": props or {}, "geometry": mapping(g)} for g in geoms]
+    polygons = [g for g in explode_polygons(geom) if not g.is_empty]
+    features = [
+        {"type": "Feature", "properties": props or {}, "geometry": {"type": "Polygon", "coordinates": rings}}
+        for rings in polygons_to_coordinates(polygons, precision)
+    ]
     return {"type": "FeatureCollection", "features": features}
 
+def encode_polyline(points: List[List[float]], precision: int = 5) -> str:
+    """Кольцо [[lon, lat], ...] в формате Encoded Polyline (порядок lat, lon, как у Google/OSRM)."""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lon, lat in points:
+        ilat, ilon = round(lat * factor), round(lon * factor)
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
 def chunked(iterable, size: int):
     it = list(iterable)
     for i in range(0, len(it), size):
-        yield it[i : i + size]
\ No newline at end of file
+        yield it[i : i + size]
+
+def count_vertices(geom) -> int:
+    if geom is None:
+        return 0
+    return int(shapely.get_num_coordinates(geom))
+
+def approx_area_m2(geom) -> float:
+    """Площадь геометрии в WGS84 в м² (равнопромежуточное приближение по широте центра)."""
+    if geom is None or geom.is_empty:
+        return 0.0
+    lat = geom.centroid.y
+    return geom.area * _M_PER_DEG * _M_PER_DEG * math.cos(math.radians(lat))
+
+def approx_distance_m(lat1, lon1, lat2, lon2):
+    """
+    Расстояние в метрах (равнопромежуточное приближение по широте первой точки);
+    принимает числа или массивы numpy с обычным broadcasting.
+    """
+    dlat = (np.asarray(lat1) - lat2) * _M_PER_DEG
+    dlon = (np.asarray(lon1) - lon2) * _M_PER_DEG * np.cos(np.radians(lat1))
+    return np.hypot(dlat, dlon)
+
+def simplify_to_budget(poly: Polygon, max_vertices: int, start_tolerance: float = 1e-5, max_steps: int = 20):
+    """
+    Упрощает полигон с сохранением топологии, удваивая допуск, пока вершин не станет <= max_vertices.
+    Перед упрощением полигон раздувается на тот же допуск, чтобы результат покрывал исходник
+    (упрощение сдвигает границу не дальше допуска) — лишнее потом отсекается локальным фильтром.
+    """
+    if count_vertices(poly) <= max_vertices:
+        return poly
+    tolerance = start_tolerance
+    out = poly
+    for _ in range(max_steps):
+        out = poly.buffer(tolerance, join_style="mitre").simplify(tolerance, preserve_topology=True)
+        if count_vertices(out) <= max_vertices:
+            break
+        tolerance *= 2
+    return out
+
+def prepare_query_polygons(
+    geom,
+    max_vertices: int,
+    min_area_m2: float = 0.0,
+    precision: int = 6,
+    cover: str = "none",
+) -> Tuple[List[Polygon], Dict[str, Any]]:
+    """
+    Готовит геометрию к запросу Places: выкидывает полигоны-щепки меньше min_area_m2
+    (если крупнее ничего нет, крупнейший остаётся),
+    укладывает каждый полигон в бюджет вершин, округляет координаты до precision знаков.
+    cover="hull"|"bbox" заменяет полигоны выпуклой оболочкой/прямоугольником — вершин почти нет,
+    но точки обязательно надо дофильтровывать по исходной геометрии.
+    Возвращает полигоны запроса и статистику вершин до/после.
+    """
+    polygons = explode_polygons(geom)
+    stats: Dict[str, Any] = {
+        "polygons_in": len(polygons),
+        "vertices_in": sum(count_vertices(p) for p in polygons),
+        "dropped_slivers": 0,
+    }
+
+    areas = [approx_area_m2(p) for p in polygons]
+    kept = [p for p, area in zip(polygons, areas) if area >= min_area_m2]
+    # Маленькая, но настоящая область — не щепка: крупнейший полигон запрашиваем всегда
+    if polygons and not kept:
+        kept = [polygons[areas.index(max(areas))]]
+    stats["dropped_slivers"] = len(polygons) - len(kept)
+
+    grid = 10.0 ** -precision
+    out: List[Polygon] = []
+    for poly in kept:
+        if cover == "bbox":
+            q = shapely.box(*poly.bounds)
+        else:
+            q = simplify_to_budget(poly.convex_hull if cover == "hull" else poly, max_vertices)
+        # Округление может сломать валидность узких мест — тогда чиним buffer(0).
+        q = shapely.set_precision(q, grid)
+        if not q.is_valid:
+            q = q.buffer(0)
+        out.extend(explode_polygons(q))
+
+    stats["polygons_out"] = len(out)
+    stats["vertices_out"] = sum(count_vertices(p) for p in out)
+    return out, stats
+
+def filter_points_in_geometry(geom, points: List[Tuple[float, float]]) -> List[bool]:
+    """Маска попадания точек (lon, lat) в геометрию; геометрия подготавливается для быстрых проверок."""
+    if not points or geom is None or geom.is_empty:
+        return [False] * len(points)
+    shapely.prepare(geom)
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    # intersects, а не contains: кафе ровно на границе области тоже считаем своим
+    return [bool(v) for v in shapely.intersects_xy(geom, xs, ys)]
+
+def first_covering_threshold(geoms_by_t: List[Tuple[int, Any]], xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Для каждой точки (xs[i], ys[i]) — наименьший порог t, чья геометрия её накрывает; NaN, если ни одна.
+    Проверяются сразу все точки против одной подготовленной геометрии, по порогам от меньшего к большему,
+    и каждый следующий порог проверяет только ещё не накрытые точки.
+    """
+    result = np.full(len(xs), np.nan)
+    for t, geom in sorted(geoms_by_t, key=lambda item: item[0]):
+        todo = np.flatnonzero(np.isnan(result))
+        if not len(todo):
+            break
+        if geom is None or geom.is_empty:
+            continue
+        shapely.prepare(geom)
+        hit = shapely.intersects_xy(geom, xs[todo], ys[todo])
+        result[todo[hit]] = t
+    return result
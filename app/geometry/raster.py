@@ -0,0 +1,148 @@
+import math
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+from .ops import _M_PER_DEG
+
+# Пересечение на сетке: полосы времени каждого участника растеризуются в массив "середина полосы времени"
+# на общей сетке с клеткой в метрах, по клеткам считаются min/max/разброс, в полигон превращается
+# только итоговая маска. Стоимость — линейная по участникам и клеткам, без цепочек
+# difference/intersection, на которых у больших групп копятся щепки и невалидная геометрия.
+
+def _common_bounds(isochrones_list: List[List[Tuple[int, Any]]]) -> Optional[Tuple[float, float, float, float]]:
+    """Пересечение bbox участников: за его пределами общей области быть не может."""
+    minx = miny = -math.inf
+    maxx = maxy = math.inf
+    for iso in isochrones_list:
+        if not iso:
+            return None
+        b = shapely.bounds(np.asarray([g for _, g in iso], dtype=object))
+        minx, miny = max(minx, np.nanmin(b[:, 0])), max(miny, np.nanmin(b[:, 1]))
+        maxx, maxy = min(maxx, np.nanmax(b[:, 2])), min(maxy, np.nanmax(b[:, 3]))
+    if not (minx < maxx and miny < maxy):
+        return None
+    return minx, miny, maxx, maxy
+
+def _grid_steps(bounds: Tuple[float, float, float, float], cell_m: float, max_cells: int) -> Tuple[float, float, int, int]:
+    minx, miny, maxx, maxy = bounds
+    dy = cell_m / _M_PER_DEG
+    dx = dy / max(math.cos(math.radians((miny + maxy) / 2)), 1e-6)
+    nx, ny = math.ceil((maxx - minx) / dx), math.ceil((maxy - miny) / dy)
+    if max_cells > 0 and nx * ny > max_cells:
+        # Слишком мелкая клетка для такой области — укрупняем, сохраняя пропорции
+        scale = math.sqrt(nx * ny / max_cells)
+        dx, dy = dx * scale, dy * scale
+        nx, ny = math.ceil((maxx - minx) / dx), math.ceil((maxy - miny) / dy)
+    return dx, dy, max(nx, 1), max(ny, 1)
+
+def fill_mask(geom, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Растеризация построчным заполнением: для каждой строки клеток находятся пересечения её центральной
+    линии с рёбрами всех колец геометрии, и клетки правее каждого пересечения переключаются (even-odd) —
+    дыры и мультиполигоны получаются сами. Работа пропорциональна числу рёбер и клеток, без GEOS на клетку.
+    """
+    mask = np.zeros((len(ys), len(xs)), dtype=bool)
+    rings = shapely.get_parts(shapely.boundary(geom))
+    coords, ring_idx = shapely.get_coordinates(rings, return_index=True)
+    same_ring = ring_idx[1:] == ring_idx[:-1]
+    x1, y1 = coords[:-1, 0][same_ring], coords[:-1, 1][same_ring]
+    x2, y2 = coords[1:, 0][same_ring], coords[1:, 1][same_ring]
+    # Строки, чей центр попадает в [ymin, ymax) ребра; горизонтальные рёбра не пересекает ни одна
+    r0 = np.searchsorted(ys, np.minimum(y1, y2), side="left")
+    r1 = np.searchsorted(ys, np.maximum(y1, y2), side="left")
+    counts = r1 - r0
+    total = int(counts.sum())
+    if not total:
+        return mask
+    edge = np.repeat(np.arange(len(counts)), counts)
+    rows = r0[edge] + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    y = ys[rows]
+    x = x1[edge] + (y - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+    toggles = np.zeros((len(ys), len(xs) + 1), dtype=np.int32)
+    np.add.at(toggles, (rows, np.searchsorted(xs, x)), 1)
+    mask[:] = (np.cumsum(toggles, axis=1)[:, :-1] & 1).astype(bool)
+    return mask
+
+def rasterize_stack(isochrones: List[Tuple[int, Any]], xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """
+    Середина полосы времени (сек), в которую попадает центр клетки; NaN — не покрыто.
+    Те же полосы, что у build_time_rings, но без difference: изохроны заливаются по возрастанию
+    длительности, и клетка получает полосу первой накрывшей её изохроны.
+    """
+    band = np.full((len(ys), len(xs)), np.nan)
+    prev = 0
+    for duration, geom in sorted(isochrones, key=lambda item: item[0]):
+        if geom is not None and not geom.is_empty:
+            inside = fill_mask(geom, xs, ys)
+            band[inside & np.isnan(band)] = (prev + duration) / 2
+        prev = duration
+    return band
+
+def polygonize_mask(mask: np.ndarray, minx: float, miny: float, dx: float, dy: float):
+    """
+    Маска клеток -> геометрия. Граница маски собирается из единичных рёбер между клетками с разным
+    значением в целочисленных координатах сетки (узлы совпадают точно), polygonize строит из неё грани,
+    грани-дыры отбрасываются по маске, и только потом координаты переводятся в градусы.
+    """
+    padded = np.pad(mask, 1)
+    hr, hc = np.nonzero(np.diff(padded.astype(np.int8), axis=0))
+    vr, vc = np.nonzero(np.diff(padded.astype(np.int8), axis=1))
+    if not len(hr):
+        return None
+    segments = np.concatenate([
+        np.stack([np.column_stack([hc, hr + 1]), np.column_stack([hc + 1, hr + 1])], axis=1),
+        np.stack([np.column_stack([vc + 1, vr]), np.column_stack([vc + 1, vr + 1])], axis=1),
+    ]).astype(float)
+    merged = shapely.line_merge(shapely.multilinestrings(shapely.linestrings(segments)))
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(merged)))
+    inside = shapely.get_coordinates(shapely.point_on_surface(faces)).astype(int)
+    faces = faces[padded[inside[:, 1], inside[:, 0]]]
+    if not len(faces):
+        return None
+    geom = faces[0] if len(faces) == 1 else shapely.MultiPolygon(list(faces))
+    # В градусы: столбец/строка расширенной маски с отступом в одну клетку
+    geom = shapely.transform(geom, lambda c: np.column_stack([minx + (c[:, 0] - 1) * dx, miny + (c[:, 1] - 1) * dy]))
+    # Ступеньки сетки не несут информации точнее клетки
+    return shapely.simplify(geom, min(dx, dy) / 2)
+
+def intersect_isochrones_raster(
+    isochrones_list: List[List[Tuple[int, MultiPolygon | Polygon]]],
+    delta_minutes: int,
+    cell_m: float,
+    min_minutes: Optional[int] = None,
+    max_minutes: Optional[int] = None,
+    max_cells: int = 0,
+):
+    """
+    Клетки, которые покрыты кольцами всех участников и где разброс середин их полос времени
+    (max - min) не больше delta_minutes, а сами середины — в [min_minutes, max_minutes].
+    Результат — полигон(ы) с точностью до клетки cell_m, либо None.
+    """
+    bounds = _common_bounds(isochrones_list)
+    if bounds is None:
+        return None
+    dx, dy, nx, ny = _grid_steps(bounds, cell_m, max_cells)
+    minx, miny = bounds[0], bounds[1]
+    xs = minx + (np.arange(nx) + 0.5) * dx
+    ys = miny + (np.arange(ny) + 0.5) * dy
+
+    lo = np.full((ny, nx), np.inf)
+    hi = np.full((ny, nx), -np.inf)
+    covered = np.ones((ny, nx), dtype=bool)
+    for iso in isochrones_list:
+        band = rasterize_stack(iso, xs, ys)
+        covered &= ~np.isnan(band)
+        if not covered.any():
+            return None
+        lo = np.fmin(lo, band)
+        hi = np.fmax(hi, band)
+
+    mask = covered & (hi - lo <= delta_minutes * 60)
+    if min_minutes is not None:
+        mask &= lo >= min_minutes * 60
+    if max_minutes is not None:
+        mask &= hi <= max_minutes * 60
+    return polygonize_mask(mask, minx, miny, dx, dy)
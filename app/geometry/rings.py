@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import Polygon, MultiPolygon
+from shapely.ops import unary_union
+
+# Чистая геометрия колец и пересечений: без настроек и клиентов, чтобы модуль дёшево
+# импортировался в процессах пула (см. intersect_isochrones_wkb).
+
+def build_time_rings(isochrones: List[Tuple[int, MultiPolygon | Polygon]]) -> List[Tuple[Tuple[int, int], MultiPolygon | Polygon]]:
+    rings: List[Tuple[Tuple[int, int], MultiPolygon | Polygon]] = []
+    prev_geom = None
+    prev_t = None
+    for duration, geom in isochrones:
+        cur_geom = geom
+        if prev_geom is None:
+            rings.append(((0, duration), cur_geom))
+        else:
+            diff = cur_geom.difference(prev_geom)
+            if not diff.is_empty:
+                rings.append(((prev_t, duration), diff))
+        prev_geom = cur_geom
+        prev_t = duration
+    return rings
+
+def union_of_close_time_rings(rings, target_mid_s: float, delta_s: float):
+    candidates = []
+    for (t0, t1), g in rings:
+        t_mid = (t0 + t1) / 2
+        if abs(t_mid - target_mid_s) <= delta_s:
+            candidates.append(g)
+    if not candidates:
+        return None
+    return unary_union(candidates)
+
+def intersect_rings_for_many(
+    rings_list: List[List[Tuple[Tuple[int, int], Any]]],
+    delta_minutes: int,
+    min_minutes: Optional[int],
+    max_minutes: Optional[int],
+):
+    """
+    Область, где каждое кольцо опорного участника пересекается с кольцами всех остальных,
+    близкими по времени (|Δt_mid| <= delta_minutes). Все кольца опорного участника обрабатываются
+    разом векторными операциями Shapely 2: для каждого следующего участника по STRtree отбираются
+    только кольца, чьи bbox задевают текущий остаток, их объединения по окнам времени считаются
+    один раз на уникальный набор колец, а итог объединяется одним union_all.
+    """
+    if not rings_list:
+        return None
+    ref = rings_list[0]
+    others = rings_list[1:]
+    delta_s = delta_minutes * 60
+
+    ref_mids: List[float] = []
+    ref_geoms: List[Any] = []
+    for (t0, t1), g_ref in ref:
+        t_mid = (t0 + t1) / 2
+        if min_minutes is not None and t_mid / 60 < min_minutes:
+            continue
+        if max_minutes is not None and t_mid / 60 > max_minutes:
+            continue
+        ref_mids.append(t_mid)
+        ref_geoms.append(g_ref)
+    if not ref_geoms:
+        return None
+
+    mids = np.asarray(ref_mids, dtype=float)
+    cur = np.asarray(ref_geoms, dtype=object)
+    alive = ~shapely.is_empty(cur)
+
+    for rings in others:
+        if not rings or not alive.any():
+            return None
+        ring_mids = np.asarray([(t0 + t1) / 2 for (t0, t1), _ in rings], dtype=float)
+        ring_geoms = np.asarray([g for _, g in rings], dtype=object)
+        tree = STRtree(ring_geoms)
+
+        live_idx = np.flatnonzero(alive)
+        # Пары (кольцо-остаток, кольцо участника) с пересекающимися bbox
+        pair_src, pair_ring = tree.query(cur[live_idx])
+        close = np.abs(ring_mids[pair_ring] - mids[live_idx[pair_src]]) <= delta_s
+        pair_src, pair_ring = pair_src[close], pair_ring[close]
+
+        unions = np.full(len(cur), None, dtype=object)
+        union_cache: Dict[Tuple[int, ...], Any] = {}
+        order = np.argsort(pair_src, kind="stable")
+        pair_src, pair_ring = pair_src[order], pair_ring[order]
+        bounds = np.flatnonzero(np.diff(pair_src)) + 1
+        for src_group, ring_group in zip(np.split(pair_src, bounds), np.split(pair_ring, bounds)):
+            if not len(src_group):
+                continue
+            key = tuple(ring_group.tolist())
+            if key not in union_cache:
+                union_cache[key] = ring_geoms[ring_group[0]] if len(key) == 1 else shapely.union_all(ring_geoms[ring_group])
+            unions[live_idx[src_group[0]]] = union_cache[key]
+
+        # Без близких по времени колец с общим bbox пересечение заведомо пустое
+        alive &= np.fromiter((u is not None for u in unions), dtype=bool, count=len(unions))
+        sel = np.flatnonzero(alive)
+        if not len(sel):
+            return None
+        cur[sel] = shapely.intersection(cur[sel], unions[sel])
+        alive[sel] = ~shapely.is_empty(cur[sel])
+
+    parts = cur[alive]
+    if not len(parts):
+        return None
+    return parts[0] if len(parts) == 1 else shapely.union_all(parts)
+
+def intersect_isochrones_for_many(
+    isochrones_list: List[List[Tuple[int, MultiPolygon | Polygon]]],
+    delta_minutes: int,
+    min_minutes: Optional[int] = None,
+    max_minutes: Optional[int] = None,
+):
+    rings_list: List[List[Tuple[Tuple[int, int], Any]]] = [build_time_rings(iso) for iso in isochrones_list]
+    return intersect_rings_for_many(
+        rings_list,
+        delta_minutes=delta_minutes,
+        min_minutes=min_minutes,
+        max_minutes=max_minutes,
+    )
+
+def intersect_isochrones_wkb(
+    isochrones_wkb: List[List[Tuple[int, bytes]]],
+    delta_minutes: int,
+    min_minutes: Optional[int] = None,
+    max_minutes: Optional[int] = None,
+    raster_cell_m: Optional[float] = None,
+    raster_max_cells: int = 0,
+) -> Optional[bytes]:
+    """
+    Пересечение поверх WKB — точка входа для процессов пула: геометрии туда и обратно идут байтами.
+    С raster_cell_m считается на сетке (intersect_isochrones_raster), иначе полигонами.
+    """
+    isochrones_list = [[(duration, shapely.from_wkb(blob)) for duration, blob in iso] for iso in isochrones_wkb]
+    if raster_cell_m:
+        from .raster import intersect_isochrones_raster
+
+        inter = intersect_isochrones_raster(
+            isochrones_list, delta_minutes, raster_cell_m, min_minutes, max_minutes, raster_max_cells
+        )
+    else:
+        inter = intersect_isochrones_for_many(isochrones_list, delta_minutes, min_minutes, max_minutes)
+    return None if inter is None else shapely.to_wkb(inter)
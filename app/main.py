@@ -1,9 +1,35 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import health, equal_time, cafes
+from .routers import health, equal_time, cafes, sessions, batch
+from .clients.dgis import warm_up_caches
+from .core.config import get_settings
+from .core.concurrency import shutdown_process_executor
+from .core.http import aclose_client
+from .core.metrics import HTTP_REQUEST_SECONDS, collect_timings, server_timing_header
+from .services.hot_origins import run_hot_origins_warmer
+from .services.places_index import run_places_index_refresher
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев кэша изохрон из персистентного хранилища (если оно включено)
+    warm_up_caches()
+    st = get_settings()
+    background = []
+    if st.PLACES_INDEX_ENABLED and st.PLACES_INDEX_BBOX:
+        background.append(asyncio.create_task(run_places_index_refresher()))
+    if st.HOT_ORIGINS_ENABLED and st.HOT_ORIGINS_PATH:
+        background.append(asyncio.create_task(run_hot_origins_warmer()))
+    yield
+    for task in background:
+        task.cancel()
+    await aclose_client()
+    shutdown_process_executor()
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Equal-Arrival-Time Area API (2GIS Isochrone)")
+    app = FastAPI(title="Equal-Arrival-Time Area API (2GIS Isochrone)", lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=[
@@ -12,11 +38,34 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Properties", "Server-Timing", "ETag", "X-Cache"],
     )
 
+    st = get_settings()
+
+    @app.middleware("http")
+    async def timing(request: Request, call_next):
+        # Этапы (span) внутри запроса копятся в timings; для потоковых ответов в заголовок
+        # попадает только то, что успело случиться до первых байт
+        started = time.perf_counter()
+        with collect_timings() as timings:
+            response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            path=getattr(route, "path", "unmatched"),
+            method=request.method,
+            status=response.status_code,
+        )
+        if st.SERVER_TIMING_ENABLED and timings:
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
     app.include_router(health.router)
     app.include_router(equal_time.router)
     app.include_router(cafes.router)
+    app.include_router(sessions.router)
+    app.include_router(batch.router)
     return app
 
 app = create_app()
\ No newline at end of file
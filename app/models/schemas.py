@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Literal, Optional, Dict, Any, Tuple
 
 class Person(BaseModel):
     lat: float = Field(..., description="Широта")
@@ -17,6 +17,10 @@ class MultiRequest(BaseModel):
     t_end_min: int = Field(40, gt=0, description="Максимальное время (мин)")
     t_step_min: int = Field(10, gt=0, description="Шаг (мин)")
     tolerance_min: int = Field(10, ge=0, description="Допуск |Δt| (мин)")
+    output_format: Literal["geojson", "wkb", "polyline"] = Field("geojson", description="Формат области в ответе")
+    engine: Literal["auto", "polygon", "raster"] = Field("auto", description="Пересечение полигонами, на сетке или auto по размеру группы")
+    raster_cell_m: Optional[float] = Field(None, gt=0, description="Сторона клетки сетки (м) для raster; по умолчанию RASTER_CELL_M")
+    limit: Optional[int] = Field(None, ge=1, description="Сколько кафе вернуть: лучшие по времени в пути всех участников; по умолчанию все")
 
 class FeatureCollection(BaseModel):
     type: str = "FeatureCollection"
@@ -30,4 +34,43 @@ class MultiRequestByAddress(BaseModel):
     # Параметры изохрон остаются теми же:
     start_time_iso: Optional[str] = Field(None, description="RFC3339")
     detailing: Optional[float] = Field(None, description="0..1")
-    tolerance_min: int = Field(5, ge=0, description="Допуск |Δt| (мин)")
\ No newline at end of file
+    t_start_min: int = Field(20, ge=1, description="Минимальное время (мин)")
+    t_end_min: int = Field(40, gt=0, description="Максимальное время (мин)")
+    t_step_min: int = Field(10, gt=0, description="Шаг грубой лестницы (мин)")
+    tolerance_min: int = Field(5, ge=0, description="Допуск |Δt| (мин)")
+    output_format: Literal["geojson", "wkb", "polyline"] = Field("geojson", description="Формат области в ответе")
+    engine: Literal["auto", "polygon", "raster"] = Field("auto", description="Пересечение полигонами, на сетке или auto по размеру группы")
+    raster_cell_m: Optional[float] = Field(None, gt=0, description="Сторона клетки сетки (м) для raster; по умолчанию RASTER_CELL_M")
+    limit: Optional[int] = Field(None, ge=1, description="Сколько кафе вернуть: лучшие по времени в пути всех участников; по умолчанию все")
+
+class SessionPerson(Person):
+    id: str = Field(..., description="Стабильный идентификатор участника в сессии")
+
+class SessionAreaRequest(BaseModel):
+    participants: List[SessionPerson] = Field(..., min_items=2, description="Текущий состав; сервер сам найдёт разницу с прошлым")
+    start_time_iso: Optional[str] = Field(None, description="RFC3339")
+    detailing: Optional[float] = Field(None, description="0..1")
+    t_start_min: int = Field(20, ge=1, description="Минимальное время (мин)")
+    t_end_min: int = Field(40, gt=0, description="Максимальное время (мин)")
+    t_step_min: int = Field(10, gt=0, description="Шаг грубой лестницы (мин)")
+    output_format: Literal["geojson", "wkb", "polyline"] = Field("geojson", description="Формат области в ответе")
+
+class BatchGroup(BaseModel):
+    id: str = Field(..., description="Идентификатор группы, возвращается в её результате")
+    people: Optional[List[Person]] = Field(None, description="Участники точками")
+    addresses: Optional[List[str]] = Field(None, description="Или адресами")
+    city_id: Optional[str] = Field(None, description="Хинт геокодеру для addresses")
+    location: Optional[Tuple[float, float]] = Field(None, description="(lon, lat): хинт геокодеру для addresses")
+
+class BatchRequest(BaseModel):
+    groups: List[BatchGroup] = Field(..., min_items=1, description="Группы; общие участники запрашиваются в 2ГИС один раз")
+    include_cafes: bool = Field(False, description="Искать кафе в области каждой группы")
+    start_time_iso: Optional[str] = Field(None, description="RFC3339")
+    detailing: Optional[float] = Field(None, description="0..1")
+    t_start_min: int = Field(20, ge=1, description="Минимальное время (мин)")
+    t_end_min: int = Field(40, gt=0, description="Максимальное время (мин)")
+    t_step_min: int = Field(10, gt=0, description="Шаг грубой лестницы (мин)")
+    tolerance_min: int = Field(10, ge=0, description="Допуск |Δt| (мин)")
+    engine: Literal["auto", "polygon", "raster"] = Field("auto", description="Пересечение полигонами, на сетке или auto по размеру группы")
+    raster_cell_m: Optional[float] = Field(None, gt=0, description="Сторона клетки сетки (м) для raster; по умолчанию RASTER_CELL_M")
+    limit: Optional[int] = Field(None, ge=1, description="Сколько кафе вернуть каждой группе (с include_cafes): лучшие по времени в пути всех участников; по умолчанию все")
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Request
+from ..core.streaming import event_stream
+from ..models.schemas import BatchRequest
+from ..services.batch import check_batch, iter_batch_results
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+@router.post("/areas")
+async def batch_areas(req: BatchRequest, request: Request):
+    # Результаты групп приходят по мере готовности (NDJSON или SSE), порядок — не как во входе
+    check_batch(req)
+    return event_stream(request, iter_batch_results(req))
@@ -1,58 +1,190 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+from ..clients.dgis import isochrone_time_key, snap_point
+from ..clients.geocoder import normalize_address
+from ..core.concurrency import run_cpu
+from ..core.config import get_settings
+from ..core.response_cache import cached_event_stream, cached_response, group_cache_key
+from ..core.responses import GeoJSONResponse
+from ..core.streaming import Event
+from ..geometry.ops import to_feature_collection
 from ..models.schemas import MultiRequest
-from ..services.isochrone import compute_intersection_iterative
-from ..services.cafes import search_cafes_in_geometry
+from ..services.search import IsochroneStack, compute_intersection_iterative, iter_intersection_progress
+from ..services.cafes import arrival_minutes, iter_cafe_feature_batches, rank_cafes, search_cafes_in_geometry
 
 from ..models.schemas import MultiRequestByAddress
 from ..services.geocode import geocode_many
 
+_settings = get_settings()
+
 router = APIRouter(prefix="/cafes", tags=["cafes"])
 
 @router.post("/multi")
-def cafes_multi(req: MultiRequest):
+async def cafes_multi(req: MultiRequest, request: Request):
     if len(req.people) < 2:
         raise HTTPException(status_code=400, detail="Нужно минимум 2 участника.")
     people: List[Tuple[float, float]] = [(p.lat, p.lon) for p in req.people]
 
-    inter, debug = compute_intersection_iterative(
-        people=people,
-        start_minutes=20,
-        step_minutes=10,
-        tolerance_min=req.tolerance_min,
-        start_time_iso=req.start_time_iso,
-        detailing=req.detailing,
+    async def _build():
+        # Все полученные изохроны (лестница, бисекция и короткие полосы) — по ним кафе оцениваются по времени в пути
+        isochrones: Dict[int, IsochroneStack] = {}
+        inter, debug = await compute_intersection_iterative(
+            people=people,
+            start_minutes=req.t_start_min,
+            step_minutes=req.t_step_min,
+            end_minutes=req.t_end_min,
+            tolerance_min=req.tolerance_min,
+            start_time_iso=req.start_time_iso,
+            detailing=req.detailing,
+            engine=req.engine,
+            raster_cell_m=req.raster_cell_m,
+            on_isochrones=isochrones.__setitem__,
+            extra_minutes=arrival_minutes(req.t_start_min),
+        )
+
+        if inter is None or inter.is_empty:
+            raise HTTPException(
+                status_code=404,
+                detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
+            )
+
+        return GeoJSONResponse(await search_cafes_in_geometry(inter, isochrones, req.limit))
+
+    key = group_cache_key(
+        "cafes", req, [snap_point(lat, lon) for lat, lon in people], isochrone_time_key(req.start_time_iso),
+        keep_order=True,
     )
+    return await cached_response(request, key, _build)
 
-    if inter is None or inter.is_empty:
-        raise HTTPException(
-            status_code=404,
-            detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
+@router.post("/multi-geocode")
+async def cafes_multi_geocode(req: MultiRequestByAddress, request: Request):
+    async def _build():
+        # Все полученные изохроны (лестница, бисекция и короткие полосы) — по ним кафе оцениваются по времени в пути
+        isochrones: Dict[int, IsochroneStack] = {}
+        people = await geocode_many(
+            req.addresses,
+            city_id=req.city_id,
+            location=req.location,
+        )
+
+        inter, debug = await compute_intersection_iterative(
+            people=people,
+            start_minutes=req.t_start_min,
+            step_minutes=req.t_step_min,
+            end_minutes=req.t_end_min,
+            tolerance_min=req.tolerance_min,
+            start_time_iso=req.start_time_iso,
+            detailing=req.detailing,
+            engine=req.engine,
+            raster_cell_m=req.raster_cell_m,
+            on_isochrones=isochrones.__setitem__,
+            extra_minutes=arrival_minutes(req.t_start_min),
         )
 
-    return search_cafes_in_geometry(inter)
+        if inter is None or inter.is_empty:
+            raise HTTPException(
+                status_code=404,
+                detail={"message": "Не удалось найти общую область встречи для всех адресов при допустимом времени.", "debug": debug},
+            )
 
-@router.post("/multi-geocode")
-def cafes_multi_geocode(req: MultiRequestByAddress):
-    people = geocode_many(
-        req.addresses,
-        city_id=req.city_id,
-        location=req.location,
+        return GeoJSONResponse(await search_cafes_in_geometry(inter, isochrones, req.limit))
+
+    key = group_cache_key(
+        "cafes", req, [normalize_address(a) for a in req.addresses], isochrone_time_key(req.start_time_iso),
+        keep_order=True,
     )
+    return await cached_response(request, key, _build)
+
+async def _cafe_events(people_source: Callable[[], Awaitable[List[Tuple[float, float]]]], req) -> AsyncIterator[Event]:
+    # Поток открывается сразу: точки участников, ход поиска по ступеням времени, область — как только
+    # она найдена, и дальше кафе пачками по мере прихода страниц Places.
+    people = await people_source()
+    yield "people", [[lat, lon] for lat, lon in people]
 
-    inter, debug = compute_intersection_iterative(
-        people=people,
-        start_minutes=20,
-        step_minutes=10,
+    inter, debug = None, {}
+    isochrones: Dict[int, IsochroneStack] = {}
+    async for kind, payload in iter_intersection_progress(
+        people,
+        start_minutes=req.t_start_min,
+        step_minutes=req.t_step_min,
+        end_minutes=req.t_end_min,
         tolerance_min=req.tolerance_min,
         start_time_iso=req.start_time_iso,
         detailing=req.detailing,
-    )
+        engine=req.engine,
+        raster_cell_m=req.raster_cell_m,
+        on_isochrones=isochrones.__setitem__,
+        extra_minutes=arrival_minutes(req.t_start_min),
+    ):
+        if kind == "attempt":
+            yield "attempt", payload
+        else:
+            inter, debug = payload
 
     if inter is None or inter.is_empty:
         raise HTTPException(
             status_code=404,
-            detail={"message": "Не удалось найти общую область встречи для всех адресов при допустимом времени.", "debug": debug},
+            detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
         )
 
-    return search_cafes_in_geometry(inter)
\ No newline at end of file
+    yield "area", to_feature_collection(
+        inter,
+        {
+            "source": "2GIS Isochrone",
+            "participants": len(people),
+            "tolerance_min": req.tolerance_min,
+            "t_minutes": debug["t_minutes"],
+            "time_bucket": debug["time_bucket"],
+            "engine": debug["engine"],
+            "attempts": debug["attempts"],
+        },
+        _settings.GEOJSON_PRECISION,
+    )
+
+    # Без limit пачки оцениваются и отдаются по мере прихода; с limit лучшие известны только
+    # после всех страниц, поэтому отдаются одной пачкой в конце
+    total = 0
+    found: List[Dict[str, Any]] = []
+    async for batch in iter_cafe_feature_batches(inter):
+        total += len(batch)
+        if req.limit is None:
+            ranked = await run_cpu(rank_cafes, batch, isochrones)
+            yield "cafes", {"type": "FeatureCollection", "features": ranked}
+        else:
+            found.extend(batch)
+    if req.limit is not None and found:
+        ranked = await run_cpu(rank_cafes, found, isochrones, req.limit)
+        yield "cafes", {"type": "FeatureCollection", "features": ranked}
+    yield "done", {"cafes": total}
+
+@router.post("/multi/stream")
+async def cafes_multi_stream(req: MultiRequest, request: Request):
+    if len(req.people) < 2:
+        raise HTTPException(status_code=400, detail="Нужно минимум 2 участника.")
+
+    async def _people() -> List[Tuple[float, float]]:
+        return [(p.lat, p.lon) for p in req.people]
+
+    # Поток начинается с точек участников как есть и в их порядке — ключ по точным координатам
+    key = group_cache_key(
+        "cafes/stream",
+        req,
+        [(p.lat, p.lon) for p in req.people],
+        isochrone_time_key(req.start_time_iso),
+        keep_order=True,
+    )
+    return cached_event_stream(request, key, lambda: _cafe_events(_people, req))
+
+@router.post("/multi-geocode/stream")
+async def cafes_multi_geocode_stream(req: MultiRequestByAddress, request: Request):
+    async def _people() -> List[Tuple[float, float]]:
+        return await geocode_many(req.addresses, city_id=req.city_id, location=req.location)
+
+    key = group_cache_key(
+        "cafes/stream",
+        req,
+        [normalize_address(a) for a in req.addresses],
+        isochrone_time_key(req.start_time_iso),
+        keep_order=True,
+    )
+    return cached_event_stream(request, key, lambda: _cafe_events(_people, req))
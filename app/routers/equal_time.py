@@ -1,83 +1,197 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+from ..clients.dgis import isochrone_time_key, snap_point
+from ..clients.geocoder import normalize_address
+from ..core.config import get_settings
+from ..core.response_cache import cached_event_stream, cached_response, group_cache_key
+from ..core.responses import area_response
+from ..core.streaming import Event
 from ..models.schemas import MultiRequest
-from ..services.isochrone import compute_intersection_iterative
+from ..services.search import compute_intersection_iterative, iter_intersection_progress
 from ..geometry.ops import to_feature_collection
 
 from ..models.schemas import MultiRequestByAddress
 from ..services.geocode import geocode_many
 
+_settings = get_settings()
+
 router = APIRouter(prefix="/equal-time-area", tags=["equal-time-area"])
 
 @router.post("/multi")
-def equal_time_area_multi(req: MultiRequest):
+async def equal_time_area_multi(req: MultiRequest, request: Request):
     if len(req.people) < 2:
         raise HTTPException(status_code=400, detail="Нужно минимум 2 участника.")
 
     # Принудительно используем PT + reverse=False
     people: List[Tuple[float, float]] = [(p.lat, p.lon) for p in req.people]
 
-    inter, debug = compute_intersection_iterative(
-        people=people,
-        start_minutes=20,
-        step_minutes=10,
-        tolerance_min=req.tolerance_min,
-        start_time_iso=req.start_time_iso,
-        detailing=req.detailing,
-    )
+    async def _build():
+        inter, debug = await compute_intersection_iterative(
+            people=people,
+            start_minutes=req.t_start_min,
+            step_minutes=req.t_step_min,
+            end_minutes=req.t_end_min,
+            tolerance_min=req.tolerance_min,
+            start_time_iso=req.start_time_iso,
+            detailing=req.detailing,
+            engine=req.engine,
+            raster_cell_m=req.raster_cell_m,
+        )
 
-    if inter is None or inter.is_empty:
-        raise HTTPException(
-            status_code=404,
-            detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
+        if inter is None or inter.is_empty:
+            raise HTTPException(
+                status_code=404,
+                detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
+            )
+
+        return area_response(
+            inter,
+            {
+                "source": "2GIS Isochrone",
+                "participants": len(req.people),
+                "transport": "public_transport",
+                "reverse": False,
+                "tolerance_min": req.tolerance_min,
+                "t_minutes": debug["t_minutes"],
+                "time_bucket": debug["time_bucket"],
+                "engine": debug["engine"],
+                "attempts": debug["attempts"],
+            },
+            req.output_format,
         )
 
-    fc = to_feature_collection(
-        inter,
-        {
-            "source": "2GIS Isochrone",
-            "participants": len(req.people),
-            "transport": "public_transport",
-            "reverse": False,
-            "tolerance_min": req.tolerance_min,
-            "attempts": debug["attempts"],
-        },
+    key = group_cache_key(
+        "equal-time-area", req, [snap_point(lat, lon) for lat, lon in people], isochrone_time_key(req.start_time_iso)
     )
-    return fc
+    return await cached_response(request, key, _build)
 
 @router.post("/multi-geocode")
-def equal_time_area_multi_geocode(req: MultiRequestByAddress):
-    people = geocode_many(
-        req.addresses,
-        city_id=req.city_id,
-        location=req.location,
-    )  # -> List[(lat, lon)]
-
-    inter, debug = compute_intersection_iterative(
-        people=people,
-        start_minutes=20,
-        step_minutes=10,
+async def equal_time_area_multi_geocode(req: MultiRequestByAddress, request: Request):
+    async def _build():
+        people = await geocode_many(
+            req.addresses,
+            city_id=req.city_id,
+            location=req.location,
+        )  # -> List[(lat, lon)]
+
+        inter, debug = await compute_intersection_iterative(
+            people=people,
+            start_minutes=req.t_start_min,
+            step_minutes=req.t_step_min,
+            end_minutes=req.t_end_min,
+            tolerance_min=req.tolerance_min,
+            start_time_iso=req.start_time_iso,
+            detailing=req.detailing,
+            engine=req.engine,
+            raster_cell_m=req.raster_cell_m,
+        )
+
+        if inter is None or inter.is_empty:
+            raise HTTPException(
+                status_code=404,
+                detail={"message": "Не удалось найти общую область встречи для всех адресов при допустимом времени.", "debug": debug},
+            )
+
+        return area_response(
+            inter,
+            {
+                "source": "2GIS Isochrone",
+                "participants": len(req.addresses),
+                "transport": "public_transport",
+                "reverse": False,
+                "tolerance_min": req.tolerance_min,
+                "t_minutes": debug["t_minutes"],
+                "time_bucket": debug["time_bucket"],
+                "engine": debug["engine"],
+                "attempts": debug["attempts"],
+                "input_type": "addresses"
+            },
+            req.output_format,
+        )
+
+    key = group_cache_key(
+        "equal-time-area", req, [normalize_address(a) for a in req.addresses], isochrone_time_key(req.start_time_iso)
+    )
+    return await cached_response(request, key, _build)
+
+async def _area_events(
+    people_source: Callable[[], Awaitable[List[Tuple[float, float]]]],
+    req,
+    extra_props: Dict[str, Any],
+) -> AsyncIterator[Event]:
+    # Поток открывается сразу: точки участников, ход поиска по ступеням времени, затем область
+    people = await people_source()
+    yield "people", [[lat, lon] for lat, lon in people]
+
+    inter, debug = None, {}
+    async for kind, payload in iter_intersection_progress(
+        people,
+        start_minutes=req.t_start_min,
+        step_minutes=req.t_step_min,
+        end_minutes=req.t_end_min,
         tolerance_min=req.tolerance_min,
         start_time_iso=req.start_time_iso,
         detailing=req.detailing,
-    )
+        engine=req.engine,
+        raster_cell_m=req.raster_cell_m,
+    ):
+        if kind == "attempt":
+            yield "attempt", payload
+        else:
+            inter, debug = payload
 
     if inter is None or inter.is_empty:
         raise HTTPException(
             status_code=404,
-            detail={"message": "Не удалось найти общую область встречи для всех адресов при допустимом времени.", "debug": debug},
+            detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
         )
 
-    fc = to_feature_collection(
+    yield "area", to_feature_collection(
         inter,
         {
             "source": "2GIS Isochrone",
-            "participants": len(req.addresses),
+            "participants": len(people),
             "transport": "public_transport",
             "reverse": False,
             "tolerance_min": req.tolerance_min,
+            "t_minutes": debug["t_minutes"],
+            "time_bucket": debug["time_bucket"],
+            "engine": debug["engine"],
             "attempts": debug["attempts"],
-            "input_type": "addresses"
+            **extra_props,
         },
+        _settings.GEOJSON_PRECISION,
+    )
+    yield "done", {}
+
+@router.post("/multi/stream")
+async def equal_time_area_multi_stream(req: MultiRequest, request: Request):
+    if len(req.people) < 2:
+        raise HTTPException(status_code=400, detail="Нужно минимум 2 участника.")
+
+    async def _people() -> List[Tuple[float, float]]:
+        return [(p.lat, p.lon) for p in req.people]
+
+    # Поток начинается с точек участников как есть и в их порядке — ключ по точным координатам
+    key = group_cache_key(
+        "equal-time-area/stream",
+        req,
+        [(p.lat, p.lon) for p in req.people],
+        isochrone_time_key(req.start_time_iso),
+        keep_order=True,
+    )
+    return cached_event_stream(request, key, lambda: _area_events(_people, req, {}))
+
+@router.post("/multi-geocode/stream")
+async def equal_time_area_multi_geocode_stream(req: MultiRequestByAddress, request: Request):
+    async def _people() -> List[Tuple[float, float]]:
+        return await geocode_many(req.addresses, city_id=req.city_id, location=req.location)
+
+    key = group_cache_key(
+        "equal-time-area/stream",
+        req,
+        [normalize_address(a) for a in req.addresses],
+        isochrone_time_key(req.start_time_iso),
+        keep_order=True,
     )
-    return fc
\ No newline at end of file
+    return cached_event_stream(request, key, lambda: _area_events(_people, req, {"input_type": "addresses"}))
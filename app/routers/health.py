@@ -1,7 +1,40 @@
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..clients.dgis import disk_cache_stats, isochrone_cache_stats, singleflight_stats
+from ..core.metrics import Gauges, register, render
+from ..core.ratelimit import limiter_stats
+from ..core.response_cache import response_cache_stats
+from ..clients.geocoder import geocode_cache_stats, geocode_singleflight_stats
+from ..services.hot_origins import hot_origins_stats
+from ..services.places_index import places_index_stats
+from ..services.sessions import session_stats
 
 router = APIRouter()
 
+def _cache_stats():
+    caches = {"isochrone": isochrone_cache_stats(), "geocode": geocode_cache_stats(), "persistent": disk_cache_stats()}
+    return {name: stats for name, stats in caches.items() if stats is not None}
+
+def _flight_stats():
+    return {**singleflight_stats(), "geocode": geocode_singleflight_stats()}
+
+# Счётчики, которые уже ведут кэши, single-flight и ограничители, отдаём как есть в момент сбора
+for _name, _help, _type, _collect in [
+    ("app_cache_hits_total", "Попадания в кэш", "counter",
+     lambda: [({"cache": c}, s["hits"]) for c, s in _cache_stats().items()]),
+    ("app_cache_misses_total", "Промахи кэша", "counter",
+     lambda: [({"cache": c}, s["misses"]) for c, s in _cache_stats().items()]),
+    ("app_singleflight_coalesced_total", "Вызовы, склеенные с уже идущими", "counter",
+     lambda: [({"upstream": n}, s["coalesced"]) for n, s in _flight_stats().items()]),
+    ("app_upstream_concurrency_limit", "Текущий адаптивный лимит одновременных запросов", "gauge",
+     lambda: [({"upstream": n}, s["limit"]) for n, s in limiter_stats().items()]),
+    ("app_upstream_queued", "Запросы в очереди ограничителя", "gauge",
+     lambda: [({"upstream": n}, s["queued"]) for n, s in limiter_stats().items()]),
+    ("app_upstream_throttled_total", "Ответы 429 от 2ГИС", "counter",
+     lambda: [({"upstream": n}, s["throttled"]) for n, s in limiter_stats().items()]),
+]:
+    register(Gauges(_name, _help, _type, _collect))
+
 @router.get("/")
 def root():
     return {
@@ -21,4 +54,28 @@ def root():
             },
             "notes": "Транспорт всегда public_transport, reverse всегда False. Первый поиск 20 минут, затем +10, пока не найдём или не упрёмся в потолок."
         }
-    }
\ No newline at end of file
+    }
+
+@router.get("/health")
+def health():
+    return {
+        "ok": True,
+        "caches": {
+            "isochrone": isochrone_cache_stats(),
+            "geocode": geocode_cache_stats(),
+            "persistent": disk_cache_stats(),
+            "responses": response_cache_stats(),
+        },
+        "places_index": places_index_stats(),
+        "hot_origins": hot_origins_stats(),
+        "sessions": session_stats(),
+        "upstream": limiter_stats(),
+        "singleflight": {
+            **singleflight_stats(),
+            "geocode": geocode_singleflight_stats(),
+        },
+    }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException
+from ..core.config import get_settings
+from ..core.responses import area_response
+from ..models.schemas import SessionAreaRequest
+from ..services.sessions import SessionNotFound, compute_session_intersection, get_session_store
+
+_settings = get_settings()
+
+router = APIRouter(prefix="/sessions", tags=["sessions"])
+
+@router.post("")
+async def create_session():
+    return {"session_id": get_session_store().create().id, "idle_sec": _settings.SESSION_IDLE_SEC}
+
+@router.post("/{session_id}/area")
+async def session_area(session_id: str, req: SessionAreaRequest):
+    if len(req.participants) > _settings.SESSION_MAX_PARTICIPANTS:
+        raise HTTPException(status_code=400, detail=f"Не больше {_settings.SESSION_MAX_PARTICIPANTS} участников в сессии.")
+    participants = {p.id: (p.lat, p.lon) for p in req.participants}
+    if len(participants) != len(req.participants):
+        raise HTTPException(status_code=400, detail="Идентификаторы участников должны быть уникальны.")
+    try:
+        session = get_session_store().get(session_id)
+    except SessionNotFound:
+        raise HTTPException(status_code=404, detail="Сессия не найдена или истекла — создайте новую.")
+
+    inter, debug = await compute_session_intersection(
+        session,
+        participants,
+        start_minutes=req.t_start_min,
+        step_minutes=req.t_step_min,
+        end_minutes=req.t_end_min,
+        start_time_iso=req.start_time_iso,
+        detailing=req.detailing,
+    )
+
+    if inter is None or inter.is_empty:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Не удалось найти общую область встречи для всех участников при допустимом времени.", "debug": debug},
+        )
+
+    return area_response(
+        inter,
+        {
+            "source": "2GIS Isochrone",
+            "participants": len(participants),
+            "transport": "public_transport",
+            "reverse": False,
+            "t_minutes": debug["t_minutes"],
+            "time_bucket": debug["time_bucket"],
+            "attempts": debug["attempts"],
+            "session": debug["session"],
+        },
+        req.output_format,
+    )
+
+@router.delete("/{session_id}")
+async def delete_session(session_id: str):
+    return {"deleted": get_session_store().delete(session_id)}
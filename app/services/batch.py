@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from ..clients.dgis import call_isochrone, describe_time_bucket, snap_point, track_time_buckets
+from ..core.concurrency import iter_concurrent, map_concurrent
+from ..core.config import get_settings
+from ..core.http import track_upstream_requests
+from ..core.metrics import record_stage
+from ..core.ratelimit import PRIORITY_BACKGROUND, request_priority
+from ..core.singleflight import SingleFlight
+from ..core.streaming import Event
+from ..geometry.ops import to_feature_collection
+from ..models.schemas import BatchGroup, BatchRequest
+from .cafes import arrival_minutes, search_cafes_in_geometry
+from .geocode import geocode_many
+from .hot_origins import snap_to_hot_origins
+from .isochrone import intersect_isochrones, resolve_engine
+from .search import IsochroneStack, record_attempt, search_range, search_thresholds
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+Point = Tuple[float, float]
+
+class OriginIsochrones:
+    """
+    Изохроны уникальных точек старта на время одного батча. Общие для групп участники
+    запрашиваются один раз; одновременные дозапросы одной точки склеиваются, а все походы
+    в 2ГИС идут через общий семафор на весь батч. Длительности, которые 2ГИС не вернул, запоминаются
+    в empty и больше не запрашиваются: на таком пороге пересечения нет, как и в обычном поиске.
+    """
+
+    def __init__(self, limit: int, start_time_iso: Optional[str], detailing: Optional[float]):
+        self.geoms: Dict[Tuple[Point, int], Any] = {}
+        self.start_time_iso = start_time_iso
+        self.detailing = detailing
+        self._semaphore = asyncio.Semaphore(max(1, limit))
+        self._flight = SingleFlight("batch")
+        self.fetches = 0
+        self.failed: Dict[Point, Exception] = {}
+        self.empty: Set[Tuple[Point, int]] = set()
+
+    async def _fetch(self, origin: Point, minutes: Tuple[int, ...]) -> None:
+        async with self._semaphore:
+            self.fetches += 1
+            stack = await call_isochrone(
+                origin[0],
+                origin[1],
+                [t * 60 for t in minutes],
+                start_time_iso=self.start_time_iso,
+                detailing=self.detailing,
+            )
+        for duration, geom in stack:
+            self.geoms[(origin, duration // 60)] = geom
+        self.empty.update((origin, t) for t in minutes if (origin, t) not in self.geoms)
+
+    async def ensure(self, origins: List[Point], minutes: List[int]) -> None:
+        async def _one(origin: Point) -> None:
+            missing = tuple(t for t in minutes if (origin, t) not in self.geoms and (origin, t) not in self.empty)
+            if missing:
+                await self._flight.do((origin, missing), lambda: self._fetch(origin, missing))
+
+        await map_concurrent(_one, list(dict.fromkeys(origins)))
+
+    async def prefetch(self, origins: List[Point], minutes: List[int]) -> None:
+        """Как ensure, но каждая точка отдельно: ошибка точки запоминается в failed и не мешает остальным."""
+        unique = list(dict.fromkeys(origins))
+        results = await asyncio.gather(*(self.ensure([origin], minutes) for origin in unique), return_exceptions=True)
+        for origin, result in zip(unique, results):
+            if isinstance(result, Exception):
+                logger.warning("batch origin %s failed: %s", origin, result)
+                self.failed[origin] = result
+
+    def stack(self, origins: List[Point], t: int) -> IsochroneStack:
+        """Изохроны порога t в порядке origins; у точки без этой длительности — пустой список."""
+        return [[(t * 60, self.geoms[(origin, t)])] if (origin, t) in self.geoms else [] for origin in origins]
+
+    def known(self, origins: List[Point]) -> Dict[int, IsochroneStack]:
+        """Все уже полученные пороги точек: порог -> изохроны в порядке origins (пусто, где порога нет)."""
+        members = set(origins)
+        minutes = sorted({t for origin, t in self.geoms if origin in members})
+        return {t: self.stack(origins, t) for t in minutes}
+
+def check_batch(req: BatchRequest) -> None:
+    if len(req.groups) > _settings.BATCH_MAX_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Не больше {_settings.BATCH_MAX_GROUPS} групп в батче.")
+    if len({g.id for g in req.groups}) != len(req.groups):
+        raise HTTPException(status_code=400, detail="Идентификаторы групп должны быть уникальны.")
+
+async def _resolve_people(group: BatchGroup) -> List[Point]:
+    if group.people:
+        return [(p.lat, p.lon) for p in group.people]
+    return await geocode_many(group.addresses or [], city_id=group.city_id, location=group.location)
+
+def _group_error(group: BatchGroup, status: int, detail: Any) -> Dict[str, Any]:
+    return {"id": group.id, "status": "error", "error": {"status": status, "detail": detail}}
+
+async def _compute_group(
+    group: BatchGroup,
+    origins: List[Point],
+    memo: OriginIsochrones,
+    thresholds: List[int],
+    req: BatchRequest,
+    buckets: Set[str],
+) -> Dict[str, Any]:
+    debug: Dict[str, Any] = {"attempts": []}
+    engine = resolve_engine(req.engine, len(origins))
+
+    async def _evaluate(t: int, phase: str):
+        await memo.ensure(origins, [t])
+        started = time.perf_counter()
+        inter = await intersect_isochrones(
+            memo.stack(origins, t), req.tolerance_min, engine=engine, raster_cell_m=req.raster_cell_m
+        )
+        record_stage("intersection", time.perf_counter() - started)
+        found = inter is not None and not inter.is_empty
+        record_attempt(debug, t, phase, found, None, inter)
+        return inter if found else None
+
+    inter, t_minutes = await search_thresholds(_evaluate, thresholds, _settings.SEARCH_PRECISION_MIN)
+    result: Dict[str, Any] = {"id": group.id, "participants": len(origins), "t_minutes": t_minutes}
+    if inter is None:
+        result["status"] = "no_intersection"
+        result["attempts"] = debug["attempts"]
+        return result
+    result["status"] = "ok"
+    result["area"] = to_feature_collection(
+        inter,
+        {
+            "source": "2GIS Isochrone",
+            "participants": len(origins),
+            "tolerance_min": req.tolerance_min,
+            "t_minutes": t_minutes,
+            "time_bucket": describe_time_bucket(req.start_time_iso, buckets),
+            "engine": engine,
+            "attempts": debug["attempts"],
+        },
+        _settings.GEOJSON_PRECISION,
+    )
+    if req.include_cafes:
+        # Короткие полосы для оценки кафе (в режиме лестницы они уже пришли вместе с ней)
+        await memo.ensure(origins, arrival_minutes(req.t_start_min))
+        result["cafes"] = await search_cafes_in_geometry(inter, memo.known(origins), req.limit)
+    return result
+
+async def iter_batch_results(req: BatchRequest) -> AsyncIterator[Event]:
+    """
+    Считает области (и по желанию кафе) для многих групп одним заходом и отдаёт события:
+    ("groups", сводка по уникальным точкам), затем ("group", результат) по мере готовности каждой группы,
+    и в конце ("done", статистика). Участники, общие для нескольких групп, запрашиваются в 2ГИС один раз:
+    сначала вся лестница порогов для всех уникальных точек, дальше группы досчитывают бисекцию
+    из общего набора. Работает с фоновым приоритетом, чтобы не мешать интерактивным запросам.
+    Ошибка одной группы (адрес не найден, сбой 2ГИС) попадает в её результат и не останавливает батч.
+    """
+    started = time.perf_counter()
+    groups = req.groups
+    thresholds = search_range(req.t_start_min, req.t_step_min, req.t_end_min)
+    memo = OriginIsochrones(_settings.BATCH_UPSTREAM_CONCURRENCY, req.start_time_iso, req.detailing)
+
+    with request_priority(PRIORITY_BACKGROUND), track_upstream_requests() as upstream, track_time_buckets() as buckets:
+        # Геокодер склеивает одинаковые адреса разных групп своим кэшем и singleflight
+        async def _people(group: BatchGroup) -> Any:
+            try:
+                people = await _resolve_people(group)
+            except HTTPException as e:
+                return e
+            snapped, _ = snap_to_hot_origins(people)
+            return [snap_point(lat, lon) for lat, lon in snapped]
+
+        resolved = await map_concurrent(_people, groups, _settings.BATCH_GROUP_CONCURRENCY)
+        ready = [origins for origins in resolved if isinstance(origins, list)]
+        unique = list(dict.fromkeys(p for origins in ready for p in origins))
+        members = sum(len(origins) for origins in ready)
+        yield "groups", {"groups": len(groups), "members": members, "unique_origins": len(unique)}
+
+        if _settings.ISOCHRONE_LADDER_MODE and thresholds:
+            extra = arrival_minutes(req.t_start_min) if req.include_cafes else []
+            await memo.prefetch(unique, sorted(set(thresholds + extra)))
+
+        async def _group(idx: int) -> Dict[str, Any]:
+            group, origins = groups[idx], resolved[idx]
+            if isinstance(origins, HTTPException):
+                return _group_error(group, origins.status_code, origins.detail)
+            if len(origins) < 2:
+                return _group_error(group, 400, "Нужно минимум 2 участника.")
+            # Ошибка изохрон общей точки достаётся только группам, в которых она есть
+            failed = next((memo.failed[o] for o in origins if o in memo.failed), None)
+            if failed is not None:
+                return _group_error(group, 502, str(failed))
+            try:
+                return await _compute_group(group, origins, memo, thresholds, req, buckets)
+            except HTTPException as e:
+                return _group_error(group, e.status_code, e.detail)
+            except Exception as e:
+                logger.exception("batch group %s failed", group.id)
+                return _group_error(group, 502, str(e))
+
+        done = 0
+        results = iter_concurrent(_group, range(len(groups)), _settings.BATCH_GROUP_CONCURRENCY)
+        async with aclosing(results):
+            async for _, result in results:
+                done += 1
+                yield "group", result
+
+    yield "done", {
+        "groups": done,
+        "members": members,
+        "unique_origins": len(unique),
+        "origin_fetches": memo.fetches,
+        "time_bucket": describe_time_bucket(req.start_time_iso, buckets),
+        "upstream_requests": upstream["requests"],
+        "elapsed_sec": round(time.perf_counter() - started, 2),
+    }
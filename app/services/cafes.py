@@ -1,26 +1,165 @@
-from typing import Any, Dict, List, Optional, Set, Tuple
-from ..clients.dgis import call_places_polygon, item_to_feature
-from ..geometry.ops import explode_polygons
+import logging
+import numpy as np
+import shapely
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from ..clients.dgis import item_to_feature, iter_places_polygons
+from ..core.concurrency import run_cpu
+from ..core.config import get_settings
+from ..core.metrics import GEOMETRY_VERTICES, span
+from ..geometry.ops import filter_points_in_geometry, first_covering_threshold, prepare_query_polygons
+from .places_index import get_places_snapshot
+from .search import IsochroneStack
 
-def search_cafes_in_geometry(geom) -> Dict[str, Any]:
-    polygons = explode_polygons(geom)
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+async def iter_cafe_feature_batches(
+    geom, debug: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Кафе внутри геометрии пачками — по одной на пришедшую страницу Places, без повторов между полигонами и страницами.
+    В Places уходят упрощённые полигоны (см. prepare_query_polygons), поэтому точки дофильтровываются
+    по исходной геометрии.
+    Если есть свежий локальный снимок кафе, покрывающий область, ответ берётся из него без похода в Places.
+    """
+    if geom is None or geom.is_empty:
+        return
+    snapshot = get_places_snapshot()
+    if snapshot is not None and snapshot.can_answer(geom, _settings.PLACES_INDEX_MAX_AGE_SEC):
+        if debug is not None:
+            debug["places_source"] = "index"
+        features = await run_cpu(snapshot.query, geom)
+        if features:
+            yield features
+        return
+    if debug is not None:
+        debug["places_source"] = "live"
+
+    with span("places_prepare"):
+        polygons, stats = await run_cpu(
+            prepare_query_polygons,
+            geom,
+            max_vertices=_settings.PLACES_MAX_VERTICES,
+            min_area_m2=_settings.PLACES_MIN_POLYGON_AREA_M2,
+            precision=_settings.PLACES_COORD_PRECISION,
+            cover=_settings.PLACES_QUERY_COVER,
+        )
+    logger.debug("places query geometry: %s", stats)
+    GEOMETRY_VERTICES.observe(stats["vertices_in"], kind="area")
+    GEOMETRY_VERTICES.observe(stats["vertices_out"], kind="places_query")
+    if debug is not None:
+        debug["places_query"] = stats
     if not polygons:
-        return {"type": "FeatureCollection", "features": []}
+        return
 
     seen_ids: Set[str] = set()
-    out_features: List[Dict[str, Any]] = []
-
-    for poly in polygons:
-        polygon_wkt = poly.wkt
-        items = call_places_polygon(polygon_wkt=polygon_wkt, q="cafe", page_size=50, max_pages=40)
-        for it in items:
-            it_id = it.get("id")
-            if not it_id or it_id in seen_ids:
-                continue
-            feat = item_to_feature(it)
-            if not feat:
-                continue
-            seen_ids.add(it_id)
-            out_features.append(feat)
-
-    return {"type": "FeatureCollection", "features": out_features}
\ No newline at end of file
+    polygon_wkts = [
+        shapely.to_wkt(poly, rounding_precision=_settings.PLACES_COORD_PRECISION, trim=True) for poly in polygons
+    ]
+    pages = iter_places_polygons(polygon_wkts, q="cafe", page_size=50, max_pages=40)
+    async with aclosing(pages):
+        async for _, _, items in pages:
+            candidates: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+            for it in items:
+                it_id = it.get("id")
+                if not it_id or it_id in seen_ids:
+                    continue
+                feat = item_to_feature(it)
+                if not feat:
+                    continue
+                candidates.append((it, feat))
+
+            inside = filter_points_in_geometry(geom, [tuple(feat["geometry"]["coordinates"]) for _, feat in candidates])
+            batch: List[Dict[str, Any]] = []
+            for (it, feat), ok in zip(candidates, inside):
+                if not ok or it["id"] in seen_ids:
+                    continue
+                seen_ids.add(it["id"])
+                batch.append(feat)
+            if batch:
+                yield batch
+
+async def iter_cafe_features(geom, debug: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    batches = iter_cafe_feature_batches(geom, debug)
+    async with aclosing(batches):
+        async for batch in batches:
+            for feat in batch:
+                yield feat
+
+async def search_cafes_in_geometry(
+    geom,
+    isochrones_by_t: Optional[Dict[int, IsochroneStack]] = None,
+    limit: Optional[int] = None,
+    debug: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Все кафе в геометрии. С isochrones_by_t они оцениваются и сортируются rank_cafes и обрезаются до limit;
+    total — сколько нашлось до обрезки.
+    """
+    with span("places"):
+        features = [feat async for feat in iter_cafe_features(geom, debug)]
+    total = len(features)
+    if isochrones_by_t is not None:
+        with span("cafes_rank"):
+            features = await run_cpu(rank_cafes, features, isochrones_by_t, limit)
+    elif limit is not None:
+        features = features[:limit]
+    return {"type": "FeatureCollection", "features": features, "total": total}
+
+def arrival_minutes(start_minutes: int) -> List[int]:
+    """Длительности ниже первого порога поиска, которые дозапрашиваются ради полос времени в пути до кафе."""
+    step = _settings.CAFES_ARRIVAL_STEP_MIN
+    return list(range(step, start_minutes, step)) if step > 0 else []
+
+def _rating(props: Dict[str, Any]) -> float:
+    try:
+        return float(props.get("rating") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def rank_cafes(
+    features: List[Dict[str, Any]],
+    isochrones_by_t: Dict[int, IsochroneStack],
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Оценка кафе по времени в пути каждого участника — по изохронам, уже полученным при поиске области
+    (порог -> изохроны участников в их порядке), без новых запросов в 2ГИС.
+    В properties добавляются arrival_min — полоса (нижний, верхний порог] на участника, None вне известных
+    изохрон, — и fairness: max_min (худший из верхних порогов) и spread_min (их разброс).
+    Сортировка: max_min, spread_min, затем рейтинг; кафе без оценки — в конце. limit — сколько оставить.
+    Исходные feature не меняются: они могут лежать в снимке кафе.
+    """
+    if not features:
+        return []
+    thresholds = sorted(isochrones_by_t)
+    participants = len(isochrones_by_t[thresholds[0]]) if thresholds else 0
+    coords = np.asarray([feat["geometry"]["coordinates"][:2] for feat in features], dtype=float)
+    xs, ys = coords[:, 0], coords[:, 1]
+
+    arrival = np.full((participants, len(features)), np.nan)
+    for i in range(participants):
+        geoms_by_t = [(t, geom) for t in thresholds for _, geom in isochrones_by_t[t][i]]
+        arrival[i] = first_covering_threshold(geoms_by_t, xs, ys)
+    lower = dict(zip(thresholds, [0] + thresholds[:-1]))
+
+    known = np.zeros(len(features), dtype=bool)
+    worst = spread = np.full(len(features), np.inf)
+    if participants:
+        known = ~np.isnan(arrival).any(axis=0)
+        hi, lo = arrival.max(axis=0), arrival.min(axis=0)
+        worst, spread = np.where(known, hi, np.inf), np.where(known, hi - lo, np.inf)
+    rating = np.asarray([_rating(feat.get("properties") or {}) for feat in features])
+    # lexsort устойчивая и сортирует по последнему ключу первым
+    order = np.lexsort((-rating, spread, worst))
+    if limit is not None:
+        order = order[:limit]
+
+    ranked: List[Dict[str, Any]] = []
+    for j in order:
+        bands = [None if np.isnan(a) else [lower[int(a)], int(a)] for a in arrival[:, j]]
+        fairness = {"max_min": int(worst[j]), "spread_min": int(spread[j])} if known[j] else None
+        props = {**(features[j].get("properties") or {}), "arrival_min": bands, "fairness": fairness}
+        ranked.append({**features[j], "properties": props})
+    return ranked
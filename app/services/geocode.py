@@ -1,9 +1,14 @@
 # app/services/geocode.py
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException
-from ..clients.geocoder import geocode_one
+from ..clients.geocoder import geocode_cache_key, geocode_one
+from ..core.concurrency import map_concurrent
+from ..core.config import get_settings
+from ..core.metrics import span
 
-def geocode_many(
+_settings = get_settings()
+
+async def geocode_many(
     addresses: List[str],
     *,
     city_id: Optional[str] = None,
@@ -11,13 +16,26 @@ def geocode_many(
 ) -> List[Tuple[float, float]]:
     """
     Геокодирует список адресов в список (lat, lon).
+    Одинаковые (после нормализации) адреса геокодируются один раз, остальные — параллельно.
     Бросает 400, если список пуст; 404 — если какой-то адрес не найден.
     """
     if not addresses:
         raise HTTPException(status_code=400, detail="Список addresses пуст.")
 
+    unique: Dict[Tuple, str] = {}
+    for addr in addresses:
+        unique.setdefault(geocode_cache_key(addr, location, city_id), addr)
+
+    async def _geocode(addr: str) -> Tuple[float, float]:
+        return await geocode_one(addr, city_id=city_id, location=location)
+
+    keys = list(unique)
+    with span("geocode"):
+        found = await map_concurrent(_geocode, [unique[k] for k in keys], limit=_settings.GEOCODE_CONCURRENCY)
+    by_key = dict(zip(keys, found))
+
     coords: List[Tuple[float, float]] = []
     for addr in addresses:
-        lat, lon = geocode_one(addr, city_id=city_id, location=location)
+        lat, lon = by_key[geocode_cache_key(addr, location, city_id)]
         coords.append((lat, lon))
-    return coords
\ No newline at end of file
+    return coords
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..clients.dgis import call_isochrone
+from ..core.concurrency import map_concurrent
+from ..core.config import get_settings
+from ..core.ratelimit import PRIORITY_BACKGROUND, request_priority
+from ..core.time_buckets import bucket_for
+from ..geometry.ops import approx_distance_m
+from ..models.schemas import MultiRequest
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+_origins: Optional[np.ndarray] = None  # (n, 2): lat, lon
+_stats: Dict[str, Any] = {"origins": 0, "warmed": 0, "failed": 0, "last_run_at": None, "last_run_sec": None, "snapped": 0}
+
+def load_hot_origins(path: str) -> np.ndarray:
+    """
+    Файл точек: по одной на строку "lat,lon[,название]", пустые строки и # — комментарии.
+    """
+    points: List[Tuple[float, float]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            lat, lon = line.split(",")[:2]
+            points.append((float(lat), float(lon)))
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+def get_hot_origins() -> np.ndarray:
+    global _origins
+    if _origins is None:
+        path = _settings.HOT_ORIGINS_PATH
+        _origins = np.empty((0, 2))
+        if _settings.HOT_ORIGINS_ENABLED and path:
+            try:
+                _origins = load_hot_origins(path)
+            except (OSError, ValueError) as e:
+                logger.warning("cannot load hot origins %s: %s", path, e)
+        _stats["origins"] = len(_origins)
+    return _origins
+
+def hot_origins_stats() -> Optional[Dict[str, Any]]:
+    return dict(_stats) if _settings.HOT_ORIGINS_ENABLED else None
+
+def snap_to_hot_origins(people: List[Tuple[float, float]]) -> Tuple[List[Tuple[float, float]], int]:
+    """
+    Подменяет участника ближайшей прогретой точкой, если она не дальше HOT_ORIGINS_SNAP_RADIUS_M:
+    тогда его изохроны берутся из кэша. Возвращает новые координаты и число подменённых.
+    """
+    origins = get_hot_origins()
+    radius = _settings.HOT_ORIGINS_SNAP_RADIUS_M
+    if not len(origins) or radius <= 0 or not people:
+        return people, 0
+
+    pts = np.asarray(people, dtype=float)
+    # Равнопромежуточная проекция: на радиусах в сотни метров погрешность несущественна
+    dist = approx_distance_m(pts[:, None, 0], pts[:, None, 1], origins[None, :, 0], origins[None, :, 1])
+    nearest = dist.argmin(axis=1)
+    close = dist[np.arange(len(pts)), nearest] <= radius
+
+    snapped = [
+        (float(origins[j, 0]), float(origins[j, 1])) if ok else p
+        for p, j, ok in zip(people, nearest, close)
+    ]
+    count = int(close.sum())
+    _stats["snapped"] += count
+    return snapped, count
+
+def _warm_minutes() -> List[int]:
+    """
+    Длительности, которые запросят эндпоинты с параметрами по умолчанию: лестница поиска и полосы
+    времени в пути до кафе (arrival_minutes), плюс HOT_ORIGINS_MINUTES — например, пороги бисекции.
+    """
+    # search и cafes сами импортируют этот модуль
+    from .cafes import arrival_minutes
+    from .search import search_range
+
+    fields = MultiRequest.model_fields
+    start = fields["t_start_min"].default
+    ladder = search_range(start, fields["t_step_min"].default, fields["t_end_min"].default)
+    extra = [int(v) for v in _settings.HOT_ORIGINS_MINUTES.split(",") if v.strip()]
+    return sorted(set(ladder + arrival_minutes(start) + extra))
+
+def _warm_start_times(now: datetime) -> List[Optional[str]]:
+    """
+    None — "сейчас" (текущая корзина времени), плюс ближайшее наступление каждого времени
+    суток из HOT_ORIGINS_START_TIMES (UTC, "HH:MM").
+    """
+    start_times: List[Optional[str]] = [None]
+    for raw in (_settings.HOT_ORIGINS_START_TIMES or "").split(","):
+        if not raw.strip():
+            continue
+        hour, minute = (int(v) for v in raw.strip().split(":"))
+        dt = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if dt < now:
+            dt += timedelta(days=1)
+        start_times.append(dt.isoformat().replace("+00:00", "Z"))
+    return start_times
+
+async def warm_hot_origins() -> int:
+    """
+    Прогоняет лестницу длительностей для каждой горячей точки и корзины времени через
+    call_isochrone — результат оседает в кэше изохрон (и в персистентном, если он включён).
+    Уже закэшированное повторно не запрашивается. Возвращает число прогретых пар точка × время.
+    """
+    origins = get_hot_origins()
+    durations = [m * 60 for m in _warm_minutes()]
+    if not len(origins) or not durations:
+        return 0
+    jobs = [
+        (float(lat), float(lon), start_time_iso)
+        for start_time_iso in _warm_start_times(datetime.now(timezone.utc))
+        for lat, lon in origins
+    ]
+
+    async def _warm(job: Tuple[float, float, Optional[str]]) -> bool:
+        lat, lon, start_time_iso = job
+        try:
+            await call_isochrone(lat, lon, durations, start_time_iso=start_time_iso)
+        except Exception as e:
+            logger.warning("hot origin warm-up failed for %s,%s: %s", lat, lon, e)
+            return False
+        return True
+
+    started = time.perf_counter()
+    ok = await map_concurrent(_warm, jobs, _settings.HOT_ORIGINS_CONCURRENCY)
+    warmed = sum(ok)
+    _stats.update(
+        warmed=warmed,
+        failed=len(ok) - warmed,
+        last_run_at=time.time(),
+        last_run_sec=round(time.perf_counter() - started, 2),
+    )
+    return warmed
+
+def _sec_to_next_bucket() -> float:
+    # Ключ "сейчас" меняется на границе корзины времени — прогреваем сразу после неё
+    now = datetime.now(timezone.utc)
+    return (bucket_for(now).end - now).total_seconds() + 1
+
+async def run_hot_origins_warmer() -> None:
+    with request_priority(PRIORITY_BACKGROUND):
+        while True:
+            try:
+                await warm_hot_origins()
+            except Exception:
+                logger.exception("hot origins warm-up failed")
+            await asyncio.sleep(min(_settings.HOT_ORIGINS_REFRESH_SEC, _sec_to_next_bucket()))
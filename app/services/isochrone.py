@@ -1,118 +1,97 @@
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+import shapely
 from shapely.geometry import Polygon, MultiPolygon
-from shapely.ops import unary_union
 
 from ..core.config import get_settings
+from ..core.concurrency import map_concurrent, run_cpu, run_in_process
+from ..core.metrics import GEOMETRY_TASK_SECONDS, GEOMETRY_VERTICES, size_bucket, span
 from ..clients.dgis import call_isochrone
+from ..geometry.raster import intersect_isochrones_raster
+from ..geometry.rings import (  # noqa: F401 — реэкспорт для существующих импортов
+    build_time_rings,
+    intersect_isochrones_for_many,
+    intersect_isochrones_wkb,
+    intersect_rings_for_many,
+    union_of_close_time_rings,
+)
 
 _settings = get_settings()
 
-def build_time_rings(isochrones: List[Tuple[int, MultiPolygon | Polygon]]) -> List[Tuple[Tuple[int, int], MultiPolygon | Polygon]]:
-    rings: List[Tuple[Tuple[int, int], MultiPolygon | Polygon]] = []
-    prev_geom = None
-    prev_t = None
-    for duration, geom in isochrones:
-        cur_geom = geom
-        if prev_geom is None:
-            rings.append(((0, duration), cur_geom))
-        else:
-            diff = cur_geom.difference(prev_geom)
-            if not diff.is_empty:
-                rings.append(((prev_t, duration), diff))
-        prev_geom = cur_geom
-        prev_t = duration
-    return rings
-
-def union_of_close_time_rings(rings, target_mid_s: float, delta_s: float):
-    candidates = []
-    for (t0, t1), g in rings:
-        t_mid = (t0 + t1) / 2
-        if abs(t_mid - target_mid_s) <= delta_s:
-            candidates.append(g)
-    if not candidates:
-        return None
-    return unary_union(candidates)
-
-def intersect_rings_for_many(
-    rings_list: List[List[Tuple[Tuple[int, int], Any]]],
-    delta_minutes: int,
-    min_minutes: Optional[int],
-    max_minutes: Optional[int],
-):
-    if not rings_list:
-        return None
-    ref = rings_list[0]
-    others = rings_list[1:]
-    delta_s = delta_minutes * 60
-    result = None
-
-    for (t0, t1), g_ref in ref:
-        t_mid = (t0 + t1) / 2
-        if min_minutes is not None and t_mid / 60 < min_minutes:
-            continue
-        if max_minutes is not None and t_mid / 60 > max_minutes:
-            continue
-
-        cur = g_ref
-        empty = False
-        for rings in others:
-            union_close = union_of_close_time_rings(rings, t_mid, delta_s)
-            if union_close is None:
-                empty = True
-                break
-            cur = cur.intersection(union_close)
-            if cur.is_empty:
-                empty = True
-                break
-        if empty or cur.is_empty:
-            continue
-        result = cur if result is None else unary_union([result, cur])
-    return result
-
-def compute_intersection_iterative(
+async def fetch_isochrones_for_many(
     people: List[Tuple[float, float]],
-    start_minutes: int = 20,
-    step_minutes: int = 10,
-    tolerance_min: int = 10,
+    durations_sec: List[int],
+    transport: str = "public_transport",
+    reverse: bool = False,
     start_time_iso: Optional[str] = None,
     detailing: Optional[float] = None,
-) -> Tuple[Optional[Any], Dict[str, Any]]:
-    transport = "public_transport"
-    reverse = False
-    debug = {"transport": transport, "reverse": reverse, "attempts": []}
-    current_t = start_minutes
-
-    while current_t <= _settings.MAX_MINUTES_CAP:
-        durations = [current_t * 60]
-        attempt_info = {"t_minutes": current_t, "durations_sec": durations}
-        debug["attempts"].append(attempt_info)
-
-        rings_list: List[List[Tuple[Tuple[int, int], Any]]] = []
-        for (lat, lon) in people:
-            iso = call_isochrone(
-                lat=lat,
-                lon=lon,
-                durations_sec=durations,
-                transport=transport,
-                reverse=reverse,
-                start_time_iso=start_time_iso,
-                detailing=detailing,
-            )
-            rings = build_time_rings(iso)
-            rings_list.append(rings)
-
-        inter = intersect_rings_for_many(
-            rings_list,
-            delta_minutes=tolerance_min,
-            min_minutes=None,
-            max_minutes=None,
+) -> List[List[Tuple[int, MultiPolygon | Polygon]]]:
+    async def _fetch(person: Tuple[float, float]) -> List[Tuple[int, MultiPolygon | Polygon]]:
+        lat, lon = person
+        return await call_isochrone(
+            lat=lat,
+            lon=lon,
+            durations_sec=durations_sec,
+            transport=transport,
+            reverse=reverse,
+            start_time_iso=start_time_iso,
+            detailing=detailing,
         )
 
-        if inter is not None and (not inter.is_empty):
-            attempt_info["status"] = "intersection_found"
-            return inter, debug
+    # Изохроны участников запрашиваем параллельно; при ошибке одного остальные отменяются.
+    with span("isochrone_fetch"):
+        return await map_concurrent(_fetch, people, limit=_settings.ISOCHRONE_CONCURRENCY)
 
-        attempt_info["status"] = "no_intersection_retry"
-        current_t += step_minutes
+def resolve_engine(engine: Optional[str], participants: int) -> str:
+    """polygon|raster; auto (или не задан) — сетка для групп от RASTER_MIN_PARTICIPANTS."""
+    if engine in (None, "auto"):
+        threshold = _settings.RASTER_MIN_PARTICIPANTS
+        return "raster" if threshold > 0 and participants >= threshold else "polygon"
+    return engine
 
-    return None, debug
\ No newline at end of file
+async def intersect_isochrones(
+    isochrones_list: List[List[Tuple[int, MultiPolygon | Polygon]]],
+    delta_minutes: int,
+    min_minutes: Optional[int] = None,
+    max_minutes: Optional[int] = None,
+    engine: str = "polygon",
+    raster_cell_m: Optional[float] = None,
+):
+    """
+    Пересечение изохрон вне event loop: полигонами (intersect_isochrones_for_many) или на сетке
+    с клеткой raster_cell_m (RASTER_CELL_M). Небольшие входы считаются в пуле потоков;
+    от GEOMETRY_PROCESS_MIN_VERTICES вершин (при GEOMETRY_PROCESSES > 0) — в пуле процессов,
+    куда изохроны уходят и откуда пересечение возвращается в WKB. Время пишется в
+    app_geometry_task_duration_seconds{backend,engine,size} — по нему подбирается порог.
+    """
+    geoms = np.asarray([g for iso in isochrones_list for _, g in iso], dtype=object)
+    vertices = int(shapely.get_num_coordinates(geoms).sum()) if len(geoms) else 0
+    GEOMETRY_VERTICES.observe(vertices, kind="intersection_input")
+    backend = "process" if _settings.GEOMETRY_PROCESSES > 0 and vertices >= _settings.GEOMETRY_PROCESS_MIN_VERTICES else "thread"
+    cell_m = (raster_cell_m or _settings.RASTER_CELL_M) if engine == "raster" else None
+
+    started = time.perf_counter()
+    if backend == "process":
+        blobs = iter(shapely.to_wkb(geoms).tolist())
+        payload = [[(duration, next(blobs)) for duration, _ in iso] for iso in isochrones_list]
+        blob = await run_in_process(
+            intersect_isochrones_wkb, payload, delta_minutes, min_minutes, max_minutes, cell_m, _settings.RASTER_MAX_CELLS
+        )
+        inter = None if blob is None else shapely.from_wkb(blob)
+    elif cell_m:
+        inter = await run_cpu(
+            intersect_isochrones_raster,
+            isochrones_list,
+            delta_minutes,
+            cell_m,
+            min_minutes,
+            max_minutes,
+            _settings.RASTER_MAX_CELLS,
+        )
+    else:
+        inter = await run_cpu(intersect_isochrones_for_many, isochrones_list, delta_minutes, min_minutes, max_minutes)
+    GEOMETRY_TASK_SECONDS.observe(
+        time.perf_counter() - started, backend=backend, engine=engine, size=size_bucket(vertices)
+    )
+    return inter
@@ -0,0 +1,268 @@
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from ..clients.dgis import fetch_places_page, item_to_feature
+from ..core.concurrency import map_concurrent, run_cpu
+from ..core.config import get_settings
+from ..core.ratelimit import PRIORITY_BACKGROUND, request_priority
+
+logger = logging.getLogger(__name__)
+_settings = get_settings()
+
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+class PlacesSnapshot:
+    """
+    Снимок кафе города в колоночном виде: координаты — два numpy-массива, свойства — список
+    GeoJSON-фич в том же порядке. Поверх точек строится STRtree, поэтому выборка по области —
+    это bbox-запрос к дереву и векторная проверка точка-в-полигоне по кандидатам.
+    Плитки, выкачанные не полностью (truncated), в покрытие не входят: такие запросы идут в живой Places.
+    """
+
+    def __init__(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        features: List[Dict[str, Any]],
+        bbox: BBox,
+        built_at: float,
+        truncated: Optional[List[BBox]] = None,
+    ):
+        self.xs = xs
+        self.ys = ys
+        self.features = features
+        self.bbox = bbox
+        self.built_at = built_at
+        self.truncated = list(truncated or [])
+        self.coverage = shapely.box(*bbox)
+        if self.truncated:
+            self.coverage = self.coverage.difference(shapely.union_all(shapely.box(*np.asarray(self.truncated).T)))
+        self.tree = STRtree(shapely.points(xs, ys)) if len(xs) else None
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def age_sec(self) -> float:
+        return time.time() - self.built_at
+
+    def can_answer(self, geom, max_age_sec: float) -> bool:
+        return self.age_sec() <= max_age_sec and self.coverage.covers(geom)
+
+    def query(self, geom) -> List[Dict[str, Any]]:
+        if self.tree is None or geom is None or geom.is_empty:
+            return []
+        idx = np.sort(self.tree.query(geom))
+        if not len(idx):
+            return []
+        shapely.prepare(geom)
+        # intersects, а не contains: кафе ровно на границе области тоже считаем своим (как в живом поиске)
+        inside = shapely.intersects_xy(geom, self.xs[idx], self.ys[idx])
+        return [self.features[i] for i in idx[inside]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cafes": len(self),
+            "bbox": list(self.bbox),
+            "built_at": self.built_at,
+            "age_sec": round(self.age_sec()),
+            "truncated_tiles": len(self.truncated),
+        }
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        payload = json.dumps(self.features, ensure_ascii=False, separators=(",", ":")).encode()
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                x=self.xs,
+                y=self.ys,
+                features=np.frombuffer(payload, dtype=np.uint8),
+                bbox=np.asarray(self.bbox, dtype=float),
+                built_at=np.asarray([self.built_at]),
+                truncated=np.asarray(self.truncated, dtype=float).reshape(-1, 4),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PlacesSnapshot":
+        with np.load(path) as data:
+            features = json.loads(data["features"].tobytes())
+            return cls(
+                data["x"].astype(float),
+                data["y"].astype(float),
+                features,
+                tuple(float(v) for v in data["bbox"]),
+                float(data["built_at"][0]),
+                # Снимки, сохранённые до появления поля, считаются полными
+                [tuple(row) for row in data["truncated"].tolist()] if "truncated" in data.files else None,
+            )
+
+_snapshot: Optional[PlacesSnapshot] = None
+
+def get_places_snapshot() -> Optional[PlacesSnapshot]:
+    return _snapshot
+
+def places_index_stats() -> Optional[Dict[str, Any]]:
+    return _snapshot.stats() if _snapshot is not None else None
+
+def parse_bbox(raw: str) -> BBox:
+    min_lon, min_lat, max_lon, max_lat = (float(v) for v in raw.split(","))
+    return (min_lon, min_lat, max_lon, max_lat)
+
+def _tiles(bbox: BBox, step: float) -> List[BBox]:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    nx = max(1, math.ceil((max_lon - min_lon) / step - 1e-9))
+    ny = max(1, math.ceil((max_lat - min_lat) / step - 1e-9))
+    dx = (max_lon - min_lon) / nx
+    dy = (max_lat - min_lat) / ny
+    return [
+        (min_lon + i * dx, min_lat + j * dy, min_lon + (i + 1) * dx, min_lat + (j + 1) * dy)
+        for i in range(nx)
+        for j in range(ny)
+    ]
+
+def _split(tile: BBox) -> List[BBox]:
+    min_lon, min_lat, max_lon, max_lat = tile
+    mid_lon = (min_lon + max_lon) / 2
+    mid_lat = (min_lat + max_lat) / 2
+    return [
+        (min_lon, min_lat, mid_lon, mid_lat),
+        (mid_lon, min_lat, max_lon, mid_lat),
+        (min_lon, mid_lat, mid_lon, max_lat),
+        (mid_lon, mid_lat, max_lon, max_lat),
+    ]
+
+async def build_places_snapshot(
+    bbox: BBox,
+    tile_deg: float,
+    q: str = "cafe",
+    page_size: int = 50,
+    max_pages: int = 40,
+    max_depth: int = 4,
+) -> PlacesSnapshot:
+    """
+    Обходит bbox города плитками через обычный клиент Places. Плитку, где 2ГИС нашёл больше,
+    чем можно выкачать постранично (page_size * max_pages), делим на четыре, пока не влезет;
+    если не влезла и на max_depth, она исключается из покрытия снимка.
+    """
+    limit = _settings.PLACES_CONCURRENCY
+    cap = page_size * max_pages
+
+    async def _first(tile: BBox) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        return await fetch_places_page(shapely.box(*tile).wkt, q, page_size, 1)
+
+    items: List[Dict[str, Any]] = []
+    rest: List[Tuple[str, int]] = []
+    truncated: List[BBox] = []
+    level = _tiles(bbox, tile_deg)
+    for depth in range(max_depth + 1):
+        next_level: List[BBox] = []
+        firsts = await map_concurrent(_first, level, limit)
+        for tile, (page_items, total) in zip(level, firsts):
+            if total is not None and total > cap and depth < max_depth:
+                next_level.extend(_split(tile))
+                continue
+            if total is not None and total > cap:
+                logger.warning("places index tile %s has %d cafes, only %d fit; left to live Places", tile, total, cap)
+                truncated.append(tile)
+            items.extend(page_items)
+            if len(page_items) < page_size:
+                continue
+            pages = max_pages if total is None else min(max_pages, math.ceil(total / page_size))
+            rest.extend((shapely.box(*tile).wkt, page) for page in range(2, pages + 1))
+        if not next_level:
+            break
+        level = next_level
+
+    async def _page(task: Tuple[str, int]) -> List[Dict[str, Any]]:
+        polygon_wkt, page = task
+        return (await fetch_places_page(polygon_wkt, q, page_size, page))[0]
+
+    for page_items in await map_concurrent(_page, rest, limit):
+        items.extend(page_items)
+
+    seen: Set[str] = set()
+    features: List[Dict[str, Any]] = []
+    for it in items:
+        it_id = it.get("id")
+        if not it_id or it_id in seen:
+            continue
+        feat = item_to_feature(it)
+        if not feat:
+            continue
+        seen.add(it_id)
+        features.append(feat)
+
+    xs = np.fromiter((f["geometry"]["coordinates"][0] for f in features), dtype=float, count=len(features))
+    ys = np.fromiter((f["geometry"]["coordinates"][1] for f in features), dtype=float, count=len(features))
+    return await run_cpu(PlacesSnapshot, xs, ys, features, bbox, time.time(), truncated)
+
+def _load_if_fresh(path: Optional[str]) -> bool:
+    global _snapshot
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        snap = PlacesSnapshot.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("cannot load places index %s: %s", path, e)
+        return False
+    if snap.age_sec() > _settings.PLACES_INDEX_REFRESH_SEC:
+        return False
+    if _snapshot is None or snap.built_at > _snapshot.built_at:
+        _snapshot = snap
+    return True
+
+async def refresh_places_index() -> None:
+    """
+    Обновляет снимок: берёт свежий файл, если его уже построил другой воркер, иначе строит сам.
+    Файловая блокировка не даёт нескольким воркерам одновременно обходить город.
+    """
+    global _snapshot
+    path = _settings.PLACES_INDEX_PATH
+    if _load_if_fresh(path):
+        return
+
+    lock_file = None
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        lock_file = open(f"{path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return  # строит другой воркер — подхватим файл на следующем круге
+    try:
+        if _load_if_fresh(path):
+            return
+        snap = await build_places_snapshot(
+            parse_bbox(_settings.PLACES_INDEX_BBOX),
+            tile_deg=_settings.PLACES_INDEX_TILE_DEG,
+        )
+        _snapshot = snap
+        logger.info("places index built: %s", snap.stats())
+        if path:
+            await run_cpu(snap.save, path)
+    finally:
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+async def run_places_index_refresher() -> None:
+    # Пока снимка нет, пробуем чаще: возможно, его прямо сейчас строит соседний воркер
+    with request_priority(PRIORITY_BACKGROUND):
+        while True:
+            try:
+                await refresh_places_index()
+            except Exception:
+                logger.exception("places index refresh failed")
+            await asyncio.sleep(_settings.PLACES_INDEX_REFRESH_SEC if _snapshot is not None else 60)
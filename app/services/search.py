@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from shapely.geometry import Polygon, MultiPolygon
+
+from ..clients.dgis import describe_time_bucket, track_time_buckets
+from ..core.config import get_settings
+from ..core.http import track_upstream_requests
+from ..core.metrics import GEOMETRY_VERTICES, record_stage
+from ..geometry.ops import count_vertices
+from .hot_origins import snap_to_hot_origins
+from .isochrone import fetch_isochrones_for_many, intersect_isochrones, resolve_engine
+
+_settings = get_settings()
+
+IsochroneStack = List[List[Tuple[int, MultiPolygon | Polygon]]]
+
+def search_range(start_minutes: int, step_minutes: int, end_minutes: Optional[int]) -> List[int]:
+    end_minutes = min(end_minutes or _settings.MAX_MINUTES_CAP, _settings.MAX_MINUTES_CAP)
+    return list(range(start_minutes, end_minutes + 1, max(1, step_minutes)))
+
+def record_attempt(
+    debug: Dict[str, Any],
+    t: int,
+    phase: str,
+    found: bool,
+    on_attempt: Optional[Callable[[Dict[str, Any]], None]],
+    inter=None,
+) -> None:
+    attempt_info = {"t_minutes": t, "durations_sec": [t * 60], "phase": phase}
+    if found:
+        attempt_info["status"] = "intersection_found"
+        GEOMETRY_VERTICES.observe(count_vertices(inter), kind="intersection")
+    else:
+        attempt_info["status"] = "no_intersection_retry" if phase != "bisect" else "no_intersection"
+    debug["attempts"].append(attempt_info)
+    if on_attempt is not None:
+        on_attempt(attempt_info)
+
+async def search_thresholds(
+    evaluate: Callable[[int, str], Awaitable[Optional[Any]]],
+    thresholds: List[int],
+    precision_min: int,
+    phase: str = "ladder",
+) -> Tuple[Optional[Any], Optional[int]]:
+    """
+    Стратегия поиска поверх evaluate(t, phase) -> пересечение или None: ступени thresholds по порядку
+    до первого непустого, затем бисекция между ним и последним пустым до ширины precision_min.
+    Возвращает (пересечение, минуты) или (None, None).
+    """
+    best = None
+    lo: Optional[int] = None  # последний порог без пересечения
+    hi: Optional[int] = None  # первый порог с пересечением
+    for t in thresholds:
+        inter = await evaluate(t, phase)
+        if inter is not None:
+            best, hi = inter, t
+            break
+        lo = t
+
+    # Бисекция между пустым и непустым порогом: каждая итерация — один запрос на участника
+    if best is not None and lo is not None and precision_min > 0:
+        while hi - lo > precision_min:
+            mid = (lo + hi) // 2
+            inter = await evaluate(mid, "bisect")
+            if inter is not None:
+                best, hi = inter, mid
+            else:
+                lo = mid
+    return best, hi
+
+async def compute_intersection_iterative(
+    people: List[Tuple[float, float]],
+    start_minutes: int = 20,
+    step_minutes: int = 10,
+    tolerance_min: int = 10,
+    start_time_iso: Optional[str] = None,
+    detailing: Optional[float] = None,
+    ladder: Optional[bool] = None,
+    on_attempt: Optional[Callable[[Dict[str, Any]], None]] = None,
+    end_minutes: Optional[int] = None,
+    precision_min: Optional[int] = None,
+    engine: Optional[str] = None,
+    raster_cell_m: Optional[float] = None,
+    on_isochrones: Optional[Callable[[int, IsochroneStack], None]] = None,
+    extra_minutes: Optional[List[int]] = None,
+) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    Ищет минимальное общее время в пределах [start_minutes, end_minutes] (не выше MAX_MINUTES_CAP).
+    Сначала грубая лестница с шагом step_minutes — в режиме ladder одним пакетом на участника,
+    пороги проверяются локально. Найдя первый непустой порог, делим пополам интервал между ним
+    и последним пустым, пока он не станет уже precision_min (SEARCH_PRECISION_MIN).
+    Пересечение считается полигонами или на сетке (engine: polygon|raster|auto, см. resolve_engine).
+    В debug — все проверенные пороги, движок, число запросов к 2ГИС и время на геометрию.
+    on_isochrones(t, изохроны участников) получает каждую полученную длительность — всю лестницу, пороги
+    бисекции и extra_minutes, — например, чтобы оценить время в пути до найденных мест без новых запросов.
+    extra_minutes запрашиваются в том же пакете, что и лестница (без лестницы — после поиска), и в поиске
+    не участвуют.
+    """
+    transport = "public_transport"
+    reverse = False
+    debug: Dict[str, Any] = {"transport": transport, "reverse": reverse, "attempts": []}
+    # Участников рядом с прогретыми точками считаем из них — их изохроны уже лежат в кэше
+    people, debug["snapped_to_hot_origins"] = snap_to_hot_origins(people)
+    if ladder is None:
+        ladder = _settings.ISOCHRONE_LADDER_MODE
+    if precision_min is None:
+        precision_min = _settings.SEARCH_PRECISION_MIN
+    thresholds = search_range(start_minutes, step_minutes, end_minutes)
+    debug["engine"] = engine = resolve_engine(engine, len(people))
+    extra = [t for t in extra_minutes or [] if t not in thresholds]
+    cpu_sec = 0.0
+
+    async def _fetch(minutes: List[int]) -> IsochroneStack:
+        stack = await fetch_isochrones_for_many(
+            people,
+            [t * 60 for t in minutes],
+            transport=transport,
+            reverse=reverse,
+            start_time_iso=start_time_iso,
+            detailing=detailing,
+        )
+        if on_isochrones is not None:
+            for t in minutes:
+                on_isochrones(t, [[(d, g) for d, g in iso if d == t * 60] for iso in stack])
+        return stack
+
+    async def _check(t: int, per_person: IsochroneStack, phase: str):
+        nonlocal cpu_sec
+        # Кольца и пересечения — чистый CPU, считаются в пуле потоков или процессов, не блокируя event loop
+        started = time.perf_counter()
+        inter = await intersect_isochrones(per_person, tolerance_min, engine=engine, raster_cell_m=raster_cell_m)
+        elapsed = time.perf_counter() - started
+        cpu_sec += elapsed
+        record_stage("intersection", elapsed)
+        found = inter is not None and not inter.is_empty
+        record_attempt(debug, t, phase, found, on_attempt, inter)
+        return inter if found else None
+
+    with track_upstream_requests() as upstream, track_time_buckets() as buckets:
+        # В режиме лестницы все пороги запрашиваются одним пакетом на участника
+        # (call_isochrone сам режет его по 5 длительностей), дальше пороги перебираются локально.
+        iso_stack: Optional[IsochroneStack] = None
+        if ladder and thresholds:
+            fetched = sorted(thresholds + extra)
+            iso_stack = await _fetch(fetched)
+            debug["ladder_durations_sec"] = [t * 60 for t in fetched]
+
+        async def _evaluate(t: int, phase: str):
+            if iso_stack is not None and phase != "bisect":
+                per_person = [[(d, g) for d, g in iso if d == t * 60] for iso in iso_stack]
+            else:
+                per_person = await _fetch([t])
+            return await _check(t, per_person, phase)
+
+        best, hi = await search_thresholds(_evaluate, thresholds, precision_min, "ladder" if ladder else "step")
+        if best is not None and extra and iso_stack is None:
+            await _fetch(extra)
+
+    debug["t_minutes"] = hi
+    debug["time_bucket"] = describe_time_bucket(start_time_iso, buckets)
+    debug["upstream_requests"] = upstream["requests"]
+    debug["cpu_ms"] = round(cpu_sec * 1000, 1)
+    return best, debug
+
+async def iter_intersection_progress(
+    people: List[Tuple[float, float]],
+    **kwargs: Any,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    То же, что compute_intersection_iterative, но с промежуточными событиями для потоковых ответов:
+    ("attempt", attempt_info) на каждую проверенную ступень и в конце ("result", (inter, debug)).
+    """
+    attempts: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    task = asyncio.ensure_future(compute_intersection_iterative(people, on_attempt=attempts.put_nowait, **kwargs))
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(attempts.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield "attempt", getter.result()
+            else:
+                getter.cancel()
+        while not attempts.empty():
+            yield "attempt", attempts.get_nowait()
+        yield "result", task.result()
+    finally:
+        task.cancel()
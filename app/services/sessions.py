@@ -0,0 +1,219 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import shapely
+
+from ..clients.dgis import describe_time_bucket, isochrone_time_key, track_time_buckets
+from ..core.concurrency import run_cpu
+from ..core.config import get_settings
+from ..core.http import track_upstream_requests
+from ..core.metrics import record_stage
+from .hot_origins import snap_to_hot_origins
+from .isochrone import fetch_isochrones_for_many
+from .search import record_attempt, search_range, search_thresholds
+
+_settings = get_settings()
+
+Point = Tuple[float, float]
+
+class SessionNotFound(KeyError):
+    pass
+
+class ComputeSession:
+    """
+    Состояние одной вкладки: позиции участников, их изохроны по проверенным порогам и
+    частичные пересечения по порогам вместе с составом, по которому они посчитаны.
+    При одной длительности на участника пересечение колец сводится к обычному пересечению
+    изохрон, поэтому новый участник — это один запрос его изохрон и одно пересечение с готовым результатом,
+    а сдвинутый или удалённый — пересчёт из уже имеющихся изохрон без походов в 2ГИС.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.lock = asyncio.Lock()
+        self.touched_at = time.monotonic()
+        self.params: Optional[Tuple] = None
+        self.positions: Dict[str, Point] = {}
+        self.isochrones: Dict[str, Dict[int, Any]] = {}  # участник -> минуты -> геометрия
+        self.partials: Dict[int, Tuple[Dict[str, Point], Any]] = {}  # минуты -> (состав, пересечение)
+
+    def reset(self, params: Tuple) -> None:
+        self.params = params
+        self.positions.clear()
+        self.isochrones.clear()
+        self.partials.clear()
+
+    def apply(self, participants: Dict[str, Point]) -> Dict[str, List[str]]:
+        """Применяет новый список участников; изохроны сдвинутых и удалённых выбрасываются."""
+        diff: Dict[str, List[str]] = {"added": [], "moved": [], "removed": []}
+        for pid in list(self.positions):
+            if pid not in participants:
+                diff["removed"].append(pid)
+            elif participants[pid] != self.positions[pid]:
+                diff["moved"].append(pid)
+            else:
+                continue
+            self.isochrones.pop(pid, None)
+        diff["added"] = [pid for pid in participants if pid not in self.positions]
+        self.positions = dict(participants)
+        for pid in participants:
+            self.isochrones.setdefault(pid, {})
+        return diff
+
+    def stored_isochrones(self) -> int:
+        return sum(len(by_t) for by_t in self.isochrones.values())
+
+    async def fetch_missing(self, minutes: List[int], start_time_iso: Optional[str], detailing: Optional[float]) -> int:
+        """Дозапрашивает изохроны только тем участникам, у кого их нет для этих порогов."""
+        missing = [pid for pid, by_t in self.isochrones.items() if any(t not in by_t for t in minutes)]
+        if not missing:
+            return 0
+        stacks = await fetch_isochrones_for_many(
+            [self.positions[pid] for pid in missing],
+            [t * 60 for t in minutes],
+            start_time_iso=start_time_iso,
+            detailing=detailing,
+        )
+        for pid, stack in zip(missing, stacks):
+            for duration, geom in stack:
+                self.isochrones[pid][duration // 60] = geom
+        return len(missing)
+
+    def intersect(self, t: int) -> Tuple[Any, int]:
+        """
+        Пересечение на пороге t и число выполненных попарных пересечений (CPU, в пуле потоков).
+        Если 2ГИС не вернул кому-то эту длительность — пересечения нет (None), как и без сессии.
+        """
+        members = self.positions
+        geoms = {pid: self.isochrones[pid].get(t) for pid in members}
+        if any(g is None for g in geoms.values()):
+            return None, 0
+        cached = self.partials.get(t)
+        if cached is not None:
+            done, geom = cached
+            # Частичный результат годится, если все его участники на месте и не двигались
+            if all(members.get(pid) == pos for pid, pos in done.items()):
+                rest = [pid for pid in members if pid not in done]
+                for pid in rest:
+                    geom = geom.intersection(geoms[pid])
+                self.partials[t] = (dict(members), geom)
+                return geom, len(rest)
+        geom = shapely.intersection_all(list(geoms.values()))
+        self.partials[t] = (dict(members), geom)
+        return geom, len(members)
+
+class SessionStore:
+    """LRU по времени последнего обращения: не больше max_sessions, простаивающие дольше idle_sec выбрасываются."""
+
+    def __init__(self, max_sessions: int, idle_sec: float):
+        self.max_sessions = max_sessions
+        self.idle_sec = idle_sec
+        self._sessions: "OrderedDict[str, ComputeSession]" = OrderedDict()
+        self.evicted = 0
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.touched_at <= self.idle_sec:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def create(self) -> ComputeSession:
+        session = ComputeSession(secrets.token_urlsafe(12))
+        self._sessions[session.id] = session
+        self._evict()
+        return session
+
+    def get(self, session_id: str) -> ComputeSession:
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        session.touched_at = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        self._evict()
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted": self.evicted,
+            "isochrones": sum(s.stored_isochrones() for s in self._sessions.values()),
+        }
+
+_store = SessionStore(_settings.SESSION_MAX_COUNT, _settings.SESSION_IDLE_SEC)
+
+def get_session_store() -> SessionStore:
+    return _store
+
+def session_stats() -> Dict[str, Any]:
+    return _store.stats()
+
+async def compute_session_intersection(
+    session: ComputeSession,
+    participants: Dict[str, Point],
+    start_minutes: int = 20,
+    step_minutes: int = 10,
+    end_minutes: Optional[int] = None,
+    start_time_iso: Optional[str] = None,
+    detailing: Optional[float] = None,
+    precision_min: Optional[int] = None,
+    on_attempt: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    Тот же поиск, что compute_intersection_iterative (лестница + бисекция), но поверх состояния сессии:
+    в 2ГИС уходят только новые и сдвинутые участники, пересечения достраиваются от прошлых.
+    """
+    if precision_min is None:
+        precision_min = _settings.SEARCH_PRECISION_MIN
+    thresholds = search_range(start_minutes, step_minutes, end_minutes)
+    debug: Dict[str, Any] = {"transport": "public_transport", "reverse": False, "attempts": []}
+
+    pids = list(participants)
+    snapped, debug["snapped_to_hot_origins"] = snap_to_hot_origins([participants[pid] for pid in pids])
+    participants = dict(zip(pids, snapped))
+
+    async with session.lock:
+        # Корзина времени сдвинулась или поменялись параметры — старые изохроны не годятся
+        params = (isochrone_time_key(start_time_iso), detailing)
+        if session.params != params:
+            session.reset(params)
+        debug["session"] = session.apply(participants)
+
+        fetched = 0
+        intersections = 0
+        cpu_sec = 0.0
+
+        async def _evaluate(t: int, phase: str):
+            nonlocal fetched, intersections, cpu_sec
+            fetched += await session.fetch_missing([t], start_time_iso, detailing)
+            started = time.perf_counter()
+            inter, ops = await run_cpu(session.intersect, t)
+            elapsed = time.perf_counter() - started
+            cpu_sec += elapsed
+            intersections += ops
+            record_stage("intersection", elapsed)
+            found = inter is not None and not inter.is_empty
+            record_attempt(debug, t, phase, found, on_attempt, inter)
+            return inter if found else None
+
+        with track_upstream_requests() as upstream, track_time_buckets() as buckets:
+            if _settings.ISOCHRONE_LADDER_MODE and thresholds:
+                fetched += await session.fetch_missing(thresholds, start_time_iso, detailing)
+            best, hi = await search_thresholds(_evaluate, thresholds, precision_min)
+
+    debug["session"].update(fetched_participants=fetched, intersections=intersections)
+    debug["t_minutes"] = hi
+    debug["time_bucket"] = describe_time_bucket(start_time_iso, buckets)
+    debug["upstream_requests"] = upstream["requests"]
+    debug["cpu_ms"] = round(cpu_sec * 1000, 1)
+    return best, debug
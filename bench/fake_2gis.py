@@ -0,0 +1,242 @@
+"""
+Локальная замена API 2ГИС для бенчмарков и нагрузочных прогонов без сети и квоты.
+
+Отвечает на те же запросы, что делает бэкенд:
+  POST /isochrone/2.0.0     — изохроны (WKT)
+  GET  /3.0/items           — Places внутри polygon, постранично
+  GET  /3.0/items/geocode   — геокодер
+
+Ответы либо проигрываются из записей (см. bench/record.py), либо генерируются:
+изохрона — зашумлённый круг с радиусом пропорционально длительности и заданным числом вершин,
+кафе — детерминированный "город" из случайных точек, фильтруемый по присланному полигону.
+
+Запуск:
+  python -m bench.fake_2gis --port 9000 --latency-ms 80 --error-rate 0.02 --throttle-rate 0.01
+и бэкенд с ISOCHRONE_URL=http://127.0.0.1:9000/isochrone/2.0.0,
+PLACES_ITEMS_URL=http://127.0.0.1:9000/3.0/items, GEOCODE_URL=http://127.0.0.1:9000/3.0/items/geocode.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from shapely import affinity, wkt
+
+# Центр и размах синтетического города (Москва)
+CITY_CENTER = (55.75, 37.62)
+CITY_SPAN_DEG = 0.3
+# Скорость "общественного транспорта" для синтетических изохрон: градусов на секунду длительности
+DEG_PER_SEC = 0.08 / 3600
+
+@dataclass
+class FakeOptions:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0  # доля ответов 503
+    throttle_rate: float = 0.0  # доля ответов 429 с Retry-After
+    retry_after_sec: float = 1.0
+    vertices: int = 256  # вершин в синтетической изохроне
+    cafes: int = 5000  # кафе в синтетическом городе
+    recordings: Optional[str] = None
+    seed: int = 1
+    drop_durations: Tuple[int, ...] = ()  # длительности (сек), которых нет в ответе изохрон, как иногда у 2ГИС
+
+def _stable_random(*parts: Any) -> random.Random:
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+def synthetic_isochrone(lat: float, lon: float, duration: int, vertices: int):
+    # Радиальный шум фиксирован для точки, поэтому изохроны одной точки вложены друг в друга
+    rnd = _stable_random(round(lat, 5), round(lon, 5))
+    phases = [rnd.uniform(0, 2 * math.pi) for _ in range(3)]
+    angles = np.linspace(0, 2 * math.pi, max(vertices, 8), endpoint=False)
+    noise = 1 + 0.25 * sum(np.sin((k + 2) * angles + ph) / (k + 1) for k, ph in enumerate(phases))
+    r = duration * DEG_PER_SEC * noise
+    xs = lon + r * np.cos(angles) / math.cos(math.radians(lat))
+    ys = lat + r * np.sin(angles)
+    return shapely.Polygon(np.column_stack([xs, ys]))
+
+def synthetic_city(n: int, seed: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(seed)
+    lat0, lon0 = CITY_CENTER
+    items = []
+    for i in range(n):
+        items.append({
+            "id": f"fake{i}",
+            "name": f"Кафе №{i}",
+            "address_name": f"ул. Тестовая, {i % 200 + 1}",
+            "point": {
+                "lat": lat0 + rnd.uniform(-CITY_SPAN_DEG, CITY_SPAN_DEG) / 2,
+                "lon": lon0 + rnd.uniform(-CITY_SPAN_DEG, CITY_SPAN_DEG),
+            },
+            "rubrics": [{"name": "Кафе"}],
+            "rating": {"rating": round(rnd.uniform(3, 5), 1), "reviews": rnd.randint(0, 500)},
+            "contact_groups": [{"contacts": [{"type": "phone", "value": f"+7 495 000-{i:04d}"}]}],
+        })
+    return items
+
+class Recordings:
+    """
+    Записи реальных ответов: isochrone.jsonl ({"start", "response"}), places.jsonl (items), geocode.jsonl
+    ({"q", "response"}). Изохроны проигрываются со сдвигом к запрошенной точке старта.
+    """
+
+    def __init__(self, path: str):
+        self.isochrones: Dict[int, List[Any]] = {}
+        self.places: List[Dict[str, Any]] = []
+        self.geocode: Dict[str, Any] = {}
+        iso_path = os.path.join(path, "isochrone.jsonl")
+        if os.path.exists(iso_path):
+            for rec in _read_jsonl(iso_path):
+                start = rec["start"]
+                for item in rec["response"].get("isochrones") or []:
+                    geom = wkt.loads(item["geometry"])
+                    # Храним в координатах относительно старта
+                    shifted = affinity.translate(geom, xoff=-start["lon"], yoff=-start["lat"])
+                    self.isochrones.setdefault(int(item["duration"]), []).append(shifted)
+        places_path = os.path.join(path, "places.jsonl")
+        if os.path.exists(places_path):
+            self.places = list(_read_jsonl(places_path))
+        geocode_path = os.path.join(path, "geocode.jsonl")
+        if os.path.exists(geocode_path):
+            self.geocode = {rec["q"]: rec["response"] for rec in _read_jsonl(geocode_path)}
+
+    def isochrone(self, lat: float, lon: float, duration: int):
+        if not self.isochrones:
+            return None
+        nearest = min(self.isochrones, key=lambda d: abs(d - duration))
+        shapes = self.isochrones[nearest]
+        shape = shapes[_stable_random(round(lat, 4), round(lon, 4)).randrange(len(shapes))]
+        # Масштабируем под запрошенную длительность, если точной записи нет
+        scale = duration / nearest if nearest else 1.0
+        shape = affinity.scale(shape, xfact=scale, yfact=scale, origin=(0, 0))
+        return affinity.translate(shape, xoff=lon, yoff=lat)
+
+def _read_jsonl(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def create_app(opts: FakeOptions) -> FastAPI:
+    app = FastAPI(title="fake 2GIS")
+    recordings = Recordings(opts.recordings) if opts.recordings else None
+    items = (recordings.places if recordings and recordings.places else None) or synthetic_city(opts.cafes, opts.seed)
+    xs = np.array([it["point"]["lon"] for it in items])
+    ys = np.array([it["point"]["lat"] for it in items])
+    rnd = random.Random(opts.seed)
+    stats = {"isochrone": 0, "places": 0, "geocode": 0, "errors": 0, "throttled": 0}
+    app.state.stats = stats
+
+    async def _misbehave() -> Optional[JSONResponse]:
+        delay = opts.latency_ms + (rnd.uniform(-opts.jitter_ms, opts.jitter_ms) if opts.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = rnd.random()
+        if roll < opts.throttle_rate:
+            stats["throttled"] += 1
+            return JSONResponse({"error": "rate limit"}, status_code=429, headers={"Retry-After": str(opts.retry_after_sec)})
+        if roll < opts.throttle_rate + opts.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        return None
+
+    @app.post("/isochrone/2.0.0")
+    async def isochrone(request: Request):
+        stats["isochrone"] += 1
+        failure = await _misbehave()
+        if failure is not None:
+            return failure
+        body = await request.json()
+        lat, lon = body["start"]["lat"], body["start"]["lon"]
+        out = []
+        for duration in body["durations"]:
+            if duration in opts.drop_durations:
+                continue
+            geom = recordings.isochrone(lat, lon, duration) if recordings else None
+            if geom is None:
+                geom = synthetic_isochrone(lat, lon, duration, opts.vertices)
+            out.append({"duration": duration, "geometry": geom.wkt})
+        return {"status": "OK", "isochrones": out}
+
+    @app.get("/3.0/items")
+    async def places(polygon: str, page_size: int = 50, page: int = 1):
+        stats["places"] += 1
+        failure = await _misbehave()
+        if failure is not None:
+            return failure
+        area = wkt.loads(polygon)
+        shapely.prepare(area)
+        idx = np.nonzero(shapely.intersects_xy(area, xs, ys))[0]
+        chunk = idx[(page - 1) * page_size : page * page_size]
+        return {"meta": {"code": 200}, "result": {"total": int(len(idx)), "items": [items[i] for i in chunk]}}
+
+    @app.get("/3.0/items/geocode")
+    async def geocode(q: str = ""):
+        stats["geocode"] += 1
+        failure = await _misbehave()
+        if failure is not None:
+            return failure
+        if recordings and q in recordings.geocode:
+            return recordings.geocode[q]
+        rnd_q = _stable_random(q.strip().casefold())
+        lat0, lon0 = CITY_CENTER
+        point = {
+            "lat": lat0 + rnd_q.uniform(-0.03, 0.03),
+            "lon": lon0 + rnd_q.uniform(-0.05, 0.05),
+        }
+        return {"meta": {"code": 200}, "result": {"total": 1, "items": [{"full_name": q, "point": point}]}}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-sec", type=float, default=1.0)
+    parser.add_argument("--vertices", type=int, default=256)
+    parser.add_argument("--cafes", type=int, default=5000)
+    parser.add_argument("--recordings", default=None, help="каталог с записями bench/record.py")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--drop-durations", default="", help="длительности (сек) через запятую, которые не возвращать")
+
+def options_from_args(args: argparse.Namespace) -> FakeOptions:
+    return FakeOptions(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after_sec=args.retry_after_sec,
+        vertices=args.vertices,
+        cafes=args.cafes,
+        recordings=args.recordings,
+        seed=args.seed,
+        drop_durations=tuple(int(v) for v in args.drop_durations.split(",") if v.strip()),
+    )
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(options_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
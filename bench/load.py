@@ -0,0 +1,172 @@
+"""
+Сквозной нагрузочный сценарий: поднимает фейковый 2ГИС и бэкенд (uvicorn в соседних потоках)
+и гоняет по эндпоинтам группы участников, печатая пропускную способность и p50/p95/p99.
+
+  python -m bench.load --requests 300 --concurrency 16 --latency-ms 80 --error-rate 0.01
+  python -m bench.load --target http://127.0.0.1:8000   # против уже запущенного бэкенда
+
+Размер пула точек (--origins) задаёт долю попаданий в кэши: чем он меньше, тем чаще группы повторяются.
+Кэши бэкенда можно отключить через --no-cache, чтобы мерить холодный путь.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .fake_2gis import CITY_CENTER, add_arguments, create_app, options_from_args
+
+ENDPOINTS = ["/equal-time-area/multi", "/cafes/multi", "/cafes/multi-geocode"]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _serve_in_thread(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+def _start_backend(fake_url: str, no_cache: bool) -> Tuple[str, Any]:
+    # Настройки читаются при импорте модулей — окружение выставляем до него
+    os.environ.update({
+        "DGIS_API_KEY": os.environ.get("DGIS_API_KEY", "bench"),
+        "ISOCHRONE_URL": f"{fake_url}/isochrone/2.0.0",
+        "PLACES_ITEMS_URL": f"{fake_url}/3.0/items",
+        "GEOCODE_URL": f"{fake_url}/3.0/items/geocode",
+        "PERSISTENT_CACHE_PATH": "",
+        "PLACES_INDEX_ENABLED": "false",
+        "HOT_ORIGINS_ENABLED": "false",
+        "HTTP2_ENABLED": "false",  # фейковый сервер говорит только HTTP/1.1
+    })
+    if no_cache:
+        # Персистентный кэш выключен всегда (PERSISTENT_CACHE_PATH выше), здесь — кэши в памяти
+        os.environ.update({"ISOCHRONE_CACHE_SIZE": "0", "GEOCODE_CACHE_SIZE": "0", "RESPONSE_CACHE_SIZE": "0"})
+    from app.main import app
+
+    port = _free_port()
+    server, _ = _serve_in_thread(app, port)
+    return f"http://127.0.0.1:{port}", server
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def _make_body(endpoint: str, rnd: random.Random, pool: List[Tuple[float, float]], max_group: int) -> Dict[str, Any]:
+    group = rnd.sample(range(len(pool)), rnd.randint(2, min(max_group, len(pool))))
+    if endpoint.endswith("-geocode"):
+        return {"addresses": [f"Москва, Бенчмарковая улица, {i + 1}" for i in group]}
+    return {"people": [{"lat": pool[i][0], "lon": pool[i][1]} for i in group]}
+
+async def run_load(
+    target: str,
+    endpoints: List[str],
+    requests: int,
+    concurrency: int,
+    origins: int,
+    max_group: int,
+    seed: int,
+) -> Dict[str, Dict[str, Any]]:
+    rnd = random.Random(seed)
+    lat0, lon0 = CITY_CENTER
+    pool = [(lat0 + rnd.uniform(-0.03, 0.03), lon0 + rnd.uniform(-0.05, 0.05)) for _ in range(origins)]
+    jobs = [(ep, _make_body(ep, rnd, pool, max_group)) for ep in (endpoints * requests)[:requests]]
+    rnd.shuffle(jobs)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    queue: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async with httpx.AsyncClient(base_url=target, timeout=120) as client:
+        async def worker() -> None:
+            while not queue.empty():
+                endpoint, body = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(endpoint, json=body)
+                    status = resp.status_code
+                except httpx.HTTPError:
+                    status = 0
+                latencies[endpoint].append((time.perf_counter() - started) * 1000)
+                statuses[endpoint][status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        wall = time.perf_counter() - started
+
+    report: Dict[str, Dict[str, Any]] = {}
+    for endpoint in endpoints:
+        values = sorted(latencies[endpoint])
+        report[endpoint] = {
+            "requests": len(values),
+            "rps": len(values) / wall if wall else 0.0,
+            "p50_ms": _percentile(values, 0.50),
+            "p95_ms": _percentile(values, 0.95),
+            "p99_ms": _percentile(values, 0.99),
+            "statuses": dict(statuses[endpoint]),
+        }
+    report["total"] = {"requests": len(jobs), "rps": len(jobs) / wall if wall else 0.0, "wall_sec": wall}
+    return report
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default=None, help="URL запущенного бэкенда; без него всё поднимается локально")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--origins", type=int, default=50, help="размер пула точек участников")
+    parser.add_argument("--max-group", type=int, default=5)
+    parser.add_argument("--no-cache", action="store_true")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    servers = []
+    target: Optional[str] = args.target
+    if target is None:
+        fake_port = _free_port()
+        fake_server, _ = _serve_in_thread(create_app(options_from_args(args)), fake_port)
+        target, backend_server = _start_backend(f"http://127.0.0.1:{fake_port}", args.no_cache)
+        servers = [backend_server, fake_server]
+
+    try:
+        report = asyncio.run(run_load(
+            target,
+            [e for e in args.endpoints.split(",") if e],
+            args.requests,
+            args.concurrency,
+            args.origins,
+            args.max_group,
+            args.seed,
+        ))
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+    print(f"{'endpoint':<26} {'reqs':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for endpoint, r in report.items():
+        if endpoint == "total":
+            continue
+        print(
+            f"{endpoint:<26} {r['requests']:>5} {r['rps']:>7.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f}  {r['statuses']}"
+        )
+    total = report["total"]
+    print(f"total: {total['requests']} requests in {total['wall_sec']:.1f}s, {total['rps']:.1f} rps")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Микробенчмарки горячих функций на синтетических изохронах.
+Участников и сложность полигонов задают списками:
+
+  python -m bench.micro --participants 2,4,8,16 --vertices 64,512,4096 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import shapely
+
+os.environ.setdefault("DGIS_API_KEY", "bench")
+os.environ.setdefault("PERSISTENT_CACHE_PATH", "")
+
+from app.clients.dgis import item_to_feature  # noqa: E402
+from app.geometry.ops import to_feature_collection  # noqa: E402
+from app.geometry.raster import intersect_isochrones_raster  # noqa: E402
+from app.geometry.rings import (  # noqa: E402
+    build_time_rings,
+    intersect_isochrones_for_many,
+    intersect_isochrones_wkb,
+    intersect_rings_for_many,
+)
+
+from .fake_2gis import CITY_CENTER, synthetic_city, synthetic_isochrone  # noqa: E402
+
+DURATIONS = [1200, 1800, 2400]
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # прогрев
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+def _participants(n: int, vertices: int, seed: int) -> List[List[Tuple[int, Any]]]:
+    rnd = random.Random(seed)
+    lat0, lon0 = CITY_CENTER
+    out = []
+    for _ in range(n):
+        lat = lat0 + rnd.uniform(-0.02, 0.02)
+        lon = lon0 + rnd.uniform(-0.03, 0.03)
+        out.append([(d, synthetic_isochrone(lat, lon, d, vertices)) for d in DURATIONS])
+    return out
+
+def run(participants: List[int], vertices: List[int], repeat: int, tolerance_min: int, seed: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for v in vertices:
+        for n in participants:
+            isochrones = _participants(n, v, seed)
+            rings = [build_time_rings(iso) for iso in isochrones]
+            inter = intersect_rings_for_many(rings, tolerance_min, None, None)
+            cases = {
+                "build_time_rings": lambda: [build_time_rings(iso) for iso in isochrones],
+                "intersect_rings_for_many": lambda: intersect_rings_for_many(rings, tolerance_min, None, None),
+                "intersect_isochrones": lambda: intersect_isochrones_for_many(isochrones, tolerance_min),
+                # То же с упаковкой в WKB и обратно, как в пуле процессов (без самой пересылки)
+                "intersect_isochrones_wkb": lambda: shapely.from_wkb(intersect_isochrones_wkb(
+                    [[(d, shapely.to_wkb(g)) for d, g in iso] for iso in isochrones], tolerance_min
+                )),
+                "intersect_raster 50m": lambda: intersect_isochrones_raster(isochrones, tolerance_min, 50),
+                "to_feature_collection": lambda: to_feature_collection(inter),
+            }
+            for name, fn in cases.items():
+                rows.append({"bench": name, "participants": n, "vertices": v, **_timeit(fn, repeat)})
+
+    items = synthetic_city(1000, seed)
+    rows.append({
+        "bench": "item_to_feature x1000",
+        "participants": "-",
+        "vertices": "-",
+        **_timeit(lambda: [item_to_feature(it) for it in items], repeat),
+    })
+    return rows
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--participants", default="2,4,8,16")
+    parser.add_argument("--vertices", default="64,512,4096")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance-min", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = run(
+        [int(v) for v in args.participants.split(",")],
+        [int(v) for v in args.vertices.split(",")],
+        args.repeat,
+        args.tolerance_min,
+        args.seed,
+    )
+    print(f"{'bench':<26} {'people':>6} {'verts':>6} {'median ms':>10} {'p95 ms':>10}")
+    for r in rows:
+        print(f"{r['bench']:<26} {r['participants']!s:>6} {r['vertices']!s:>6} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
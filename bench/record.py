@@ -0,0 +1,76 @@
+"""
+Записывает реальные ответы 2ГИС для проигрывания в bench/fake_2gis.py.
+Нужен DGIS_API_KEY и сеть; тратит квоту — запускать вручную и редко.
+
+  DGIS_API_KEY=... python -m bench.record --out bench/recordings \\
+      --point 55.7558,37.6173 --point 55.7297,37.6010 --address "Москва, Тверская 1"
+"""
+import argparse
+import json
+import os
+from typing import List, Tuple
+
+import httpx
+import shapely
+
+ISOCHRONE_URL = "https://routing.api.2gis.com/isochrone/2.0.0"
+PLACES_URL = "https://catalog.api.2gis.com/3.0/items"
+GEOCODE_URL = "https://catalog.api.2gis.com/3.0/items/geocode"
+PLACES_FIELDS = "items.point,items.name,items.rubrics,items.schedule,items.address,items.rating,items.contact_groups"
+
+def _parse_point(raw: str) -> Tuple[float, float]:
+    lat, lon = raw.split(",")
+    return float(lat), float(lon)
+
+def _append(path: str, record) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="bench/recordings")
+    parser.add_argument("--point", action="append", default=[], help="lat,lon — старт изохрон")
+    parser.add_argument("--address", action="append", default=[])
+    parser.add_argument("--durations", default="1200,1800,2400", help="секунды через запятую (до 5)")
+    parser.add_argument("--places-radius-deg", type=float, default=0.02)
+    args = parser.parse_args()
+
+    key = os.environ["DGIS_API_KEY"]
+    os.makedirs(args.out, exist_ok=True)
+    points: List[Tuple[float, float]] = [_parse_point(p) for p in args.point]
+    durations = [int(d) for d in args.durations.split(",")]
+
+    with httpx.Client(timeout=30) as client:
+        for lat, lon in points:
+            payload = {
+                "durations": durations,
+                "start": {"lat": lat, "lon": lon},
+                "transport": "public_transport",
+                "reverse": False,
+                "format": "wkt",
+            }
+            resp = client.post(ISOCHRONE_URL, params={"key": key}, json=payload)
+            resp.raise_for_status()
+            _append(os.path.join(args.out, "isochrone.jsonl"), {"start": payload["start"], "response": resp.json()})
+
+            area = shapely.Point(lon, lat).buffer(args.places_radius_deg)
+            for page in range(1, 41):
+                params = {
+                    "key": key, "q": "cafe", "type": "branch", "polygon": area.wkt,
+                    "fields": PLACES_FIELDS, "page_size": 50, "page": page,
+                }
+                resp = client.get(PLACES_URL, params=params)
+                resp.raise_for_status()
+                items = (resp.json().get("result") or {}).get("items") or []
+                for it in items:
+                    _append(os.path.join(args.out, "places.jsonl"), it)
+                if len(items) < 50:
+                    break
+
+        for q in args.address:
+            resp = client.get(GEOCODE_URL, params={"key": key, "q": q, "fields": "items.point,items.full_name", "page_size": 1})
+            resp.raise_for_status()
+            _append(os.path.join(args.out, "geocode.jsonl"), {"q": q, "response": resp.json()})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+
+# Настройки читаются при импорте модулей приложения — окружение выставляем до него
+os.environ.update({
+    "DGIS_API_KEY": "test",
+    "PERSISTENT_CACHE_PATH": "",
+    "PLACES_INDEX_ENABLED": "false",
+    "HOT_ORIGINS_ENABLED": "false",
+    "RATE_LIMIT_ISOCHRONE_QPS": "0",
+    "RATE_LIMIT_PLACES_QPS": "0",
+    "RATE_LIMIT_GEOCODE_QPS": "0",
+})
+
+import asyncio
+from typing import Dict
+
+import httpx
+import pytest
+
+from app.clients import dgis, geocoder
+from app.core import http, ratelimit, response_cache
+from bench.fake_2gis import FakeOptions, create_app
+
+@pytest.fixture(autouse=True)
+def _fresh_state():
+    # Кэши и ограничители — глобальные на процесс, тесты не должны видеть чужие ответы
+    for cache in (dgis._isochrone_cache, geocoder._geocode_cache, response_cache._cache):
+        cache.clear()
+    ratelimit._limiters.clear()
+    yield
+
+@pytest.fixture
+def fake_2gis(monkeypatch):
+    """
+    Фейковый 2ГИС из bench/fake_2gis.py внутри процесса: fake_2gis(**FakeOptions) направляет в него
+    HTTP-клиент бэкенда и возвращает счётчики запросов фейка.
+    """
+
+    def _install(**options) -> Dict[str, int]:
+        app = create_app(FakeOptions(**options))
+        clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+        def _client() -> httpx.AsyncClient:
+            loop = asyncio.get_running_loop()
+            if loop not in clients:
+                clients[loop] = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+            return clients[loop]
+
+        monkeypatch.setattr(http, "get_async_client", _client)
+        return app.state.stats
+
+    return _install
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.batch import OriginIsochrones
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+PEOPLE = [{"lat": LAT, "lon": LON - 0.01}, {"lat": LAT, "lon": LON + 0.01}]
+
+def _events(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_batch_shares_origins_between_groups(fake_2gis):
+    stats = fake_2gis()
+    third = {"lat": LAT + 0.01, "lon": LON}
+    groups = [{"id": "a", "people": PEOPLE}, {"id": "b", "people": [PEOPLE[0], third]}]
+    with TestClient(app) as client:
+        events = _events(client.post("/batch/areas", json={"groups": groups}))
+
+    results = {e["data"]["id"]: e["data"] for e in events if e["event"] == "group"}
+    assert {r["status"] for r in results.values()} == {"ok"}
+    done = events[-1]
+    assert done["event"] == "done"
+    assert done["data"]["unique_origins"] == 3
+    # Лестница — один запрос на уникальную точку, дальше только бисекция
+    assert stats["isochrone"] == done["data"]["origin_fetches"]
+
+def test_batch_group_error_does_not_stop_others(fake_2gis):
+    fake_2gis()
+    groups = [{"id": "ok", "people": PEOPLE}, {"id": "single", "people": PEOPLE[:1]}]
+    with TestClient(app) as client:
+        events = _events(client.post("/batch/areas", json={"groups": groups}))
+
+    results = {e["data"]["id"]: e["data"] for e in events if e["event"] == "group"}
+    assert results["ok"]["status"] == "ok"
+    assert results["single"]["error"]["status"] == 400
+
+def test_batch_missing_duration_is_no_intersection(fake_2gis):
+    # 2ГИС не вернул 20 минут: порог пропускается, поиск идёт дальше, а не падает 502
+    fake_2gis(drop_durations=(1200,))
+    with TestClient(app) as client:
+        events = _events(client.post("/batch/areas", json={"groups": [{"id": "g", "people": PEOPLE}]}))
+
+    result = next(e["data"] for e in events if e["event"] == "group")
+    assert result["status"] == "ok"
+    assert result["t_minutes"] > 20
+    assert result["area"]["features"][0]["properties"]["attempts"][0] == {
+        "t_minutes": 20, "durations_sec": [1200], "phase": "ladder", "status": "no_intersection_retry",
+    }
+
+def test_origin_isochrones_does_not_refetch_missing_duration(fake_2gis):
+    stats = fake_2gis(drop_durations=(1200,))
+    origin = (LAT, LON)
+
+    async def _run():
+        memo = OriginIsochrones(4, None, None)
+        await memo.ensure([origin], [20, 30])
+        await memo.ensure([origin], [20])
+        return memo
+
+    memo = asyncio.run(_run())
+    assert stats["isochrone"] == 1
+    assert (origin, 20) in memo.empty
+    assert memo.stack([origin], 20) == [[]]
+    assert memo.stack([origin], 30)[0][0][0] == 1800
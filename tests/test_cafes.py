@@ -0,0 +1,49 @@
+import copy
+
+from shapely.geometry import box
+
+from app.services.cafes import rank_cafes
+
+# Два участника, изохроны на 10 и 20 минут в формате поиска: порог -> [(секунды, геометрия)] по участникам
+ISOCHRONES = {
+    10: [[(600, box(0, 0, 1, 1))], [(600, box(0.5, 0, 2, 1))]],
+    20: [[(1200, box(0, 0, 2, 2))], [(1200, box(0, 0, 2, 2))]],
+}
+
+def _cafe(name: str, lon: float, lat: float, rating=None):
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {"name": name, "rating": rating}}
+
+CAFES = [
+    _cafe("unknown", 5, 5, rating=5),
+    _cafe("uneven", 0.2, 0.5, rating=5),
+    _cafe("far", 1.5, 1.5, rating=3),
+    _cafe("fair", 0.9, 0.5),
+    _cafe("far_rated", 1.6, 1.6, rating="4.5"),
+]
+
+def _by_name(ranked):
+    return {feat["properties"]["name"]: feat["properties"] for feat in ranked}
+
+def test_rank_cafes_orders_by_worst_time_then_spread_then_rating():
+    ranked = rank_cafes(CAFES, ISOCHRONES)
+
+    assert [feat["properties"]["name"] for feat in ranked] == ["fair", "far_rated", "far", "uneven", "unknown"]
+    props = _by_name(ranked)
+    assert props["fair"]["arrival_min"] == [[0, 10], [0, 10]]
+    assert props["uneven"]["arrival_min"] == [[0, 10], [10, 20]]
+    assert props["uneven"]["fairness"] == {"max_min": 20, "spread_min": 10}
+    assert props["unknown"]["arrival_min"] == [None, None] and props["unknown"]["fairness"] is None
+
+def test_rank_cafes_keeps_the_top_and_leaves_inputs_untouched():
+    before = copy.deepcopy(CAFES)
+    ranked = rank_cafes(CAFES, ISOCHRONES, limit=2)
+
+    assert [feat["properties"]["name"] for feat in ranked] == ["fair", "far_rated"]
+    assert CAFES == before
+
+def test_rank_cafes_without_isochrones_sorts_by_rating():
+    ranked = rank_cafes(CAFES, {})
+
+    assert [feat["properties"]["name"] for feat in ranked][:2] == ["unknown", "uneven"]
+    assert all(feat["properties"]["fairness"] is None for feat in ranked)
+    assert rank_cafes([], ISOCHRONES) == []
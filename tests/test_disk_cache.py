@@ -0,0 +1,23 @@
+import asyncio
+
+from app.clients import dgis
+from app.core.disk_cache import SqliteCache
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+
+def test_isochrones_survive_restart_through_disk_cache(fake_2gis, monkeypatch, tmp_path):
+    stats = fake_2gis()
+    disk = SqliteCache(str(tmp_path / "cache.sqlite"), max_bytes=1 << 20)
+    monkeypatch.setattr(dgis, "_disk_cache", disk)
+
+    first = asyncio.run(dgis.call_isochrone(LAT, LON, [600, 1200]))
+    # Запись идёт в фоновом потоке — дожидаемся её, как при остановке процесса
+    disk.flush()
+    dgis._isochrone_cache.clear()
+    second = asyncio.run(dgis.call_isochrone(LAT, LON, [600, 1200]))
+
+    assert stats["isochrone"] == 1
+    assert [d for d, _ in second] == [d for d, _ in first] == [600, 1200]
+    assert all(a.equals(b) for (_, a), (_, b) in zip(first, second))
+    assert disk.hits == 2
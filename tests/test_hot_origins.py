@@ -0,0 +1,25 @@
+import asyncio
+
+import numpy as np
+
+from app.clients.dgis import call_isochrone
+from app.services import hot_origins
+from app.services.cafes import arrival_minutes
+from app.services.search import search_range
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+
+def test_warm_minutes_cover_the_default_cafe_request():
+    assert hot_origins._warm_minutes() == [5, 10, 15, 20, 25, 30, 35, 40]
+
+def test_warmed_origin_answers_the_cafe_ladder_from_cache(fake_2gis, monkeypatch):
+    stats = fake_2gis()
+    monkeypatch.setattr(hot_origins, "_origins", np.asarray([[LAT, LON]]))
+
+    assert asyncio.run(hot_origins.warm_hot_origins()) == 1
+    warmed = stats["isochrone"]
+    minutes = search_range(20, 10, 40) + arrival_minutes(20)
+    asyncio.run(call_isochrone(LAT, LON, [t * 60 for t in minutes]))
+
+    assert stats["isochrone"] == warmed
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+import shapely
+
+from app.services.places_index import PlacesSnapshot, build_places_snapshot
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+# Три плитки по 0.3°: две над синтетическим городом, восточная — за его пределами
+BBOX = (LON - 0.3, LAT - 0.15, LON + 0.6, LAT + 0.15)
+
+def test_tiles_over_the_page_cap_are_left_out_of_coverage(fake_2gis, tmp_path, caplog):
+    fake_2gis(cafes=300)
+    with caplog.at_level(logging.WARNING, logger="app.services.places_index"):
+        snap = asyncio.run(build_places_snapshot(BBOX, tile_deg=0.3, page_size=10, max_pages=2, max_depth=0))
+
+    assert len(snap.truncated) == 2
+    assert len([r for r in caplog.records if "left to live Places" in r.getMessage()]) == 2
+    city = shapely.box(LON - 0.01, LAT - 0.01, LON + 0.01, LAT + 0.01)
+    outside = shapely.box(LON + 0.4, LAT - 0.01, LON + 0.5, LAT + 0.01)
+    assert not snap.can_answer(city, max_age_sec=60)
+    assert snap.can_answer(outside, max_age_sec=60)
+
+    path = str(tmp_path / "places.npz")
+    snap.save(path)
+    loaded = PlacesSnapshot.load(path)
+    assert loaded.truncated == snap.truncated
+    assert not loaded.can_answer(city, max_age_sec=60)
+    assert loaded.stats()["truncated_tiles"] == 2
+
+def test_tiles_split_until_they_fit_are_covered(fake_2gis):
+    fake_2gis(cafes=300)
+    snap = asyncio.run(build_places_snapshot(BBOX, tile_deg=0.3, page_size=50, max_pages=2, max_depth=2))
+
+    assert snap.truncated == []
+    assert len(snap) == 300
+    assert snap.can_answer(shapely.box(LON - 0.01, LAT - 0.01, LON + 0.01, LAT + 0.01), max_age_sec=60)
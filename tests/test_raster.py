@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from app.geometry.ops import approx_area_m2
+from app.services.isochrone import intersect_isochrones
+from bench.fake_2gis import CITY_CENTER, synthetic_isochrone
+
+LAT, LON = CITY_CENTER
+
+def _stack(points, duration=1200):
+    # Одна длительность на участника — кольцо совпадает с изохроной, движки должны давать одно и то же
+    return [[(duration, synthetic_isochrone(lat, lon, duration, 64))] for lat, lon in points]
+
+@pytest.mark.parametrize("cell_m", [25, 50])
+def test_raster_matches_polygons_on_a_single_threshold(cell_m):
+    stack = _stack([(LAT, LON - 0.02), (LAT, LON + 0.02), (LAT + 0.01, LON)])
+    polygon = asyncio.run(intersect_isochrones(stack, 10, engine="polygon"))
+    raster = asyncio.run(intersect_isochrones(stack, 10, engine="raster", raster_cell_m=cell_m))
+
+    # Расхождение — только клетки вдоль границы
+    assert approx_area_m2(polygon.symmetric_difference(raster)) < 0.03 * approx_area_m2(polygon)
+    assert polygon.hausdorff_distance(raster) < 2 * cell_m / 111_000
+
+def test_raster_and_polygons_agree_on_no_intersection():
+    stack = _stack([(LAT, LON - 0.1), (LAT, LON + 0.1)])
+
+    assert asyncio.run(intersect_isochrones(stack, 10, engine="polygon")) is None
+    assert asyncio.run(intersect_isochrones(stack, 10, engine="raster", raster_cell_m=50)) is None
+
+@pytest.mark.parametrize("engine", ["polygon", "raster"])
+def test_participant_without_the_duration_is_no_intersection(engine):
+    # Так выглядит стек, когда 2ГИС не вернул длительность одному из участников
+    stack = _stack([(LAT, LON)]) + [[]]
+
+    assert asyncio.run(intersect_isochrones(stack, 10, engine=engine, raster_cell_m=50)) is None
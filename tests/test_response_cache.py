@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from app.core.response_cache import group_cache_key
+from app.main import app
+from app.models.schemas import MultiRequest
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+PEOPLE = [{"lat": LAT, "lon": LON - 0.01}, {"lat": LAT, "lon": LON + 0.01}]
+SSE = {"Accept": "text/event-stream"}
+
+def test_stream_replay_has_etag_per_media_type(fake_2gis):
+    fake_2gis()
+    url = "/equal-time-area/multi/stream"
+    with TestClient(app) as client:
+        live = client.post(url, json={"people": PEOPLE})
+        ndjson = client.post(url, json={"people": PEOPLE})
+        sse = client.post(url, json={"people": PEOPLE}, headers=SSE)
+        # ETag от NDJSON не должен подтверждать закэшированную у клиента SSE-версию
+        revalidated = client.post(url, json={"people": PEOPLE}, headers={**SSE, "If-None-Match": ndjson.headers["etag"]})
+        not_modified = client.post(url, json={"people": PEOPLE}, headers={**SSE, "If-None-Match": sse.headers["etag"]})
+
+    assert live.headers["x-cache"] == "MISS" and "etag" not in live.headers
+    assert ndjson.headers["x-cache"] == sse.headers["x-cache"] == "HIT"
+    assert ndjson.text == live.text
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    assert ndjson.headers["etag"] != sse.headers["etag"]
+    assert revalidated.status_code == 200
+    assert not_modified.status_code == 304
+    assert all(r.headers["vary"] == "Accept" for r in (live, ndjson, sse, not_modified))
+
+def _key(people, keep_order=False, **fields):
+    req = MultiRequest(people=people, **fields)
+    return group_cache_key("cafes", req, [(p["lat"], p["lon"]) for p in people], "bucket", keep_order=keep_order)
+
+def test_group_cache_key_ignores_participant_order():
+    assert _key(PEOPLE) == _key(PEOPLE[::-1])
+    # Ответы по участникам в порядке запроса кэшируются с порядком
+    assert _key(PEOPLE, keep_order=True) != _key(PEOPLE[::-1], keep_order=True)
+
+def test_group_cache_key_depends_on_the_rest_of_the_request():
+    assert _key(PEOPLE) != _key(PEOPLE, t_end_min=60)
+    # start_time заменён корзиной — в ключ не попадает
+    assert _key(PEOPLE) == _key(PEOPLE, start_time_iso="2026-10-14T05:16:00Z")
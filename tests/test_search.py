@@ -0,0 +1,76 @@
+import asyncio
+from typing import List, Optional, Tuple
+
+from app.services.search import compute_intersection_iterative, search_thresholds
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+# Точки так далеко друг от друга, что на 10 минутах фейковые изохроны ещё не пересекаются
+FAR_APART = [(LAT, LON - 0.04), (LAT, LON + 0.04)]
+
+def _search(first_found: Optional[int], thresholds: List[int], precision_min: int) -> Tuple[tuple, List[tuple]]:
+    calls = []
+
+    async def evaluate(t: int, phase: str):
+        calls.append((t, phase))
+        return f"area@{t}" if first_found is not None and t >= first_found else None
+
+    return asyncio.run(search_thresholds(evaluate, thresholds, precision_min)), calls
+
+def test_search_thresholds_bisects_between_empty_and_found_steps():
+    result, calls = _search(24, [10, 20, 30, 40], precision_min=2)
+
+    # Интервал сужается до ширины precision_min: (23, 25] — ответ 25, а не точные 24
+    assert result == ("area@25", 25)
+    assert calls == [(10, "ladder"), (20, "ladder"), (30, "ladder"), (25, "bisect"), (22, "bisect"), (23, "bisect")]
+
+def test_search_thresholds_stops_at_precision():
+    result, calls = _search(24, [10, 20, 30], precision_min=5)
+
+    assert result == ("area@25", 25)
+    assert [t for t, phase in calls if phase == "bisect"] == [25]
+
+def test_search_thresholds_does_not_bisect_below_the_first_step():
+    # Ниже первого порога пустого интервала нет — уточнять нечего
+    result, calls = _search(5, [10, 20], precision_min=1)
+
+    assert result == ("area@10", 10)
+    assert calls == [(10, "ladder")]
+
+def test_search_thresholds_without_precision_keeps_the_ladder_step():
+    result, calls = _search(24, [10, 20, 30], precision_min=0)
+
+    assert result == ("area@30", 30)
+    assert all(phase == "ladder" for _, phase in calls)
+
+def test_search_thresholds_returns_none_when_nothing_intersects():
+    result, calls = _search(None, [10, 20, 30], precision_min=2)
+
+    assert result == (None, None)
+    assert [t for t, _ in calls] == [10, 20, 30]
+
+def test_iterative_search_refines_the_ladder_by_bisection(fake_2gis):
+    stats = fake_2gis()
+    best, debug = asyncio.run(
+        compute_intersection_iterative(FAR_APART, start_minutes=10, step_minutes=10, precision_min=2)
+    )
+
+    attempts = [(a["t_minutes"], a["phase"], a["status"]) for a in debug["attempts"]]
+    assert attempts[:2] == [(10, "ladder", "no_intersection_retry"), (20, "ladder", "intersection_found")]
+    assert {phase for _, phase, _ in attempts[2:]} == {"bisect"}
+    assert 10 < debug["t_minutes"] < 20
+    assert best is not None and not best.is_empty
+    # Лестница — один пакет на участника, каждая итерация бисекции — ещё по запросу на участника
+    assert debug["upstream_requests"] == stats["isochrone"] == 2 * (1 + len(attempts) - 2)
+
+def test_ladder_duration_missing_from_2gis_is_no_intersection(fake_2gis):
+    fake_2gis(drop_durations=(1200,))
+    best, debug = asyncio.run(
+        compute_intersection_iterative(FAR_APART, start_minutes=10, step_minutes=10, precision_min=2)
+    )
+
+    attempts = [(a["t_minutes"], a["status"]) for a in debug["attempts"]]
+    # Без изохрон на 20 минут порог считается пустым, лестница идёт дальше и бисекция уточняет от 20
+    assert attempts[:3] == [(10, "no_intersection_retry"), (20, "no_intersection_retry"), (30, "intersection_found")]
+    assert 20 < debug["t_minutes"] <= 30
+    assert best is not None and not best.is_empty
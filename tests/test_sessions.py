@@ -0,0 +1,69 @@
+import asyncio
+
+from shapely.geometry import box
+
+from app.services.sessions import ComputeSession, compute_session_intersection
+from bench.fake_2gis import CITY_CENTER
+
+LAT, LON = CITY_CENTER
+A, B, C = (LAT, LON - 0.01), (LAT, LON + 0.01), (LAT + 0.01, LON)
+
+def _session(**boxes) -> ComputeSession:
+    session = ComputeSession("s")
+    session.apply({pid: (i, i) for i, pid in enumerate(boxes)})
+    for pid, geom in boxes.items():
+        session.isochrones[pid][20] = geom
+    return session
+
+def test_apply_reports_the_diff_and_drops_stale_isochrones():
+    session = _session(a=box(0, 0, 2, 2), b=box(1, 1, 3, 3))
+    diff = session.apply({"a": (0, 0), "b": (5, 5), "c": (2, 2)})
+
+    assert diff == {"added": ["c"], "moved": ["b"], "removed": []}
+    assert session.isochrones == {"a": {20: box(0, 0, 2, 2)}, "b": {}, "c": {}}
+    assert session.apply({"c": (2, 2)}) == {"added": [], "moved": [], "removed": ["a", "b"]}
+    assert list(session.isochrones) == ["c"]
+
+def test_intersect_extends_the_partial_result_for_a_new_participant():
+    session = _session(a=box(0, 0, 2, 2), b=box(1, 0, 3, 2))
+    geom, ops = session.intersect(20)
+    assert geom.equals(box(1, 0, 2, 2)) and ops == 2
+
+    session.apply({"a": (0, 0), "b": (1, 1), "c": (9, 9)})
+    session.isochrones["c"][20] = box(0, 1, 3, 3)
+    geom, ops = session.intersect(20)
+    # Готовое пересечение a и b дополнено одним пересечением с c
+    assert geom.equals(box(1, 1, 2, 2)) and ops == 1
+
+def test_intersect_recomputes_after_a_move():
+    session = _session(a=box(0, 0, 2, 2), b=box(1, 0, 3, 2))
+    session.intersect(20)
+    session.apply({"a": (0, 0), "b": (7, 7)})
+    session.isochrones["b"][20] = box(-1, 0, 1, 2)
+
+    geom, ops = session.intersect(20)
+    assert geom.equals(box(0, 0, 1, 2)) and ops == 2
+
+def test_intersect_without_a_duration_is_no_intersection():
+    session = _session(a=box(0, 0, 2, 2), b=box(1, 0, 3, 2))
+    del session.isochrones["b"][20]
+
+    assert session.intersect(20) == (None, 0)
+
+def test_session_fetches_only_new_participants(fake_2gis):
+    stats = fake_2gis()
+    session = ComputeSession("s")
+
+    async def _run(participants):
+        return await compute_session_intersection(session, participants, start_minutes=10, step_minutes=10, precision_min=0)
+
+    first, debug = asyncio.run(_run({"a": A, "b": B}))
+    requests = stats["isochrone"]
+    second, debug = asyncio.run(_run({"a": A, "b": B, "c": C}))
+
+    assert first is not None and second is not None
+    assert debug["session"] == {
+        "added": ["c"], "moved": [], "removed": [], "fetched_participants": 1, "intersections": 1,
+    }
+    # Изохроны a и b на том же пороге уже в сессии — в 2ГИС ходили только за c
+    assert stats["isochrone"] - requests == 1
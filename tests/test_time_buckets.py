@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.clients.dgis import isochrone_time_key
+from app.core import time_buckets
+from app.core.time_buckets import BucketRule, bucket_for, neighbor_buckets, parse_bucket_rules
+
+RULES = "mon-fri 07:00-22:00=15; sat-sun 07:00-22:00=30; 22:00-07:00=60"
+
+@pytest.fixture
+def rules(monkeypatch):
+    monkeypatch.setattr(time_buckets, "_rules", lambda: tuple(parse_bucket_rules(RULES)))
+
+def _utc(text: str) -> datetime:
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+
+def test_parse_bucket_rules():
+    assert parse_bucket_rules(RULES) == [
+        BucketRule(frozenset(range(0, 5)), 7 * 60, 15 * 60, 15),
+        BucketRule(frozenset({5, 6}), 7 * 60, 15 * 60, 30),
+        # Окно через полночь — 9 часов от 22:00, дни не ограничены
+        BucketRule(None, 22 * 60, 9 * 60, 60),
+    ]
+
+def test_parse_bucket_rules_wraps_days_and_skips_blanks():
+    assert parse_bucket_rules(" ; sat-mon 00:00-00:00=0 ;") == [BucketRule(frozenset({5, 6, 0}), 0, 1440, 1)]
+    assert parse_bucket_rules(None) == []
+
+def test_bucket_for_follows_the_rules_in_local_time(rules):
+    # Среда, 08:20 по Москве (UTC+3) — дневная корзина в 15 минут
+    assert bucket_for(_utc("2026-10-14T05:20:00")).iso == "2026-10-14T05:15:00Z"
+    # Суббота — корзина в 30 минут
+    assert bucket_for(_utc("2026-10-17T05:20:00")).iso == "2026-10-17T05:00:00Z"
+    # Ночь после 22:00 — часовая корзина окна, начавшегося накануне
+    night = bucket_for(_utc("2026-10-15T00:40:00"))
+    assert (night.iso, night.minutes) == ("2026-10-15T00:00:00Z", 60)
+
+def test_neighbor_buckets_go_outwards(rules):
+    bucket = bucket_for(_utc("2026-10-14T05:20:00"))
+    assert [b.iso for b in neighbor_buckets(bucket, 30)] == [
+        "2026-10-14T05:00:00Z", "2026-10-14T05:30:00Z", "2026-10-14T04:45:00Z", "2026-10-14T05:45:00Z",
+    ]
+
+def test_isochrone_time_key_shares_a_bucket(rules):
+    assert isochrone_time_key("2026-10-14T08:16:00+03:00") == isochrone_time_key("2026-10-14T05:29:59Z")
+    assert isochrone_time_key("2026-10-14T08:16:00+03:00") != isochrone_time_key("2026-10-14T08:31:00+03:00")
+    # Без зоны — UTC
+    assert isochrone_time_key("2026-10-14T05:16:00") == "2026-10-14T05:15:00Z"
+
+def test_isochrone_time_key_for_now_and_unparsed_values(rules):
+    before = bucket_for(datetime.now(timezone.utc)).iso
+    now = isochrone_time_key(None)
+    after = bucket_for(datetime.now(timezone.utc)).iso
+    assert now[0] == "now" and now[1] in (before, after)
+    assert isochrone_time_key("завтра утром") == "завтра утром"